@@ -16,13 +16,39 @@ class Config(BaseSettings):
 
     API_ENTREPRISE_URL: str
     API_ENTREPRISE_TOKEN: str
+    # Quota de l'API Entreprise (requêtes par minute) et nombre d'appels
+    # simultanés lors de l'enrichissement des structures
+    API_ENTREPRISE_REQUETES_MINUTE: int = 250
+    API_ENTREPRISE_WORKERS: int = 8
 
     INFOGREFFE_API_KEY: str = ""
     INFOGREFFE_DATASET: str = "chiffres-cles-2024"
+    # Débit nominal (requêtes par seconde) et nombre d'appels simultanés à
+    # l'API Datainfogreffe
+    INFOGREFFE_REQUETES_SECONDE: float = 10
+    INFOGREFFE_WORKERS: int = 8
+    # Durée de validité des données Infogreffe d'une structure (en jours) avant
+    # rafraîchissement par `infogreffe --incremental`
+    INFOGREFFE_TTL_JOURS: int = 180
 
     SOURCES: str
     SIRETS: str | None = None
 
+    # Nombre de processus dédiés à la validation des DECP lors de l'import
+    IMPORT_WORKERS: int = 1
+    # Nombre maximal de structures, lieux et erreurs gardés en mémoire
+    # par l'importateur (illimité par défaut)
+    IMPORT_TAILLE_CACHE: int | None = None
+    # Durée visée pour chaque commit de l'import, en secondes, et mémoire
+    # maximale du processus d'import, en Mo : la taille des lots commités est
+    # ajustée en conséquence (fixe par défaut)
+    IMPORT_LATENCE_COMMIT: float | None = None
+    IMPORT_MEMOIRE_MAX: int | None = None
+    # Nombre de sources téléchargées en avance pendant l'import de la source
+    # en cours, et volume maximal gardé en mémoire pour chacune, en Mo
+    IMPORT_PRECHARGEMENT: int = 1
+    IMPORT_PRECHARGEMENT_MAX: int = 64
+
 
 @lru_cache
 def get_config() -> Config:
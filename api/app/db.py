@@ -6,8 +6,13 @@ from .config import get_config
 
 
 @cache
-def get_engine() -> Engine:
+def get_engine(local_infile: bool = False) -> Engine:
+    """`local_infile` autorise `LOAD DATA LOCAL INFILE` (import uniquement)."""
     engine = create_engine(
-        get_config().DATABASE_URL, echo=False, pool_size=5, max_overflow=10
+        get_config().DATABASE_URL,
+        echo=False,
+        pool_size=5,
+        max_overflow=10,
+        connect_args={"local_infile": True} if local_infile else {},
     )
     return engine
@@ -0,0 +1,155 @@
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from api_entreprise.api import ApiEntreprise
+from api_entreprise.exceptions import ApiEntrepriseClientError, LimitHitError
+from requests import HTTPError, RequestException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.helpers.limiteur import SeauJetons, en_parallele
+from app.models.db import Structure
+
+
+def statut_http(erreur: BaseException) -> int | None:
+    """Code HTTP de la réponse à l'origine d'une erreur du client, s'il y en a une."""
+    cause: BaseException | None = erreur
+    while cause is not None:
+        if isinstance(cause, HTTPError) and cause.response is not None:
+            return int(cause.response.status_code)
+        cause = cause.__cause__
+    return None
+
+
+def est_transitoire(erreur: ApiEntrepriseClientError) -> bool:
+    """Vrai pour une erreur serveur (5xx) ou réseau, qui mérite d'être retentée."""
+    statut = statut_http(erreur)
+    if statut is not None:
+        return statut >= 500
+    return isinstance(erreur.__cause__, RequestException)
+
+
+class ClientLimite:
+    """
+    Client de l'API Entreprise partagé entre threads, au débit permis par
+    `limiteur` (quotas de l'API).
+
+    Sur un 429, tous les appels sont suspendus pour la durée indiquée par le
+    serveur. Sur une erreur transitoire, l'appel est retenté après une attente
+    de `backoff` secondes, doublée à chaque essai. Au-delà de `essais`
+    tentatives, la dernière erreur est levée.
+    """
+
+    def __init__(
+        self,
+        api: ApiEntreprise,
+        limiteur: SeauJetons,
+        essais: int = 5,
+        backoff: float = 1.0,
+        attendre: Callable[[float], None] = time.sleep,
+    ):
+        self._api = api
+        self._limiteur = limiteur
+        self._essais = essais
+        self._backoff = backoff
+        self._attendre = attendre
+
+    def donnees_etablissement(self, siret: str) -> dict[str, Any] | None:
+        """Données enrichies de l'établissement, `None` s'il est inconnu."""
+        erreur: ApiEntrepriseClientError | None = None
+        for essai in range(self._essais):
+            self._limiteur.prendre()
+            try:
+                raw: dict[str, Any] | None = self._api.raw_donnees_etablissement(
+                    f"enrichi/{siret}?coordinates_format=WSG84"
+                )
+                return raw
+            except LimitHitError as e:
+                self._limiteur.suspendre(e.delay)
+                erreur = e
+            except ApiEntrepriseClientError as e:
+                if not est_transitoire(e):
+                    raise
+                erreur = e
+                self._attendre(self._backoff * 2**essai)
+        assert erreur is not None
+        raise erreur
+
+
+def build_ligne_structure(
+    uid: int, raw: dict[str, Any] | None
+) -> dict[str, Any] | None:
+    """
+    Valeurs de mise à jour de la structure `uid` d'après les données de l'API
+    Entreprise, `None` si celle-ci ne la connaît pas.
+    """
+    if not raw or not raw.get("data") or not raw["data"].get("unite_legale"):
+        return None
+
+    details = raw["data"]
+    ligne: dict[str, Any] = {
+        "uid": uid,
+        "nom": details["unite_legale"]
+        .get("personne_morale_attributs", {})
+        .get("raison_sociale"),
+        "cat_entreprise": details["unite_legale"].get("categorie_entreprise"),
+    }
+    if details.get("coordonnees"):
+        ligne["longitude"] = details["coordonnees"][0]
+        ligne["latitude"] = details["coordonnees"][1]
+    return ligne
+
+
+@dataclass
+class BilanEnrichissement:
+    enrichies: int = 0
+    inconnues: int = 0
+    erreurs: list[str] = field(default_factory=list)  # SIRET en échec
+
+
+def enrichir_structures(
+    session: Session,
+    client: ClientLimite,
+    structures: Iterable[tuple[int, str]],
+    workers: int = 8,
+    taille_lot: int = 500,
+) -> BilanEnrichissement:
+    """
+    Complète le nom, la catégorie et les coordonnées des `structures`
+    (`uid`, SIRET) d'après l'API Entreprise, interrogée en parallèle.
+
+    Les mises à jour sont écrites par un `UPDATE` groupé tous les `taille_lot`
+    structures enrichies, puis commitées.
+    """
+    bilan = BilanEnrichissement()
+    lignes: list[dict[str, Any]] = []
+
+    def ecrire() -> None:
+        if lignes:
+            session.execute(update(Structure), lignes)
+            session.commit()
+            lignes.clear()
+
+    for (uid, siret), appel in en_parallele(
+        lambda structure: client.donnees_etablissement(structure[1]),
+        structures,
+        workers,
+    ):
+        try:
+            ligne = build_ligne_structure(uid, appel.result())
+        except ApiEntrepriseClientError:
+            bilan.erreurs.append(siret)
+            continue
+
+        if ligne is None:
+            bilan.inconnues += 1
+            continue
+        lignes.append(ligne)
+        bilan.enrichies += 1
+        if len(lignes) >= taille_lot:
+            ecrire()
+
+    ecrire()
+    return bilan
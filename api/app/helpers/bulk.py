@@ -0,0 +1,623 @@
+import tempfile
+import unicodedata
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import batched
+from typing import IO, Any, cast
+
+from sqlalchemy import (
+    CursorResult,
+    LargeBinary,
+    PickleType,
+    Table,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.orm import Session
+
+from app.models.db import (
+    ActeSousTraitance,
+    Base,
+    ConsiderationEnvMarche,
+    ConsiderationSocialeMarche,
+    ContratConcession,
+    DecpMalForme,
+    DonneeExecution,
+    Erreur,
+    Lieu,
+    Marche,
+    ModificationConcession,
+    ModificationMarche,
+    ModificationSousTraitance,
+    Structure,
+    Tarif,
+    TechniqueAchatMarche,
+    concession_structure_table,
+    decp_erreur_table,
+    marche_titulaire_table,
+    modification_titulaire_table,
+)
+
+
+def get_table(entite: type[Base]) -> Table:
+    return cast(Table, entite.__table__)
+
+
+CleStructure = tuple[str, str]  # (identifiant, type_identifiant)
+CleLieu = tuple[str, int]  # (code, type_code)
+CleErreur = tuple[str, str, str]  # (type, localisation, message)
+
+
+def _collation(valeur: str) -> str:
+    sans_accents = "".join(
+        c for c in unicodedata.normalize("NFD", valeur) if not unicodedata.combining(c)
+    )
+    return sans_accents.casefold().rstrip(" ")
+
+
+def cle_collation(cle: CleErreur) -> CleErreur:
+    """
+    Clef telle que comparée par la contrainte d'unicité de `Erreur` : la
+    collation de MariaDB ignore la casse, les accents et les espaces finaux.
+    """
+    return (_collation(cle[0]), _collation(cle[1]), _collation(cle[2]))
+
+
+@dataclass(slots=True)
+class LignesActeSousTraitance:
+    ligne: dict[str, Any]
+    sous_traitant: CleStructure
+    modifications: list[dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class LignesModificationMarche:
+    ligne: dict[str, Any]
+    titulaires: list[CleStructure]
+
+
+@dataclass(slots=True)
+class LignesMarche:
+    """
+    Un marché validé, mis à plat en lignes prêtes à être insérées.
+
+    Les structures et lieux ne sont référencés que par leur clef métier :
+    la résolution en `uid` est faite au moment de l'écriture.
+    """
+
+    ligne: dict[str, Any]
+    acheteur: CleStructure
+    lieu: CleLieu | None
+    titulaires: list[CleStructure]
+    techniques: list[int]
+    considerations_sociales: list[int]
+    considerations_environnementales: list[int]
+    actes_sous_traitance: list[LignesActeSousTraitance]
+    modifications: list[LignesModificationMarche]
+
+
+@dataclass(slots=True)
+class LignesDonneeExecution:
+    ligne: dict[str, Any]
+    tarifs: list[dict[str, Any]]
+
+
+@dataclass(slots=True)
+class LignesConcession:
+    ligne: dict[str, Any]
+    autorite_concedante: CleStructure
+    concessionnaires: list[CleStructure]
+    donnees_execution: list[LignesDonneeExecution]
+    modifications: list[dict[str, Any]]
+
+
+@dataclass(slots=True)
+class LignesErreur:
+    ligne: dict[str, Any]
+    structure: CleStructure | None
+    erreurs: list[CleErreur]  # sans doublon
+
+
+class ChargementIncomplet(Exception):
+    pass
+
+
+# Tables les plus volumineuses, chargées via `LOAD DATA LOCAL INFILE` plutôt
+# que par des `INSERT` groupés si `BulkWriter` est créé avec `load_data`
+TABLES_LOAD_DATA = (
+    get_table(Marche),
+    marche_titulaire_table,
+    get_table(ModificationMarche),
+    get_table(ActeSousTraitance),
+)
+
+# Échappements attendus par `LOAD DATA` pour les caractères spéciaux
+# (`ESCAPED BY '\\'`, champs séparés par des tabulations, lignes par `\n`)
+_ECHAPPEMENTS_TSV = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"}
+)
+
+
+def valeur_tsv(valeur: Any) -> str:
+    """Représentation d'une valeur dans un fichier chargé par `LOAD DATA`."""
+    if valeur is None:
+        return "\\N"
+    if isinstance(valeur, bool):
+        return "1" if valeur else "0"
+    if isinstance(valeur, Decimal):
+        return format(valeur, "f")  # jamais de notation scientifique
+    if isinstance(valeur, bytes):
+        return valeur.hex()  # décodé par UNHEX() au chargement
+    if isinstance(valeur, str):
+        return valeur.translate(_ECHAPPEMENTS_TSV)
+    return str(valeur)
+
+
+def ecrire_tsv(
+    fichier: IO[str], colonnes: list[str], lignes: list[dict[str, Any]]
+) -> None:
+    for ligne in lignes:
+        fichier.write("\t".join(valeur_tsv(ligne.get(nom)) for nom in colonnes))
+        fichier.write("\n")
+
+
+class BulkWriter:
+    """
+    Écriture des DECP via des `INSERT` Core groupés (executemany), sans passer
+    par l'unité de travail de l'ORM.
+
+    Les clefs primaires sont pré-allouées à partir du `MAX(uid)` de chaque
+    table, ce qui permet aux tables filles de référencer leur parent sans
+    aller-retour avec la base. Les `uid` sont attribués dans le même ordre
+    que le ferait l'ORM, le contenu des tables est donc identique.
+
+    Un marché ou une concession peut aussi remplacer un contrat existant
+    (import incrémental) : la ligne est alors mise à jour en conservant son
+    `uid` et ses tables filles sont recréées.
+
+    `cibles` permet d'écrire certaines tables dans des tables de même
+    structure mais de nom différent (tables fantômes, voir `app.helpers.ombre`).
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        preload_db: bool = True,
+        cibles: dict[Table, Table] | None = None,
+        load_data: bool = False,
+    ):
+        self._session = session
+        self._cibles: dict[Table, Table] = cibles or {}
+        self._load_data = load_data
+
+        self._prochains_uid: dict[Table, int] = {}
+        self._lignes: dict[Table, list[dict[str, Any]]] = defaultdict(list)
+        self._lignes_a_maj: dict[Table, list[dict[str, Any]]] = defaultdict(list)
+        self._enfants_a_supprimer: dict[Table, set[int]] = defaultdict(set)
+
+        # clef -> [uid, acheteur, vendeur]
+        self._structures: dict[CleStructure, list[Any]] = {}
+        self._structures_a_creer: dict[CleStructure, list[Any]] = {}
+        self._structures_a_maj: dict[int, list[Any]] = {}
+        self._lieux: dict[CleLieu, int] = {}
+        # clef comparée comme par MariaDB (voir `cle_collation`) -> uid
+        self._erreurs: dict[CleErreur, int] = {}
+
+        if preload_db:
+            self.load_structures()
+            self.load_lieux()
+            self.load_erreurs()
+
+    def load_structures(self) -> None:
+        for (
+            uid,
+            identifiant,
+            type_identifiant,
+            acheteur,
+            vendeur,
+        ) in self._session.execute(
+            select(
+                Structure.uid,
+                Structure.identifiant,
+                Structure.type_identifiant,
+                Structure.acheteur,
+                Structure.vendeur,
+            )
+        ):
+            self._structures[(identifiant, type_identifiant)] = [
+                uid,
+                acheteur,
+                vendeur,
+            ]
+
+    def load_lieux(self) -> None:
+        for uid, code, type_code in self._session.execute(
+            select(Lieu.uid, Lieu.code, Lieu.type_code)
+        ):
+            self._lieux[(code, type_code)] = uid
+
+    def load_erreurs(self) -> None:
+        erreur = self._cible(get_table(Erreur))
+        for ligne in self._session.execute(
+            select(erreur.c.uid, erreur.c.type, erreur.c.localisation, erreur.c.message)
+        ):
+            self._erreurs[
+                cle_collation((ligne.type, ligne.localisation, ligne.message))
+            ] = ligne.uid
+
+    def _cible(self, table: Table) -> Table:
+        """Table réellement écrite pour `table`."""
+        return self._cibles.get(table, table)
+
+    def allouer_uid(self, table: Table) -> int:
+        if table not in self._prochains_uid:
+            self._prochains_uid[table] = (
+                self._session.execute(
+                    select(func.max(self._cible(table).c.uid))
+                ).scalar()
+                or 0
+            ) + 1
+        uid = self._prochains_uid[table]
+        self._prochains_uid[table] += 1
+        return uid
+
+    def ajouter(self, table: Table, ligne: dict[str, Any]) -> int:
+        """Ajoute une ligne à insérer dans `table` et retourne son `uid`."""
+        ligne["uid"] = self.allouer_uid(table)
+        self._lignes[table].append(ligne)
+        return int(ligne["uid"])
+
+    def structure(
+        self, cle: CleStructure, acheteur: bool = False, vendeur: bool = False
+    ) -> int:
+        """Retourne l'`uid` de la structure, en la créant si besoin."""
+        etat = self._structures.get(cle)
+        if etat is None:
+            etat = [self.allouer_uid(get_table(Structure)), False, False]
+            self._structures[cle] = etat
+            self._structures_a_creer[cle] = etat
+
+        if (acheteur and not etat[1]) or (vendeur and not etat[2]):
+            etat[1] = etat[1] or acheteur
+            etat[2] = etat[2] or vendeur
+            if cle not in self._structures_a_creer:  # déjà présente en base
+                self._structures_a_maj[etat[0]] = etat
+
+        return int(etat[0])
+
+    def lieu(self, cle: CleLieu) -> int:
+        """Retourne l'`uid` du lieu, en le créant si besoin."""
+        if cle not in self._lieux:
+            self._lieux[cle] = self.ajouter(
+                get_table(Lieu), {"code": cle[0], "type_code": cle[1]}
+            )
+        return self._lieux[cle]
+
+    def erreur(self, cle: CleErreur) -> int:
+        """Retourne l'`uid` de l'erreur, en la créant si besoin."""
+        index = cle_collation(cle)
+        if index not in self._erreurs:
+            self._erreurs[index] = self.ajouter(
+                get_table(Erreur),
+                {"type": cle[0], "localisation": cle[1], "message": cle[2]},
+            )
+        return self._erreurs[index]
+
+    def remplacer(self, table: Table, uid: int, ligne: dict[str, Any]) -> int:
+        """Met à jour la ligne `uid` de `table` et supprime ses tables filles."""
+        ligne["uid"] = uid
+        self._lignes_a_maj[table].append(ligne)
+        self._enfants_a_supprimer[table].add(uid)
+        return uid
+
+    def en_attente(self, table: Table, uid: int) -> bool:
+        """
+        Vrai si la ligne `uid` de `table` (ou son remplacement) n'a pas encore
+        été envoyée en base.
+        """
+        lignes = self._lignes.get(table)
+        if lignes and uid >= lignes[0]["uid"]:
+            return True
+        return uid in self._enfants_a_supprimer.get(table, ())
+
+    def write_marche(self, lignes: LignesMarche, uid: int | None = None) -> int:
+        """Écrit le marché (ou remplace le marché `uid`) et retourne son `uid`."""
+        ligne = dict(lignes.ligne)
+        ligne["uid_acheteur"] = self.structure(lignes.acheteur, acheteur=True)
+        # rattaché une fois tous les marchés importés (`lier_accords_cadre`)
+        ligne["uid_accord_cadre"] = None
+        ligne["uid_lieu"] = self.lieu(lignes.lieu) if lignes.lieu else None
+        titulaires = [self.structure(t, vendeur=True) for t in lignes.titulaires]
+
+        uid_marche = (
+            self.remplacer(get_table(Marche), uid, ligne)
+            if uid
+            else self.ajouter(get_table(Marche), ligne)
+        )
+        for technique in lignes.techniques:
+            self.ajouter(
+                get_table(TechniqueAchatMarche),
+                {"uid_marche": uid_marche, "technique": technique},
+            )
+        for consideration in lignes.considerations_sociales:
+            self.ajouter(
+                get_table(ConsiderationSocialeMarche),
+                {"uid_marche": uid_marche, "consideration": consideration},
+            )
+        for consideration in lignes.considerations_environnementales:
+            self.ajouter(
+                get_table(ConsiderationEnvMarche),
+                {"uid_marche": uid_marche, "consideration": consideration},
+            )
+
+        for acte in lignes.actes_sous_traitance:
+            uid_acte = self.ajouter(
+                get_table(ActeSousTraitance),
+                acte.ligne
+                | {
+                    "uid_marche": uid_marche,
+                    "uid_sous_traitant": self.structure(
+                        acte.sous_traitant, vendeur=True
+                    ),
+                },
+            )
+            for modif_acte in acte.modifications:
+                self.ajouter(
+                    get_table(ModificationSousTraitance),
+                    modif_acte | {"uid_acte_sous_traitance": uid_acte},
+                )
+
+        for modification in lignes.modifications:
+            titulaires_modif = [
+                self.structure(t, vendeur=True) for t in modification.titulaires
+            ]
+            uid_modif = self.ajouter(
+                get_table(ModificationMarche),
+                modification.ligne | {"uid_marche": uid_marche},
+            )
+            for uid_titulaire in titulaires_modif:
+                self._lignes[modification_titulaire_table].append(
+                    {"uid_modification": uid_modif, "uid_titulaire": uid_titulaire}
+                )
+            titulaires = titulaires_modif
+
+        for uid_titulaire in titulaires:
+            self._lignes[marche_titulaire_table].append(
+                {"uid_marche": uid_marche, "uid_titulaire": uid_titulaire}
+            )
+
+        return uid_marche
+
+    def write_concession(
+        self, lignes: LignesConcession, uid: int | None = None
+    ) -> None:
+        ligne = dict(lignes.ligne)
+        ligne["uid_autorite"] = self.structure(
+            lignes.autorite_concedante, acheteur=True
+        )
+        uid_concession = (
+            self.remplacer(get_table(ContratConcession), uid, ligne)
+            if uid
+            else self.ajouter(get_table(ContratConcession), ligne)
+        )
+
+        for donnee in lignes.donnees_execution:
+            uid_donnee = self.ajouter(
+                get_table(DonneeExecution),
+                donnee.ligne | {"uid_contrat_concession": uid_concession},
+            )
+            for tarif in donnee.tarifs:
+                self.ajouter(
+                    get_table(Tarif), tarif | {"uid_donnee_execution": uid_donnee}
+                )
+
+        for concessionnaire in lignes.concessionnaires:
+            self._lignes[concession_structure_table].append(
+                {
+                    "uid_concession": uid_concession,
+                    "uid_concessionnaire": self.structure(
+                        concessionnaire, vendeur=True
+                    ),
+                }
+            )
+
+        for modification in lignes.modifications:
+            self.ajouter(
+                get_table(ModificationConcession),
+                modification | {"uid_concession": uid_concession},
+            )
+
+    def write_erreur(self, lignes: LignesErreur) -> None:
+        ligne = dict(lignes.ligne)
+        ligne["uid_structure"] = (
+            self.structure(lignes.structure) if lignes.structure else None
+        )
+        uid_decp = self.ajouter(get_table(DecpMalForme), ligne)
+        for cle in lignes.erreurs:
+            self._lignes[decp_erreur_table].append(
+                {"uid_decp": uid_decp, "uid_erreur": self.erreur(cle)}
+            )
+
+    def __len__(self) -> int:
+        return (
+            sum(len(lignes) for lignes in self._lignes.values())
+            + sum(len(lignes) for lignes in self._lignes_a_maj.values())
+            + len(self._structures_a_creer)
+        )
+
+    def _supprimer_enfants(
+        self, table: Table, uids: Sequence[int], detacher: bool = False
+    ) -> None:
+        """
+        Supprime récursivement les lignes des tables filles de `table`
+        (clefs étrangères vers `table.uid`). Si `detacher`, les références
+        internes à `table` (accords-cadres) sont aussi remises à `NULL`.
+        """
+        for enfant in reversed(Base.metadata.sorted_tables):
+            for fk in enfant.foreign_keys:
+                if fk.column is not table.c.uid:
+                    continue
+                cible = self._cible(enfant)
+                colonne = cible.c[fk.parent.name]
+                if enfant is table:
+                    if detacher:
+                        self._session.execute(
+                            update(cible)
+                            .where(colonne.in_(uids))
+                            .values({colonne: None})
+                        )
+                    continue
+                if "uid" in enfant.c:
+                    sous_uids: list[int] = list(
+                        self._session.execute(
+                            select(cible.c.uid).where(colonne.in_(uids))
+                        ).scalars()
+                    )
+                    if sous_uids:
+                        self._supprimer_enfants(enfant, sous_uids)
+                self._session.execute(delete(cible).where(colonne.in_(uids)))
+
+    def supprimer(
+        self, table: Table, uids: Sequence[int], taille_lot: int = 1_000
+    ) -> None:
+        """Supprime les lignes `uids` de `table` ainsi que leurs tables filles."""
+        for lot in batched(uids, taille_lot):
+            self._supprimer_enfants(table, lot, detacher=True)
+            cible = self._cible(table)
+            self._session.execute(delete(cible).where(cible.c.uid.in_(lot)))
+
+    def flush(self) -> None:
+        """
+        Envoie toutes les lignes en attente, table par table, dans l'ordre
+        des dépendances entre clefs étrangères.
+        """
+        if self._structures_a_creer:
+            self._session.execute(
+                insert(self._cible(get_table(Structure))),
+                [
+                    {
+                        "uid": uid,
+                        "identifiant": identifiant,
+                        "type_identifiant": type_identifiant,
+                        "acheteur": acheteur,
+                        "vendeur": vendeur,
+                    }
+                    for (identifiant, type_identifiant), (
+                        uid,
+                        acheteur,
+                        vendeur,
+                    ) in self._structures_a_creer.items()
+                ],
+            )
+            self._structures_a_creer = {}
+
+        for table, uids in self._enfants_a_supprimer.items():
+            for lot in batched(uids, 1_000):
+                self._supprimer_enfants(table, lot)
+        self._enfants_a_supprimer.clear()
+
+        for table in Base.metadata.sorted_tables:
+            if not self._lignes.get(table):
+                continue
+            if self._load_data and table in TABLES_LOAD_DATA:
+                self.charger(table, self._lignes[table])
+            else:
+                self._session.execute(insert(self._cible(table)), self._lignes[table])
+        self._lignes.clear()
+
+        for table, lignes in self._lignes_a_maj.items():
+            colonnes = [colonne for colonne in lignes[0] if colonne != "uid"]
+            cible = self._cible(table)
+            self._session.execute(
+                update(cible)
+                .where(cible.c.uid == bindparam("b_uid"))
+                .values({colonne: bindparam(f"b_{colonne}") for colonne in colonnes}),
+                [
+                    {f"b_{colonne}": valeur for colonne, valeur in ligne.items()}
+                    for ligne in lignes
+                ],
+            )
+        self._lignes_a_maj.clear()
+
+        if self._structures_a_maj:
+            self._session.execute(
+                update(get_table(Structure))
+                .where(get_table(Structure).c.uid == bindparam("b_uid"))
+                .values(
+                    acheteur=bindparam("b_acheteur"), vendeur=bindparam("b_vendeur")
+                ),
+                [
+                    {"b_uid": uid, "b_acheteur": acheteur, "b_vendeur": vendeur}
+                    for uid, acheteur, vendeur in self._structures_a_maj.values()
+                ],
+            )
+            self._structures_a_maj = {}
+
+    def charger(self, table: Table, lignes: list[dict[str, Any]]) -> None:
+        """
+        Écrit `lignes` dans un fichier TSV puis le charge dans `table` via
+        `LOAD DATA LOCAL INFILE` (la connexion doit l'autoriser, voir
+        `get_engine`). Les colonnes binaires (listes sérialisées par
+        `PickleType`) sont transmises en hexadécimal.
+
+        Lève `ChargementIncomplet` si le nombre de lignes chargées diffère du
+        nombre de lignes écrites.
+        """
+        cible = self._cible(table)
+        dialecte = self._session.get_bind().dialect
+        colonnes = list(lignes[0])
+
+        champs: list[str] = []
+        conversions: list[str] = []
+        processeurs: dict[str, Callable[[Any], Any]] = {}
+        for nom in colonnes:
+            colonne = cible.c[nom]
+            processeur = colonne.type.bind_processor(dialecte)
+            if processeur is not None:
+                processeurs[nom] = processeur
+            nom_sql = dialecte.identifier_preparer.quote(nom)
+            if isinstance(colonne.type, (PickleType, LargeBinary)):
+                champs.append(f"@{nom}")
+                conversions.append(f"{nom_sql} = UNHEX(@{nom})")
+            else:
+                champs.append(nom_sql)
+
+        if processeurs:
+            lignes = [
+                ligne
+                | {
+                    nom: processeur(ligne.get(nom))
+                    for nom, processeur in processeurs.items()
+                }
+                for ligne in lignes
+            ]
+
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=f".{cible.name}.tsv", encoding="utf-8", newline=""
+        ) as spool:
+            ecrire_tsv(spool, colonnes, lignes)
+            spool.flush()
+            resultat = self._session.execute(
+                text(
+                    f"LOAD DATA LOCAL INFILE '{spool.name}' "
+                    f"INTO TABLE {dialecte.identifier_preparer.quote(cible.name)} "
+                    "CHARACTER SET utf8mb4 "
+                    "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+                    "LINES TERMINATED BY '\\n' "
+                    f"({', '.join(champs)})"
+                    + (f" SET {', '.join(conversions)}" if conversions else "")
+                )
+            )
+
+        charges = cast(CursorResult[Any], resultat).rowcount
+        if charges != len(lignes):
+            raise ChargementIncomplet(
+                f"{cible.name} : {charges} lignes chargées sur {len(lignes)}"
+            )
@@ -1,20 +1,82 @@
+import json
+from dataclasses import dataclass, field
 from datetime import date
 
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 
 from app.models.db import Conf
 
 
-def create_or_update(session: Session, clef: str, valeur: str) -> None:
+def create_or_update(
+    session: Session, clef: str, valeur: str, commit: bool = True
+) -> None:
     existant = session.execute(select(Conf).where(Conf.clef == clef)).scalar()
     if existant:
         existant.valeur = valeur
     else:
         session.add(Conf(clef=clef, valeur=valeur))
 
-    session.commit()
+    if commit:
+        session.commit()
 
 
 def set_dernier_import(session: Session) -> None:
     create_or_update(session, "dernier_import", date.today().strftime("%Y-%m-%d"))
+
+
+@dataclass
+class PointDeReprise:
+    """
+    Avancement d'un import : `objets` ont déjà été lus et écrits en base depuis
+    le début de `source`, avec les compteurs par type de contrat associés
+    (`ignores` : objets écartés par le filtre des SIRET).
+    """
+
+    source: str
+    objets: int = 0
+    valides: dict[str, int] = field(default_factory=dict)
+    invalides: dict[str, int] = field(default_factory=dict)
+    ignores: dict[str, int] = field(default_factory=dict)
+
+
+def set_point_de_reprise(session: Session, point: PointDeReprise) -> None:
+    """
+    Enregistre le point de reprise sans commit : il est validé avec la
+    transaction des objets qu'il couvre.
+    """
+    create_or_update(session, "reprise_source", point.source, commit=False)
+    create_or_update(
+        session,
+        "reprise_etat",
+        json.dumps(
+            {
+                "objets": point.objets,
+                "valides": point.valides,
+                "invalides": point.invalides,
+                "ignores": point.ignores,
+            }
+        ),
+        commit=False,
+    )
+
+
+def get_point_de_reprise(session: Session) -> PointDeReprise | None:
+    valeurs = {
+        conf.clef: conf.valeur
+        for conf in session.execute(
+            select(Conf).where(Conf.clef.in_(("reprise_source", "reprise_etat")))
+        ).scalars()
+    }
+    if "reprise_source" not in valeurs:
+        return None
+
+    etat = json.loads(valeurs.get("reprise_etat", "{}"))
+    return PointDeReprise(source=valeurs["reprise_source"], **etat)
+
+
+def delete_point_de_reprise(session: Session) -> None:
+    session.execute(
+        delete(Conf).where(Conf.clef.in_(("reprise_source", "reprise_etat")))
+    )
+    session.commit()
@@ -0,0 +1,63 @@
+from sqlalchemy import (
+    Connection,
+    ForeignKeyConstraint,
+    MetaData,
+    Table,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.schema import Constraint, CreateIndex, CreateTable
+
+
+def get_contraintes(table: Table) -> list[Constraint]:
+    """Contraintes de `table` dont la création peut être différée."""
+    return [
+        contrainte
+        for contrainte in table.constraints
+        if isinstance(contrainte, (ForeignKeyConstraint, UniqueConstraint))
+    ]
+
+
+def creer_tables_sans_contraintes(connexion: Connection, tables: list[Table]) -> None:
+    """
+    Crée `tables` avec leur seule clef primaire : ni clef étrangère, ni
+    contrainte d'unicité, ni index secondaire, à ajouter une fois les données
+    chargées (voir `ajouter_contraintes`).
+    """
+    metadata = MetaData()
+    for table in tables:
+        copie = table.to_metadata(metadata)
+        for contrainte in get_contraintes(copie):
+            copie.constraints.discard(contrainte)
+        copie.indexes.clear()
+        connexion.execute(CreateTable(copie, include_foreign_key_constraints=[]))
+
+
+def ajouter_contraintes(connexion: Connection, tables: list[Table]) -> None:
+    """
+    Ajoute les contraintes et index des `tables` créées par
+    `creer_tables_sans_contraintes`.
+
+    Les contraintes d'une table sont ajoutées par un unique `ALTER TABLE`,
+    pour que MariaDB ne la reconstruise qu'une fois. Les clefs étrangères
+    sont vérifiées sur les données déjà chargées : une ligne orpheline ou un
+    doublon fait échouer l'opération.
+    """
+    connexion.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+    for table in tables:
+        contraintes = get_contraintes(table)
+        if contraintes:
+            compilateur = connexion.dialect.ddl_compiler(
+                connexion.dialect, CreateTable(table)
+            )
+            connexion.execute(
+                text(
+                    f"ALTER TABLE {table.name} "
+                    + ", ".join(
+                        f"ADD {compilateur.process(contrainte)}"
+                        for contrainte in contraintes
+                    )
+                )
+            )
+        for index in table.indexes:
+            connexion.execute(CreateIndex(index))
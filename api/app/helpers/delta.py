@@ -0,0 +1,99 @@
+import hashlib
+import json
+from collections import Counter
+from typing import Any
+
+from sqlalchemy import Table, select
+from sqlalchemy.orm import Session
+
+from app.helpers.bulk import get_table
+from app.models.db import ContratConcession, Marche, Structure
+
+# (id du contrat, identifiant de l'acheteur ou de l'autorité concédante)
+CleContrat = tuple[str, str]
+
+
+def serialiser(objet: dict[str, Any]) -> bytes:
+    """
+    JSON compact du DECP brut, indépendant de l'ordre des clefs : sert à la
+    fois au calcul de son empreinte et au stockage des DECP mal formés.
+    """
+    return json.dumps(
+        objet, sort_keys=True, default=str, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def calculer_empreinte(brut: bytes) -> str:
+    """Hash du DECP brut sérialisé par `serialiser`."""
+    return hashlib.sha256(brut).hexdigest()
+
+
+class Delta:
+    """
+    Rapprochement entre les contrats présents en base et ceux d'un nouvel
+    import, à partir de leur clef métier et de leur empreinte.
+
+    Chaque contrat importé est soit nouveau, soit inchangé, soit modifié (il
+    remplace alors un contrat existant de même clef, dont l'`uid` est
+    conservé). Les contrats existants qui n'ont pas été rapprochés à la fin de
+    l'import ont disparu des sources.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+        self._existants: dict[Table, dict[CleContrat, list[tuple[int, str | None]]]] = {
+            get_table(Marche): {},
+            get_table(ContratConcession): {},
+        }
+        self.stats: dict[Table, Counter[str]] = {
+            table: Counter() for table in self._existants
+        }
+
+    def load(self) -> None:
+        for table, entite, uid_acheteur in (
+            (get_table(Marche), Marche, Marche.uid_acheteur),
+            (
+                get_table(ContratConcession),
+                ContratConcession,
+                ContratConcession.uid_autorite,
+            ),
+        ):
+            existants = self._existants[table]
+            existants.clear()
+            for uid, id, identifiant, empreinte in self._session.execute(
+                select(entite.uid, entite.id, Structure.identifiant, entite.empreinte)
+                .join(Structure, Structure.uid == uid_acheteur)
+                .order_by(entite.uid)
+            ):
+                existants.setdefault((id, identifiant), []).append((uid, empreinte))
+
+    def rapprocher(
+        self, table: Table, cle: CleContrat, empreinte: str
+    ) -> tuple[bool, int | None]:
+        """
+        Retourne `(a_ecrire, uid)` : `a_ecrire` est faux si le contrat est
+        inchangé, `uid` est celui du contrat existant à remplacer, s'il y en a.
+        """
+        candidats = self._existants[table].get(cle)
+        if not candidats:
+            self.stats[table]["nouveaux"] += 1
+            return True, None
+
+        for index, (uid, existante) in enumerate(candidats):
+            if existante == empreinte:
+                del candidats[index]
+                self.stats[table]["inchangés"] += 1
+                return False, uid
+
+        uid, _ = candidats.pop(0)
+        self.stats[table]["modifiés"] += 1
+        return True, uid
+
+    def disparus(self, table: Table) -> list[int]:
+        """`uid` des contrats existants qui n'ont été rapprochés d'aucun import."""
+        uids = [
+            uid for candidats in self._existants[table].values() for uid, _ in candidats
+        ]
+        self._existants[table].clear()
+        self.stats[table]["supprimés"] += len(uids)
+        return uids
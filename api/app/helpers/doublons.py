@@ -0,0 +1,88 @@
+import hashlib
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import Table, select
+from sqlalchemy.orm import Session
+
+from app.models.db import Structure
+
+# (identifiant de l'acheteur, id du marché, date de notification)
+CleDoublon = tuple[str, str, date]
+
+# nombre de bits de l'`uid` dans la valeur associée à chaque empreinte
+BITS_UID = 40
+
+
+def empreinte_doublon(cle: CleDoublon) -> int:
+    """Empreinte de 8 octets de la clef, plus compacte en mémoire qu'un tuple."""
+    return int.from_bytes(
+        hashlib.blake2b(
+            "\x1f".join((cle[0], cle[1], cle[2].isoformat())).encode(), digest_size=8
+        ).digest()
+    )
+
+
+class Doublons:
+    """
+    Détection, au fil de l'import, des marchés publiés par plusieurs sources
+    (ou plusieurs fois par une même source).
+
+    Pour chaque clef rencontrée sont conservées la date de publication et
+    l'`uid` du marché importé : seule la publication la plus récente est
+    gardée, en remplaçant le cas échéant le marché déjà importé. À date de
+    publication égale, c'est le premier marché rencontré qui est gardé.
+
+    Les clefs sont réduites à leur empreinte (`empreinte_doublon`), et la date
+    de publication (jour ordinal, 0 si absente) et l'`uid` sont combinés en un
+    seul entier.
+    """
+
+    def __init__(self) -> None:
+        self._vus: dict[int, int] = {}
+        self.stats: Counter[str] = Counter()
+
+    def __len__(self) -> int:
+        return len(self._vus)
+
+    def load(self, session: Session, marche: Table) -> None:
+        """Reprend les marchés déjà importés dans `marche` (import interrompu)."""
+        for ligne in session.execute(
+            select(
+                marche.c.uid,
+                marche.c.id,
+                marche.c.date_notification,
+                marche.c.date_publication,
+                Structure.identifiant,
+            )
+            .join(Structure, Structure.uid == marche.c.uid_acheteur)
+            .order_by(marche.c.uid)
+        ):
+            self.enregistrer(
+                (ligne.identifiant, ligne.id, ligne.date_notification),
+                ligne.date_publication,
+                ligne.uid,
+            )
+
+    def rapprocher(
+        self, cle: CleDoublon, publication: date | None
+    ) -> tuple[bool, int | None]:
+        """
+        Retourne `(a_ecrire, uid)` : `a_ecrire` est faux si un marché de même
+        clef, publié au plus tard à la même date, a déjà été importé ; `uid` est
+        celui du marché moins récent à remplacer, s'il y en a un.
+        """
+        vu = self._vus.get(empreinte_doublon(cle))
+        if vu is None:
+            return True, None
+
+        if publication is not None and publication.toordinal() > vu >> BITS_UID:
+            self.stats["remplacés"] += 1
+            return True, vu & ((1 << BITS_UID) - 1)
+
+        self.stats["ignorés"] += 1
+        return False, None
+
+    def enregistrer(self, cle: CleDoublon, publication: date | None, uid: int) -> None:
+        ordinal = publication.toordinal() if publication is not None else 0
+        self._vus[empreinte_doublon(cle)] = ordinal << BITS_UID | uid
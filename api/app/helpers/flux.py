@@ -0,0 +1,355 @@
+import codecs
+import io
+import threading
+import time
+from collections import deque
+from collections.abc import Generator, Iterable, Iterator, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from typing import IO, Any, cast
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import ijson
+import requests
+
+
+@dataclass
+class StatsFlux:
+    """Volume lu (après décompression) et temps passé à lire et nettoyer."""
+
+    octets: int = 0
+    duree_lecture: float = 0.0
+    duree_nettoyage: float = 0.0
+
+
+@dataclass(frozen=True)
+class Validateurs:
+    """En-têtes HTTP identifiant la version d'une source déjà importée."""
+
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def entetes(self) -> dict[str, str]:
+        """En-têtes d'une requête conditionnelle sur cette version."""
+        entetes: dict[str, str] = {}
+        if self.etag:
+            entetes["If-None-Match"] = self.etag
+        if self.last_modified:
+            entetes["If-Modified-Since"] = self.last_modified
+        return entetes
+
+
+class FiltreNaN(io.RawIOBase):
+    """
+    Flux binaire en lecture seule qui remplace à la volée les `NaN` (invalides
+    en JSON) par des `null`, ainsi que les octets UTF-8 invalides ignorés.
+
+    Les données sont traitées bloc par bloc : la fin d'un bloc pouvant
+    contenir le début d'un `NaN`, elle est conservée jusqu'au bloc suivant.
+    """
+
+    def __init__(
+        self,
+        source: IO[bytes],
+        taille_bloc: int = 256 * 1024,
+        stats: StatsFlux | None = None,
+    ):
+        self._source = source
+        self._taille_bloc = taille_bloc
+        self._stats = stats
+        self._decodeur = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._reste: str = ""
+        self._tampon: bytes = b""
+        self._position: int = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _remplir(self) -> bool:
+        """Prépare le bloc suivant, retourne `False` en fin de flux."""
+        while True:
+            debut = time.perf_counter()
+            bloc = self._source.read(self._taille_bloc)
+            lu = time.perf_counter()
+            texte = self._reste + self._decodeur.decode(bloc, final=not bloc)
+            texte = texte.replace("NaN", "null")
+            if bloc and texte.endswith(("N", "Na")):
+                coupure = -2 if texte.endswith("Na") else -1
+                texte, self._reste = texte[:coupure], texte[coupure:]
+            else:
+                self._reste = ""
+
+            if self._stats is not None:
+                self._stats.octets += len(bloc)
+                self._stats.duree_lecture += lu - debut
+                self._stats.duree_nettoyage += time.perf_counter() - lu
+
+            if texte or not bloc:
+                self._tampon = texte.encode("utf-8")
+                self._position = 0
+                return bool(texte)
+
+    def readinto(self, b: Any) -> int:
+        if self._position >= len(self._tampon) and not self._remplir():
+            return 0
+
+        taille = min(len(b), len(self._tampon) - self._position)
+        b[:taille] = self._tampon[self._position : self._position + taille]
+        self._position += taille
+        return taille
+
+
+class Telechargement:
+    """
+    Source DECP (`http(s)://` ou `file://`), dont la requête est envoyée en
+    tâche de fond dès la création de l'objet.
+
+    Une source téléchargée en avance (voir `precharger_sources`) est lue en
+    mémoire par blocs de `taille_bloc` octets, dans la limite de `taille_max`
+    octets, en attendant son traitement. À l'ouverture (`ouvrir`), ces blocs
+    sont relus puis la suite est lue directement depuis la réponse HTTP, au
+    rythme du traitement et sans écriture sur le disque. Une source `file://`
+    est lue directement.
+
+    Si les `validateurs` de la version déjà importée sont fournis, la requête
+    est conditionnelle : une source inchangée (304) n'est pas téléchargée
+    (voir `est_inchangee`).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        validateurs: Validateurs | None = None,
+        stats: StatsFlux | None = None,
+        taille_bloc: int = 1024 * 1024,
+        taille_max: int = 0,
+    ):
+        self.url = url
+        self.stats = stats if stats is not None else StatsFlux()
+        # validateurs de la version téléchargée, à conserver pour le prochain import
+        self.validateurs = Validateurs()
+        self._taille_bloc = taille_bloc
+        self._taille_max = taille_max
+        self._inchangee = False
+
+        # état du préchargement, partagé avec le thread qui l'effectue
+        self._reponse = threading.Event()
+        self._arret = threading.Event()
+        self._blocs: deque[bytes] = deque()
+        self._response: requests.Response | None = None
+        self._source: IO[bytes] | None = None
+        self._fichier: io.FileIO | None = None
+
+        parsed = urlparse(url)
+        self._executeur: ThreadPoolExecutor | None = None
+        if parsed.scheme == "file":
+            self._fichier = io.FileIO(url2pathname(parsed.path))
+            self._reponse.set()
+            return
+
+        self._executeur = ThreadPoolExecutor(1, thread_name_prefix="telechargement")
+        self._resultat: Future[None] = self._executeur.submit(
+            self._precharger, validateurs or Validateurs()
+        )
+
+    def _precharger(self, validateurs: Validateurs) -> None:
+        try:
+            self._response = response = requests.get(
+                self.url, headers=validateurs.entetes(), stream=True, timeout=60
+            )
+            if response.status_code == 304:
+                self._inchangee = True
+                return
+            response.raise_for_status()
+            self.validateurs = Validateurs(
+                response.headers.get("ETag"), response.headers.get("Last-Modified")
+            )
+            response.raw.decode_content = True  # décompression gzip éventuelle
+            self._source = cast(IO[bytes], response.raw)
+            self._reponse.set()
+
+            taille = 0
+            while taille < self._taille_max and not self._arret.is_set():
+                bloc = self._source.read(
+                    min(self._taille_bloc, self._taille_max - taille)
+                )
+                if not bloc:
+                    return
+                self._blocs.append(bloc)
+                taille += len(bloc)
+        finally:
+            self._reponse.set()
+
+    def est_inchangee(self) -> bool:
+        """
+        Attend la réponse du serveur : vrai si la source n'a pas changé depuis
+        la version décrite par les validateurs. Lève l'erreur de la requête
+        s'il y en a eu une.
+        """
+        self._reponse.wait()
+        if self._executeur is not None and self._source is None:
+            self._resultat.result()
+        return self._inchangee
+
+    def ouvrir(self) -> IO[bytes]:
+        """
+        Flux binaire nettoyé des `NaN` : les blocs déjà préchargés, puis la
+        suite de la réponse. `stats` est alimenté au fil de la lecture : le
+        temps de lecture est celui passé à attendre le réseau.
+        """
+        if self._fichier is not None:
+            source = cast(IO[bytes], self._fichier)
+        else:
+            # arrêt du préchargement, le flux est désormais lu par l'appelant
+            self._arret.set()
+            self._resultat.result()
+            source = cast(
+                IO[bytes],
+                _LecteurTelechargement(self._blocs, cast(IO[bytes], self._source)),
+            )
+        return io.BufferedReader(
+            FiltreNaN(source, taille_bloc=self._taille_bloc, stats=self.stats)
+        )
+
+    def fermer(self) -> None:
+        """Interrompt le téléchargement s'il est en cours et libère la connexion."""
+        self._arret.set()
+        if self._executeur is not None:
+            self._executeur.shutdown()
+            if self._response is not None:
+                self._response.close()
+        if self._fichier is not None:
+            self._fichier.close()
+        self._blocs.clear()
+
+
+class _LecteurTelechargement(io.RawIOBase):
+    """Relit les blocs préchargés, puis poursuit la lecture de `source`."""
+
+    def __init__(self, blocs: deque[bytes], source: IO[bytes]):
+        self._blocs = blocs
+        self._source = source
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        if not self._blocs:
+            bloc = self._source.read(len(b))
+        else:
+            bloc = self._blocs.popleft()
+            if len(bloc) > len(b):
+                bloc, reste = bloc[: len(b)], bloc[len(b) :]
+                self._blocs.appendleft(reste)
+        b[: len(bloc)] = bloc
+        return len(bloc)
+
+
+def precharger_sources(
+    urls: Iterable[str],
+    validateurs: Mapping[str, Validateurs] | None = None,
+    avance: int = 1,
+    taille_max: int = 64 * 1024 * 1024,
+) -> Generator[Telechargement]:
+    """
+    Producteur des sources à importer, dans l'ordre : pendant le traitement
+    d'une source, les `avance` suivantes sont déjà en cours de téléchargement,
+    dans la limite de `taille_max` octets gardés en mémoire chacune.
+
+    Le nombre de téléchargements en cours est ainsi borné, et chaque source est
+    libérée dès que le consommateur passe à la suivante.
+    """
+    validateurs = validateurs or {}
+    telechargements = (
+        Telechargement(url, validateurs.get(url), taille_max=taille_max) for url in urls
+    )
+    en_cours: deque[Telechargement] = deque(islice(telechargements, avance + 1))
+    try:
+        while en_cours:
+            telechargement = en_cours.popleft()
+            try:
+                yield telechargement
+            finally:
+                telechargement.fermer()
+            en_cours.extend(islice(telechargements, 1))
+    finally:
+        for telechargement in en_cours:
+            telechargement.fermer()
+
+
+@contextmanager
+def ouvrir_source(url: str, stats: StatsFlux | None = None) -> Iterator[IO[bytes]]:
+    """
+    Ouvre une source DECP (`http(s)://` ou `file://`) sous forme de flux
+    binaire nettoyé des `NaN` (voir `Telechargement`).
+
+    `stats` est alimenté au fil de la lecture du flux.
+    """
+    telechargement = Telechargement(url, stats=stats)
+    try:
+        telechargement.est_inchangee()  # erreur HTTP éventuelle
+        yield telechargement.ouvrir()
+    finally:
+        telechargement.fermer()
+
+
+def iter_items[T](
+    f: IO[bytes], prefixes: dict[str, T], buf_size: int = 256 * 1024
+) -> Iterator[tuple[T, Any]]:
+    """
+    Parcourt le JSON en une seule passe et retourne, dans l'ordre du fichier,
+    chaque objet situé sous l'un des `prefixes` (au sens d'`ijson.items`)
+    accompagné de la valeur associée à ce préfixe.
+
+    Les objets sont reconstruits directement depuis le flux d'événements
+    d'`ijson.parse`, ce qui évite de relire et reparser le fichier pour chaque
+    préfixe : une source HTTP n'est ainsi téléchargée qu'une fois, pour un coût
+    de calcul comparable à celui de deux passes d'`ijson.items` (voir
+    `tests/benchmark_flux.py`).
+    """
+    if len(prefixes) == 1:
+        # un seul préfixe : `ijson.items` (implémenté en C) est plus rapide
+        ((prefix, associe),) = prefixes.items()
+        for objet in ijson.items(f, prefix, buf_size=buf_size):
+            yield associe, objet
+        return
+
+    events = ijson.parse(f, buf_size=buf_size)
+    for prefix, event, value in events:
+        if event != "start_map" or prefix not in prefixes:
+            continue
+
+        racine: dict[str, Any] = {}
+        pile: list[Any] = [racine]
+        cle: str = ""
+        for _, event, value in events:
+            if event == "map_key":
+                cle = value
+                continue
+
+            if event == "end_map" or event == "end_array":
+                pile.pop()
+                if not pile:
+                    break
+                continue
+
+            if event == "start_map":
+                valeur: Any = {}
+            elif event == "start_array":
+                valeur = []
+            else:
+                valeur = value
+
+            courant = pile[-1]
+            if type(courant) is dict:
+                courant[cle] = valeur
+            else:
+                courant.append(valeur)
+
+            if event == "start_map" or event == "start_array":
+                pile.append(valeur)
+
+        yield prefixes[prefix], racine
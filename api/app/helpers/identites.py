@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+
+
+class IdentityMap[K, V]:
+    """
+    Cache d'objets indexés par leur clef métier, optionnellement borné.
+
+    Au-delà de `taille_max` objets, les moins récemment utilisés sont
+    évincés. Un objet absent du cache est alors recherché via `chargeur`
+    (typiquement une requête en base).
+    """
+
+    def __init__(
+        self,
+        taille_max: int | None = None,
+        chargeur: Callable[[K], V | None] | None = None,
+    ):
+        self._objets: OrderedDict[K, V] = OrderedDict()
+        self._taille_max = taille_max
+        self._chargeur = chargeur
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._objets)
+
+    def __contains__(self, cle: K) -> bool:
+        return cle in self._objets
+
+    def values(self) -> Iterable[V]:
+        return self._objets.values()
+
+    def get(self, cle: K) -> V | None:
+        objet = self._objets.get(cle)
+        if objet is not None:
+            self.hits += 1
+            if self._taille_max is not None:
+                self._objets.move_to_end(cle)
+            return objet
+
+        self.misses += 1
+        if self._chargeur is None:
+            return None
+
+        objet = self._chargeur(cle)
+        if objet is not None:
+            self.put(cle, objet)
+        return objet
+
+    def put(self, cle: K, objet: V) -> None:
+        self._objets[cle] = objet
+        if self._taille_max is None:
+            return
+
+        self._objets.move_to_end(cle)
+        if len(self._objets) > self._taille_max:
+            self._objets.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Libère les objets et remet les statistiques à zéro."""
+        self._objets.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def taux(self) -> float | None:
+        """Proportion de hits, `None` si le cache n'a pas été sollicité."""
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+    def stats(self) -> str:
+        taux = round((self.taux() or 0) * 100)
+        return f"{len(self)} objets, {self.hits} hits ({taux}%), {self.misses} misses, {self.evictions} évictions"
@@ -0,0 +1,372 @@
+import csv
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from itertools import batched
+from pathlib import Path
+from typing import Any, cast
+
+import ijson
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import delete, insert, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.helpers.limiteur import SeauJetons, en_parallele
+from app.models.db import Structure, StructureInfogreffe
+
+INFOGREFFE_API_BASE_URL = "https://opendata.datainfogreffe.fr/api/explore/v2.1"
+
+
+def parse_infogreffe_decimal(value: Any) -> Decimal | None:
+    if value is None or value == "" or value == "Confidentiel":
+        return None
+
+    return Decimal(str(value))
+
+
+def parse_infogreffe_int(value: Any) -> int | None:
+    if value is None or value == "" or value == "Confidentiel":
+        return None
+
+    return int(value)
+
+
+def build_lignes_infogreffe(
+    uid_structure: int, record: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """Lignes de `structure_infogreffe` (une par millésime renseigné)."""
+    lignes: list[dict[str, Any]] = []
+
+    for index in range(1, 4):
+        ca = parse_infogreffe_decimal(record.get(f"ca_{index}"))
+        resultat = parse_infogreffe_decimal(record.get(f"resultat_{index}"))
+        effectif = parse_infogreffe_int(record.get(f"effectif_{index}"))
+        millesime = parse_infogreffe_int(record.get(f"millesime_{index}"))
+
+        if millesime and (
+            ca is not None or resultat is not None or effectif is not None
+        ):
+            lignes.append(
+                {
+                    "uid_structure": uid_structure,
+                    "annee": millesime,
+                    "ca": ca,
+                    "resultat": resultat,
+                    "effectif": effectif,
+                }
+            )
+
+    return lignes
+
+
+def build_infogreffe_entries(
+    uid_structure: int, record: dict[str, Any]
+) -> list[StructureInfogreffe]:
+    return [
+        StructureInfogreffe(**ligne)
+        for ligne in build_lignes_infogreffe(uid_structure, record)
+    ]
+
+
+def session_http(workers: int) -> requests.Session:
+    """
+    Session HTTP partagée entre `workers` threads : son pool garde autant de
+    connexions ouvertes (keep-alive), réutilisées d'une requête à l'autre.
+    """
+    session = requests.Session()
+    adaptateur = HTTPAdapter(pool_connections=1, pool_maxsize=workers, pool_block=True)
+    session.mount("https://", adaptateur)
+    session.mount("http://", adaptateur)
+    return session
+
+
+def delai_retry_after(response: requests.Response, defaut: float) -> float:
+    """Attente demandée par l'en-tête `Retry-After` (en secondes), sinon `defaut`."""
+    try:
+        return max(float(response.headers.get("Retry-After", defaut)), 0)
+    except ValueError:
+        return defaut
+
+
+class ClientInfogreffe:
+    """
+    Client de l'API Datainfogreffe (OpenDataSoft) partagé entre threads, au
+    débit permis par `limiteur`.
+
+    Les établissements sont recherchés par lots de SIREN, en une requête
+    (limitée à `taille_page` résultats) ; ceux d'un lot dont la réponse est
+    tronquée sont recherchés un par un.
+
+    Sur un 429, tous les appels sont suspendus (`Retry-After`, sinon `backoff`)
+    et le débit est réduit, puis rétabli progressivement au fil des succès.
+    Sur une erreur serveur ou réseau, l'appel est retenté après une attente de
+    `backoff` secondes, doublée à chaque essai. Au-delà de `essais` tentatives,
+    la dernière erreur est levée.
+    """
+
+    def __init__(
+        self,
+        http: requests.Session,
+        dataset: str,
+        api_key: str,
+        limiteur: SeauJetons,
+        essais: int = 5,
+        backoff: float = 1.0,
+        attendre: Callable[[float], None] = time.sleep,
+        base_url: str = INFOGREFFE_API_BASE_URL,
+        taille_page: int = 100,
+    ):
+        self._http = http
+        self._url = f"{base_url}/catalog/datasets/{dataset}/records"
+        self._api_key = api_key
+        self._limiteur = limiteur
+        self._essais = essais
+        self._backoff = backoff
+        self._attendre = attendre
+        self._taille_page = taille_page
+        self._verrou = threading.Lock()
+        self.requetes = 0
+
+    def _get(self, params: dict[str, str]) -> dict[str, Any]:
+        erreur: requests.RequestException | None = None
+        for essai in range(self._essais):
+            self._limiteur.prendre()
+            with self._verrou:
+                self.requetes += 1
+            try:
+                response = self._http.get(
+                    self._url, params={"apikey": self._api_key, **params}, timeout=30
+                )
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                statut = e.response.status_code
+                if statut == 429:
+                    self._limiteur.ralentir(
+                        delai_retry_after(e.response, self._backoff * 2**essai)
+                    )
+                elif statut >= 500:
+                    self._attendre(self._backoff * 2**essai)
+                else:
+                    raise
+                erreur = e
+                continue
+            except requests.RequestException as e:
+                erreur = e
+                self._attendre(self._backoff * 2**essai)
+                continue
+
+            self._limiteur.accelerer()
+            return cast(dict[str, Any], response.json())
+
+        assert erreur is not None
+        raise erreur
+
+    def record(self, siret: str) -> dict[str, Any] | None:
+        """Chiffres clefs de l'établissement, `None` s'il est inconnu."""
+        if not siret:
+            return None
+
+        payload = self._get(
+            {"where": f'siren={siret[:9]} and nic="{siret[9:]}"', "limit": "1"}
+        )
+        results = cast(list[dict[str, Any]], payload.get("results", []))
+        if not results:
+            return None
+
+        return results[0]
+
+    def records(self, sirets: Sequence[str]) -> dict[str, dict[str, Any] | None]:
+        """
+        Chiffres clefs d'un lot d'établissements (`None` pour ceux qui sont
+        inconnus), recherchés en une requête sur leurs SIREN.
+        """
+        sirens = dict.fromkeys(siret[:9] for siret in sirets if siret)
+        if not sirens:
+            return dict.fromkeys(sirets)
+
+        payload = self._get(
+            {
+                "where": " or ".join(f"siren={siren}" for siren in sirens),
+                "limit": str(self._taille_page),
+            }
+        )
+        results = cast(list[dict[str, Any]], payload.get("results", []))
+        trouves = {
+            f"{record.get('siren')}{record.get('nic')}": record
+            for record in results
+            # un établissement incomplet ne peut être rapproché d'aucun SIRET
+            if record.get("siren") and record.get("nic")
+        }
+        if payload.get("total_count", 0) <= len(results):
+            return {siret: trouves.get(siret) for siret in sirets}
+
+        # réponse tronquée : les établissements manquants sont recherchés un à un
+        return {
+            siret: trouves[siret] if siret in trouves else self.record(siret)
+            for siret in sirets
+        }
+
+
+@dataclass
+class BilanInfogreffe:
+    traitees: int = 0  # structures (ou lignes d'export) parcourues
+    structures: int = 0  # structures trouvées dans le jeu de données
+    entrees: int = 0
+    erreurs: list[str] = field(default_factory=list)  # SIRET en échec
+    duree: float = 0.0  # en secondes
+
+    @property
+    def debit(self) -> float:
+        """Éléments traités par seconde."""
+        return self.traitees / self.duree if self.duree else 0.0
+
+
+class EcrivainInfogreffe:
+    """
+    Écriture groupée des chiffres clefs des structures traitées : les lignes
+    de `structure_infogreffe` sont insérées par `INSERT` groupés d'au plus
+    `taille_lot` lignes et la date de récupération des structures est mise à
+    jour, puis le lot est commité.
+
+    Avec `remplacer`, les millésimes déjà présents pour une structure sont
+    remplacés (rafraîchissement incrémental) ; les autres sont conservés.
+    """
+
+    def __init__(
+        self, session: Session, taille_lot: int = 1_000, remplacer: bool = False
+    ):
+        self._session = session
+        self._taille_lot = taille_lot
+        self._remplacer = remplacer
+        self._date = datetime.now()
+        self._uids: list[int] = []
+        self._lignes: list[dict[str, Any]] = []
+
+    def ajouter(self, uid_structure: int, lignes: list[dict[str, Any]]) -> None:
+        self._uids.append(uid_structure)
+        self._lignes.extend(lignes)
+        if max(len(self._uids), len(self._lignes)) >= self._taille_lot:
+            self.ecrire()
+
+    def ecrire(self) -> None:
+        if not self._uids:
+            return
+
+        if self._lignes:
+            if self._remplacer:
+                self._session.execute(
+                    delete(StructureInfogreffe).where(
+                        tuple_(
+                            StructureInfogreffe.uid_structure, StructureInfogreffe.annee
+                        ).in_(
+                            {
+                                (ligne["uid_structure"], ligne["annee"])
+                                for ligne in self._lignes
+                            }
+                        )
+                    )
+                )
+            self._session.execute(insert(StructureInfogreffe), self._lignes)
+        self._session.execute(
+            update(Structure)
+            .where(Structure.uid.in_(self._uids))
+            .values(date_infogreffe=self._date)
+        )
+        self._session.commit()
+        self._uids.clear()
+        self._lignes.clear()
+
+
+def moissonner_infogreffe(
+    session: Session,
+    client: ClientInfogreffe,
+    structures: Iterable[tuple[int, str]],
+    workers: int = 8,
+    taille_lot: int = 1_000,
+    taille_requete: int = 50,
+    remplacer: bool = False,
+) -> BilanInfogreffe:
+    """
+    Récupère en parallèle les chiffres clefs des `structures` (`uid`, SIRET),
+    par requêtes de `taille_requete` structures, et les écrit par lots (voir
+    `EcrivainInfogreffe`). Les structures absentes du jeu de données sont
+    datées comme les autres ; celles en erreur ne le sont pas.
+    """
+    bilan = BilanInfogreffe()
+    debut = time.perf_counter()
+    ecrivain = EcrivainInfogreffe(session, taille_lot, remplacer)
+
+    for lot, appel in en_parallele(
+        lambda lot: client.records([siret for _, siret in lot]),
+        batched(structures, taille_requete),
+        workers,
+    ):
+        bilan.traitees += len(lot)
+        try:
+            records = appel.result()
+        except requests.RequestException:
+            bilan.erreurs.extend(siret for _, siret in lot)
+            continue
+
+        for uid, siret in lot:
+            record = records[siret]
+            if record is None:
+                ecrivain.ajouter(uid, [])
+                continue
+            nouvelles = build_lignes_infogreffe(uid, record)
+            ecrivain.ajouter(uid, nouvelles)
+            bilan.structures += 1
+            bilan.entrees += len(nouvelles)
+
+    ecrivain.ecrire()
+    bilan.duree = time.perf_counter() - debut
+    return bilan
+
+
+def lire_export(chemin: Path) -> Iterator[dict[str, Any]]:
+    """
+    Parcourt en flux un export du jeu de données Datainfogreffe, au format CSV
+    (séparateur `;`) ou JSON (liste d'enregistrements).
+    """
+    if chemin.suffix.lower() == ".json":
+        with chemin.open("rb") as f:
+            yield from ijson.items(f, "item")
+    else:
+        with chemin.open(encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f, delimiter=";")
+
+
+def importer_export(
+    session: Session,
+    records: Iterable[dict[str, Any]],
+    index: Mapping[str, int],
+    taille_lot: int = 1_000,
+    remplacer: bool = False,
+) -> BilanInfogreffe:
+    """
+    Écrit par lots (voir `EcrivainInfogreffe`) les chiffres clefs des
+    `records` d'un export dont le SIRET figure dans `index` (SIRET → `uid` de
+    la structure).
+    """
+    bilan = BilanInfogreffe()
+    debut = time.perf_counter()
+    ecrivain = EcrivainInfogreffe(session, taille_lot, remplacer)
+
+    for record in records:
+        bilan.traitees += 1
+        uid = index.get(f"{record.get('siren')}{record.get('nic')}")
+        if uid is None:
+            continue
+
+        nouvelles = build_lignes_infogreffe(uid, record)
+        ecrivain.ajouter(uid, nouvelles)
+        bilan.structures += 1
+        bilan.entrees += len(nouvelles)
+
+    ecrivain.ecrire()
+    bilan.duree = time.perf_counter() - debut
+    return bilan
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class SeauJetons:
+    """
+    Limiteur de débit à seau de jetons, partagé entre threads : `debit` jetons
+    par seconde, dans la limite de `capacite` jetons accumulés (rafale
+    maximale). `suspendre` vide le seau pour une durée donnée.
+
+    Chaque appel à `prendre` réserve son créneau sous verrou puis attend, hors
+    verrou, l'instant réservé.
+
+    Le débit est adaptatif : `ralentir` (sur un 429) le divise par deux, sans
+    descendre sous `debit_min` (par défaut le dixième du débit nominal), et
+    chaque `accelerer` (sur un succès) le rapproche de sa valeur nominale.
+    """
+
+    def __init__(
+        self,
+        debit: float,
+        capacite: int = 1,
+        debit_min: float | None = None,
+        horloge: Callable[[], float] = time.monotonic,
+        attendre: Callable[[float], None] = time.sleep,
+    ):
+        self._capacite = capacite
+        self._intervalle_nominal = 1 / debit
+        self._intervalle_max = 1 / (debit_min or debit / 10)
+        self._intervalle = self._intervalle_nominal
+        self._horloge = horloge
+        self._attendre = attendre
+        self._verrou = threading.Lock()
+        # instant auquel le seau, vidé de la rafale, fournit le prochain jeton
+        self._prochain = horloge()
+
+    @property
+    def debit(self) -> float:
+        return 1 / self._intervalle
+
+    @property
+    def _tolerance(self) -> float:
+        return (self._capacite - 1) * self._intervalle
+
+    def prendre(self) -> None:
+        """Attend qu'un jeton soit disponible et le consomme."""
+        with self._verrou:
+            maintenant = self._horloge()
+            prochain = max(self._prochain, maintenant)
+            depart = max(maintenant, prochain - self._tolerance)
+            self._prochain = prochain + self._intervalle
+        if depart > maintenant:
+            self._attendre(depart - maintenant)
+
+    def suspendre(self, duree: float) -> None:
+        with self._verrou:
+            self._prochain = max(
+                self._prochain, self._horloge() + duree + self._tolerance
+            )
+
+    def ralentir(self, duree: float) -> None:
+        """Suspend les appels pour `duree` secondes et divise le débit par deux."""
+        with self._verrou:
+            self._intervalle = min(2 * self._intervalle, self._intervalle_max)
+        self.suspendre(duree)
+
+    def accelerer(self) -> None:
+        """Augmente le débit de 5 %, sans dépasser sa valeur nominale."""
+        with self._verrou:
+            self._intervalle = max(self._intervalle / 1.05, self._intervalle_nominal)
+
+
+def en_parallele[E, R](
+    fonction: Callable[[E], R], elements: Iterable[E], workers: int
+) -> Iterator[tuple[E, Future[R]]]:
+    """
+    Appels de `fonction` dans un pool de `workers` threads, restitués dans
+    l'ordre des `elements`. Le nombre d'appels en attente est borné pour ne pas
+    matérialiser toute la liste des éléments.
+    """
+    with ThreadPoolExecutor(workers) as executor:
+        en_cours: deque[tuple[E, Future[R]]] = deque()
+        for element in elements:
+            en_cours.append((element, executor.submit(fonction, element)))
+            if len(en_cours) >= 2 * workers:
+                yield en_cours.popleft()
+        while en_cours:
+            yield en_cours.popleft()
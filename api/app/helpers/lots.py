@@ -0,0 +1,62 @@
+import os
+import resource
+
+
+def memoire_residente() -> int:
+    """
+    Mémoire résidente actuelle du processus, en Mo.
+
+    À défaut de `/proc` (hors Linux), c'est le pic de mémoire qui est renvoyé.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+class TailleLot:
+    """
+    Nombre d'objets à écrire entre deux commits, ajusté après chaque commit.
+
+    La taille est corrigée pour que la durée du prochain commit approche
+    `latence_cible` (en secondes), d'un facteur borné entre ½ et 2 pour
+    amortir les variations ponctuelles. Si la mémoire résidente dépasse
+    `memoire_max` (en Mo), le lot en cours doit être commité sans attendre
+    (voir `memoire_depassee`) et la taille est divisée par deux.
+
+    Sans cible ni plafond, la taille reste fixe.
+    """
+
+    def __init__(
+        self,
+        taille: int,
+        latence_cible: float | None = None,
+        memoire_max: int | None = None,
+        minimum: int = 100,
+        maximum: int = 1_000_000,
+    ):
+        self.taille = taille
+        self._latence_cible = latence_cible
+        self._memoire_max = memoire_max
+        self._minimum = minimum
+        self._maximum = maximum
+
+    def memoire_depassee(self) -> bool:
+        return self._memoire_max is not None and memoire_residente() > self._memoire_max
+
+    def ajuster(self, nombre: int, latence: float) -> None:
+        """Prend en compte le commit de `nombre` objets en `latence` secondes."""
+        if nombre <= 0:
+            return
+
+        taille = self.taille
+        if self._latence_cible is not None and latence > 0:
+            facteur = min(max(self._latence_cible / latence, 0.5), 2.0)
+            taille = int(nombre * facteur)
+        if self.memoire_depassee():
+            taille = min(taille, nombre // 2)
+
+        if taille != self.taille:
+            self.taille = min(max(taille, self._minimum), self._maximum)
@@ -0,0 +1,65 @@
+from sqlalchemy import Connection, MetaData, Table, text
+
+SUFFIXE_OMBRE = "__ombre"
+SUFFIXE_ANCIEN = "__ancien"
+
+
+def get_tables_ombre(tables: list[Table]) -> dict[Table, Table]:
+    """Retourne, pour chaque table, sa table fantôme (même structure, nom suffixé)."""
+    metadata = MetaData()
+    return {
+        table: table.to_metadata(metadata, name=f"{table.name}{SUFFIXE_OMBRE}")
+        for table in tables
+    }
+
+
+def creer_tables_ombre(connexion: Connection, tables: list[Table]) -> None:
+    """
+    (Re)crée les tables fantômes vides de `tables`.
+
+    `CREATE TABLE ... LIKE` ne copie pas les clefs étrangères : elles sont
+    ajoutées ensuite, sans nom explicite, pour que MariaDB leur attribue un
+    nom dérivé de celui de la table (`<table>_ibfk_<n>`) qui suit la table
+    lors du `RENAME TABLE`, et n'entre donc pas en conflit avec celles des
+    tables en production.
+    """
+    noms = {table.name for table in tables}
+
+    connexion.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+    for table in tables:
+        connexion.execute(text(f"DROP TABLE IF EXISTS {table.name}{SUFFIXE_OMBRE}"))
+        connexion.execute(
+            text(f"CREATE TABLE {table.name}{SUFFIXE_OMBRE} LIKE {table.name}")
+        )
+
+    for table in tables:
+        for fk in table.foreign_keys:
+            cible = fk.column.table.name
+            if cible in noms:
+                cible += SUFFIXE_OMBRE
+            connexion.execute(
+                text(
+                    f"ALTER TABLE {table.name}{SUFFIXE_OMBRE} "
+                    f"ADD FOREIGN KEY ({fk.parent.name}) "
+                    f"REFERENCES {cible} ({fk.column.name})"
+                )
+            )
+    connexion.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+
+
+def basculer_tables_ombre(connexion: Connection, tables: list[Table]) -> None:
+    """
+    Remplace les tables par leurs tables fantômes en un seul `RENAME TABLE`
+    (atomique : les requêtes voient soit les anciennes, soit les nouvelles
+    données), puis supprime les anciennes tables.
+    """
+    renommages: list[str] = []
+    for table in tables:
+        renommages.append(f"{table.name} TO {table.name}{SUFFIXE_ANCIEN}")
+        renommages.append(f"{table.name}{SUFFIXE_OMBRE} TO {table.name}")
+    connexion.execute(text(f"RENAME TABLE {', '.join(renommages)}"))
+
+    connexion.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+    for table in tables:
+        connexion.execute(text(f"DROP TABLE {table.name}{SUFFIXE_ANCIEN}"))
+    connexion.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
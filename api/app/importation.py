@@ -4,33 +4,72 @@ import sys
 sys.path.append(os.getcwd())
 
 import csv
-import json
 import logging
+import resource
 import time
-from collections.abc import Callable
-from datetime import date
-from decimal import Decimal
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing, contextmanager, nullcontext
+from datetime import date, datetime, timedelta
 from enum import Enum
-from functools import cache
-from typing import Any, cast
+from itertools import batched, islice
+from pathlib import Path
+from typing import IO, Any, cast
 
-import ijson
-import requests
 import rich
 import rich.progress
 import typer
-from api_entreprise.exceptions import ApiEntrepriseClientError
 from pydantic_core import ValidationError
 from rich.logging import RichHandler
 from rich.progress import track
-from sqlalchemy import desc, select, text
+from sqlalchemy import Select, Table, desc, func, or_, select, text, update
+from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.orm import Session
 
 from app.config import get_config
 from app.db import get_engine
 from app.dependencies import get_api_entreprise
 from app.helpers import categorisation
-from app.helpers.conf import set_dernier_import
+from app.helpers.api_entreprise import ClientLimite, enrichir_structures
+from app.helpers.bulk import (
+    BulkWriter,
+    CleErreur,
+    LignesActeSousTraitance,
+    LignesConcession,
+    LignesDonneeExecution,
+    LignesErreur,
+    LignesMarche,
+    LignesModificationMarche,
+    cle_collation,
+    get_table,
+)
+from app.helpers.conf import (
+    PointDeReprise,
+    delete_point_de_reprise,
+    get_point_de_reprise,
+    set_dernier_import,
+    set_point_de_reprise,
+)
+from app.helpers.contraintes import ajouter_contraintes, creer_tables_sans_contraintes
+from app.helpers.delta import Delta, calculer_empreinte, serialiser
+from app.helpers.doublons import CleDoublon, Doublons
+from app.helpers.flux import StatsFlux, Validateurs, iter_items, precharger_sources
+from app.helpers.identites import IdentityMap
+from app.helpers.infogreffe import (
+    ClientInfogreffe,
+    importer_export,
+    lire_export,
+    moissonner_infogreffe,
+    session_http,
+)
+from app.helpers.limiteur import SeauJetons
+from app.helpers.lots import TailleLot
+from app.helpers.ombre import (
+    basculer_tables_ombre,
+    creer_tables_ombre,
+    get_tables_ombre,
+)
 from app.models.db import (
     CPV,
     ActeSousTraitance,
@@ -41,6 +80,7 @@ from app.models.db import (
     DecpMalForme,
     DonneeExecution,
     Erreur,
+    ImportRun,
     Lieu,
     Marche,
     ModificationConcession,
@@ -51,6 +91,7 @@ from app.models.db import (
     Tarif,
     TechniqueAchatMarche,
     concession_structure_table,
+    decp_erreur_table,
     marche_titulaire_table,
     modification_titulaire_table,
 )
@@ -68,8 +109,6 @@ from app.models.dto_importation import (
 )
 from app.models.enums import TechniqueAchat, TypeCodeLieu
 
-INFOGREFFE_API_BASE_URL = "https://opendata.datainfogreffe.fr/api/explore/v2.1"
-
 app = typer.Typer()
 
 logging.basicConfig(
@@ -94,43 +133,589 @@ class CustomValidationError(Exception):
         return self._errors
 
 
+def valider_marche(objet: dict[str, Any]) -> MarcheSchema | MarcheAncienSchema:
+    """Valide un marché selon le format en vigueur à sa date de notification."""
+    if objet.get("dateNotification") and int(objet["dateNotification"][:4]) >= 2024:
+        return MarcheSchema.model_validate(objet)
+    return MarcheAncienSchema.model_validate(objet)
+
+
+def id_accord_cadre(id: str, reference: str | None) -> str | None:
+    """
+    Identifiant de l'accord-cadre référencé par le marché `id`. Une référence
+    plus longue qu'un identifiant de marché ne peut désigner aucun accord-cadre :
+    elle est ignorée, avec un avertissement.
+    """
+    if reference and len(reference) > 16:
+        log.warning(f"⚠️ Marché {id} : idAccordCadre trop long ignoré ({reference})")
+        return None
+    return reference or None
+
+
+def build_lignes_marche(objet: dict[str, Any], empreinte: bool = False) -> LignesMarche:
+    """
+    Valide un marché et le met à plat en lignes, indépendamment de la base
+    de données : les structures et lieux sont référencés par leur clef.
+
+    L'empreinte du DECP, qui demande de le sérialiser, n'est calculée que si
+    `empreinte` (import incrémental, voir `Delta`).
+    """
+    data = valider_marche(objet)
+
+    ligne: dict[str, Any] = {
+        "id": data.id,
+        "empreinte": calculer_empreinte(serialiser(objet)) if empreinte else None,
+        "nature": data.nature.db_value,
+        "objet": data.objet,
+        "code_cpv": int(data.codeCPV.split("-")[0]),
+        "categorie": categorisation.CPV2categorie(data.codeCPV).db_value,
+        "modalites_execution": MutableList(
+            mod.db_value
+            for mod in data.modalitesExecution["modaliteExecution"]
+            if mod.db_value
+        ),
+        # l'accord-cadre est rattaché une fois tous les marchés importés (voir
+        # `ImportateurDecp.lier_accords_cadre`)
+        "id_accord_cadre": id_accord_cadre(data.id, data.idAccordCadre),
+        "marche_innovant": data.marcheInnovant if data.marcheInnovant else False,
+        "ccag": data.ccag.db_value if data.ccag else None,
+        "offres_recues": data.offresRecues,
+        "attribution_avance": (
+            data.attributionAvance if data.attributionAvance else False
+        ),
+        "taux_avance": data.tauxAvance,
+        "type_groupement_operateurs": (
+            data.typeGroupementOperateurs.db_value
+            if data.typeGroupementOperateurs
+            else None
+        ),
+        "sous_traitance_declaree": (
+            data.sousTraitanceDeclaree if data.sousTraitanceDeclaree else False
+        ),
+        "procedure": data.procedure.db_value if data.procedure else None,
+        "duree_mois": data.dureeMois,
+        "duree_mois_initiale": data.dureeMois,
+        "date_notification": data.dateNotification,
+        "date_publication": data.datePublicationDonnees,
+        "montant": data.montant,
+        "montant_initial": data.montant,
+        "type_prix": MutableList(
+            o.db_value for o in (data.typesPrix["typePrix"] if data.typesPrix else [])
+        ),
+        "forme_prix": data.formePrix.db_value if data.formePrix else None,
+        "origine_ue": data.origineUE,
+        "origine_france": data.origineFrance,
+    }
+
+    actes_sous_traitance: dict[int, LignesActeSousTraitance] = {}
+    for tmp in data.actesSousTraitance:
+        dacte: ActeSousTraitanceSchema = tmp["acteSousTraitance"]
+        actes_sous_traitance[dacte.id] = LignesActeSousTraitance(
+            ligne={
+                "id": dacte.id,
+                "duree_mois": dacte.dureeMois,
+                "duree_mois_initiale": dacte.dureeMois,
+                "date_notification": dacte.dateNotification,
+                "date_publication": dacte.datePublicationDonnees,
+                "montant": dacte.montant,
+                "montant_initial": dacte.montant,
+                "variation_prix": dacte.variationPrix.db_value,
+            },
+            sous_traitant=(dacte.sousTraitant.id, dacte.sousTraitant.typeIdentifiant),
+        )
+
+    for tmp_dma in sorted(
+        data.modificationsActesSousTraitance,
+        key=lambda x: (
+            x["modificationActeSousTraitance"].dateNotificationModificationSousTraitance
+            if "modificationActeSousTraitance" in x
+            else x[
+                "modificationActesSousTraitance"
+            ].dateNotificationModificationSousTraitance
+        ),
+    ):
+        dmodif: ModificationActeSousTraitanceSchema = (
+            tmp_dma["modificationActeSousTraitance"]
+            if "modificationActeSousTraitance" in tmp_dma
+            else tmp_dma["modificationActesSousTraitance"]
+        )
+        if dmodif.id not in actes_sous_traitance:
+            raise CustomValidationError(
+                errors=[
+                    {
+                        "type": "incoherence",
+                        "loc": ["modificationsActesSousTraitance"],
+                        "msg": "L'acte de sous-traitance n'existe pas",
+                    }
+                ],
+            )
+        acte = actes_sous_traitance[dmodif.id]
+        acte.modifications.append(
+            {
+                "duree_mois": dmodif.dureeMois,
+                "date_notif": dmodif.dateNotificationModificationSousTraitance,
+                "date_publication": dmodif.datePublicationDonnees,
+                "montant": dmodif.montant,
+            }
+        )
+        if dmodif.dureeMois is not None:
+            acte.ligne["duree_mois"] = dmodif.dureeMois
+        if dmodif.montant is not None:
+            acte.ligne["montant"] = dmodif.montant
+
+    modifications: list[LignesModificationMarche] = []
+    for tmp_dm in sorted(data.modifications, key=lambda x: x["modification"].id):
+        modif: ModificationMarcheSchema = tmp_dm["modification"]
+        modifications.append(
+            LignesModificationMarche(
+                ligne={
+                    "id": modif.id,
+                    "duree_mois": modif.dureeMois,
+                    "date_notification": modif.dateNotificationModification,
+                    "date_publication": modif.datePublicationDonneesModification,
+                    "montant": modif.montant,
+                },
+                titulaires=[
+                    (t["titulaire"].id, t["titulaire"].typeIdentifiant)
+                    for t in (modif.titulaires or [])
+                ],
+            )
+        )
+        if modif.montant is not None:
+            ligne["montant"] = modif.montant
+        if modif.dureeMois is not None:
+            ligne["duree_mois"] = modif.dureeMois
+
+    techniques = data.techniques["technique"]
+
+    return LignesMarche(
+        ligne=ligne,
+        acheteur=(data.acheteur.id, "SIRET"),
+        lieu=(
+            (data.lieuExecution.code, cast(int, data.lieuExecution.typeCode.db_value))
+            if data.lieuExecution
+            else None
+        ),
+        titulaires=[
+            (t["titulaire"].id, t["titulaire"].typeIdentifiant) for t in data.titulaires
+        ],
+        techniques=[tech.db_value for tech in techniques if tech.db_value],
+        considerations_sociales=[
+            consideration.db_value
+            for consideration in data.considerationsSociales["considerationSociale"]
+            if consideration.db_value
+        ],
+        considerations_environnementales=[
+            consideration.db_value
+            for consideration in data.considerationsEnvironnementales[
+                "considerationEnvironnementale"
+            ]
+            if consideration.db_value
+        ],
+        actes_sous_traitance=list(actes_sous_traitance.values()),
+        modifications=modifications,
+    )
+
+
+def build_lignes_concession(
+    objet: dict[str, Any], empreinte: bool = False
+) -> LignesConcession:
+    """
+    Valide une concession et la met à plat en lignes, indépendamment de la base
+    de données : les structures sont référencées par leur clef.
+
+    L'empreinte n'est calculée que si `empreinte` (voir `build_lignes_marche`).
+    """
+    data = ConcessionSchema.model_validate(objet)
+
+    ligne: dict[str, Any] = {
+        "id": data.id,
+        "empreinte": calculer_empreinte(serialiser(objet)) if empreinte else None,
+        "nature": data.nature.db_value,
+        "objet": data.objet,
+        "procedure": data.procedure.db_value,
+        "duree_mois": data.dureeMois,
+        "duree_mois_initiale": data.dureeMois,
+        "date_signature": data.dateSignature,
+        "date_publication": data.datePublicationDonnees,
+        "date_debut_execution": data.dateDebutExecution,
+        "valeur_globale": data.valeurGlobale,
+        "valeur_globale_initiale": data.valeurGlobale,
+        "montant_subvention_publique": data.montantSubventionPublique,
+        "considerations_sociales": MutableList(
+            consideration.db_value
+            for consideration in data.considerationsSociales["considerationSociale"]
+            if consideration.db_value
+        ),
+        "considerations_environnementales": MutableList(
+            consideration.db_value
+            for consideration in data.considerationsEnvironnementales[
+                "considerationEnvironnementale"
+            ]
+            if consideration.db_value
+        ),
+    }
+
+    donnees_execution: list[LignesDonneeExecution] = []
+    for tmp in data.donneesExecution:
+        dde: DonneeExecutionSchema = tmp["donneesAnnuelles"]
+        tarifs: list[TarifSchema] = [tmp_dt["tarif"] for tmp_dt in dde.tarifs]
+        donnees_execution.append(
+            LignesDonneeExecution(
+                ligne={
+                    "date_publication": dde.datePublicationDonneesExecution,
+                    "depenses_investissement": dde.depensesInvestissement,
+                },
+                tarifs=[
+                    {"intitule": t.intituleTarif, "tarif": t.tarif} for t in tarifs
+                ],
+            )
+        )
+
+    modifications: list[dict[str, Any]] = []
+    for tmp_dm in sorted(data.modifications, key=lambda x: x["modification"].id):
+        data_modification: ModificationConcessionSchema = tmp_dm["modification"]
+        modifications.append(
+            {
+                "id": data_modification.id,
+                "date_signature": data_modification.dateSignatureModification,
+                "date_publication": data_modification.datePublicationDonneesModification,
+                "duree_mois": data_modification.dureeMois,
+                "valeur_globale": data_modification.valeurGlobale,
+            }
+        )
+        if data_modification.valeurGlobale is not None:
+            ligne["valeur_globale"] = data_modification.valeurGlobale
+        if data_modification.dureeMois is not None:
+            ligne["duree_mois"] = data_modification.dureeMois
+
+    concessionnaires: list[ConcessionnaireSchema] = [
+        tmp_dc["concessionnaire"] for tmp_dc in data.concessionnaires
+    ]
+
+    return LignesConcession(
+        ligne=ligne,
+        autorite_concedante=(data.autoriteConcedante.id, "SIRET"),
+        concessionnaires=[(c.id, c.typeIdentifiant) for c in concessionnaires],
+        donnees_execution=donnees_execution,
+        modifications=modifications,
+    )
+
+
+def build_lignes_erreur(
+    e: ValidationError | CustomValidationError,
+    o: dict[str, Any],
+    type_contrat: TypeContrat,
+) -> LignesErreur:
+    """
+    Décrit un objet invalide et ses erreurs de validation.
+
+    Les évènements d'ijson ne portant pas leur position dans le flux, les
+    octets d'origine d'un objet ne sont pas connus : il est stocké tel que
+    sérialisé par `serialiser`, puis compressé (voir `TexteCompresse`).
+    """
+    structure: tuple[str, str] | None = None
+
+    if type_contrat == TypeContrat.MARCHE and o.get("acheteur", {}).get("id"):
+        structure = (o["acheteur"]["id"], "SIRET")
+
+    if type_contrat == TypeContrat.CONCESSION and o.get("autoriteConcedante", {}).get(
+        "id"
+    ):
+        structure = (o["autoriteConcedante"]["id"], "SIRET")
+
+    date_creation: str | None = None
+
+    if type_contrat == TypeContrat.MARCHE:
+        date_creation = o.get("dateNotification")
+
+    if type_contrat == TypeContrat.CONCESSION:
+        date_creation = o.get("dateSignature")
+
+    return LignesErreur(
+        ligne={
+            "decp": serialiser(o).decode(),
+            "date_creation": date.fromisoformat(date_creation)
+            if date_creation
+            else None,
+        },
+        structure=structure,
+        # sans les index des listes, plusieurs erreurs peuvent être identiques
+        erreurs=list(
+            dict.fromkeys(
+                (
+                    str(erreur["type"]),
+                    ".".join(str(v) for v in erreur["loc"] if type(v) is not int),
+                    str(erreur["msg"]),
+                )
+                for erreur in e.errors()
+            )
+        ),
+    )
+
+
+Lignes = LignesMarche | LignesConcession | LignesErreur
+
+
+def hors_perimetre(
+    type_contrat: TypeContrat, objet: dict[str, Any], sirets: frozenset[str]
+) -> bool:
+    """
+    Vrai si l'acheteur (ou l'autorité concédante) de l'objet brut, non encore
+    validé, n'est pas l'un des `sirets` suivis. Un objet dont l'identifiant est
+    absent ou mal formé est conservé, pour être décrit comme DECP mal formé.
+    """
+    structure = objet.get(
+        "acheteur" if type_contrat == TypeContrat.MARCHE else "autoriteConcedante"
+    )
+    if not isinstance(structure, dict):
+        return False
+    identifiant = structure.get("id")
+    return isinstance(identifiant, str) and identifiant not in sirets
+
+
+def build_lignes(
+    type_contrat: TypeContrat, objet: dict[str, Any], empreinte: bool = False
+) -> Lignes:
+    """Valide et met à plat un objet, ou le décrit comme DECP mal formé."""
+    try:
+        if type_contrat == TypeContrat.MARCHE:
+            return build_lignes_marche(objet, empreinte)
+        return build_lignes_concession(objet, empreinte)
+    except (ValidationError, CustomValidationError) as e:
+        # seul un objet invalide est sérialisé pour être stocké
+        return build_lignes_erreur(e, objet, type_contrat)
+
+
+def build_lignes_lot(
+    objets: tuple[tuple[TypeContrat, dict[str, Any] | None], ...],
+    empreinte: bool = False,
+) -> list[tuple[TypeContrat, Lignes | None]]:
+    """
+    Point d'entrée des workers de `ImportateurDecp._lignes_en_parallele`. Les
+    objets écartés par le filtre des SIRET (`None`) sont transmis tels quels.
+    """
+    return [
+        (
+            type_contrat,
+            build_lignes(type_contrat, objet, empreinte) if objet is not None else None,
+        )
+        for type_contrat, objet in objets
+    ]
+
+
+@contextmanager
+def mesurer(description: str) -> Iterator[None]:
+    """Journalise la durée du bloc et l'augmentation du pic de mémoire."""
+    debut = time.perf_counter()
+    memoire = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # en Ko
+    yield
+    memoire = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoire
+    log.info(
+        f"{description} : {time.perf_counter() - debut:.2f}s, "
+        f"+{memoire / 1024:.0f} Mo de mémoire"
+    )
+
+
 class ImportateurDecp:
     def __init__(
         self,
         session: Session,
         preload_db: bool = True,
-        sirets: list[str] | None = None,
+        sirets: Iterable[str] | None = None,
+        bulk: bool = False,
+        workers: int = 1,
+        taille_lot: int = 1_000,
+        incremental: bool = False,
+        tables_ombre: dict[Table, Table] | None = None,
+        taille_cache: int | None = None,
+        reprise: bool = False,
+        latence_commit: float | None = None,
+        memoire_max: int | None = None,
+        load_data: bool = False,
+        dedoublonner: bool = False,
     ):
-        self._cache_lieux: dict[str, Lieu] = {}
-        self._cache_structures: dict[str, Structure] = {}
-        self._cache_accords_cadre: dict[str, Marche] = {}
-
         self._session: Session = session
+        self._preload_db = preload_db
+
+        # Index clef -> uid des objets existants en BDD, pré-chargés à partir
+        # de simples tuples ; un uid à `None` désigne un objet créé pendant
+        # l'import, pas encore écrit en BDD
+        self._index_structures: dict[tuple[str, str], int | None] | None = None
+        self._index_lieux: dict[tuple[str, int | None], int | None] | None = None
+        # clefs des erreurs comparées comme par MariaDB (voir `cle_collation`)
+        self._index_erreurs: dict[CleErreur, int | None] | None = None
+
+        # Caches des objets ORM réutilisés d'un DECP à l'autre, matérialisés à
+        # la demande et libérés à la fin de chaque import (voir `liberer_caches`)
+        self._cache_structures: IdentityMap[tuple[str, str], Structure] = IdentityMap(
+            taille_cache, chargeur=self.find_structure
+        )
+        self._cache_lieux: IdentityMap[tuple[str, int | None], Lieu] = IdentityMap(
+            taille_cache, chargeur=self.find_lieu
+        )
+        self._cache_erreurs: IdentityMap[CleErreur, Erreur] = IdentityMap(
+            taille_cache, chargeur=self.find_erreur
+        )
 
         self._valid_objects: int = 0
         self._invalid_objects: int = 0
+        self._valid_par_type: Counter[TypeContrat] = Counter()
+        self._invalid_par_type: Counter[TypeContrat] = Counter()
+        # objets écartés avant validation par le filtre des SIRET
+        self._ignores_par_type: Counter[TypeContrat] = Counter()
         self._started_at: float
         self._finished_at: float
+        # source en cours d'import, enregistrée avec ses DECP mal formés
+        self._source: str | None = None
+        # temps cumulé par phase de l'import en cours, voir `build_import_run`
+        self._durees: defaultdict[str, float] = defaultdict(float)
+        self._taux_caches: dict[str, float | None] = {}
+
+        # Acheteurs et autorités concédantes suivis, testés sur chaque objet brut
+        # avant sa validation (voir `_filtrer_sirets`)
+        self._sirets: frozenset[str] | None = frozenset(sirets) if sirets else None
+
+        # Tables fantômes où sont écrits les contrats (voir `app.helpers.ombre`)
+        self._tables_ombre: dict[Table, Table] = tables_ombre or {}
+
+        # Au-delà d'un worker, la validation est faite dans un pool de processus
+        self._workers = workers
+        self._taille_lot = taille_lot
+
+        # Durée visée pour chaque commit (en secondes) et plafond de mémoire
+        # (en Mo) selon lesquels la taille des lots commités est ajustée au fil
+        # de l'import (voir `TailleLot`)
+        self._latence_commit = latence_commit
+        self._memoire_max = memoire_max
+
+        # En mode `bulk`, les lignes sont écrites via des INSERT Core groupés
+        # plutôt que par l'unité de travail de l'ORM (voir `BulkWriter`)
+        # `tables_ombre` redirige l'écriture des contrats vers des tables
+        # fantômes (voir `app.helpers.ombre`), ce que seul `BulkWriter` permet
+        # `load_data` charge les tables les plus volumineuses via des fichiers
+        # TSV et `LOAD DATA LOCAL INFILE` (voir `BulkWriter.charger`)
+        # `dedoublonner` ne garde que la publication la plus récente des marchés
+        # présents dans plusieurs sources (voir `Doublons`)
+        bulk = bulk or incremental or bool(tables_ombre) or load_data or dedoublonner
+        with mesurer("🗂️ Pré-chargement de la BDD") if preload_db else nullcontext():
+            self._writer: BulkWriter | None = (
+                BulkWriter(
+                    session,
+                    preload_db=preload_db,
+                    cibles=tables_ombre,
+                    load_data=load_data,
+                )
+                if bulk
+                else None
+            )
 
-        self._sirets = sirets
+            # En mode incrémental, seuls les contrats nouveaux ou modifiés
+            # depuis le dernier import sont écrits (voir `Delta` et `finaliser`)
+            self._delta: Delta | None = Delta(session) if incremental else None
+            if self._delta is not None:
+                self._delta.load()
 
-        if preload_db:
-            self.load_structures()
-            self.load_lieux()
-            # pas de chargement des accords cadres car
-            # on vide cette table avant chaque ré-import
+            self._doublons: Doublons | None = Doublons() if dedoublonner else None
+            if self._doublons is not None and reprise:
+                self._doublons.load(session, self._cible(get_table(Marche)))
+
+            if preload_db and not bulk:
+                self.load_index()
 
     def load_structures(self) -> None:
-        structures = self._session.execute(select(Structure)).scalars()
-        for structure in structures:
-            self._cache_structures[
-                structure.identifiant + structure.type_identifiant
-            ] = structure
+        self._index_structures = {
+            (identifiant, type_identifiant): uid
+            for uid, identifiant, type_identifiant in self._session.execute(
+                select(Structure.uid, Structure.identifiant, Structure.type_identifiant)
+            )
+        }
 
     def load_lieux(self) -> None:
-        lieux = self._session.execute(select(Lieu)).scalars()
-        for lieu in lieux:
-            self._cache_lieux[lieu.code + str(lieu.type_code)] = lieu
+        self._index_lieux = {
+            (code, type_code): uid
+            for uid, code, type_code in self._session.execute(
+                select(Lieu.uid, Lieu.code, Lieu.type_code)
+            )
+        }
+
+    def load_erreurs(self) -> None:
+        self._index_erreurs = {
+            cle_collation((type, localisation, message)): uid
+            for uid, type, localisation, message in self._session.execute(
+                select(Erreur.uid, Erreur.type, Erreur.localisation, Erreur.message)
+            )
+        }
+
+    def load_index(self) -> None:
+        self.load_structures()
+        self.load_lieux()
+        self.load_erreurs()
+
+    def liberer_caches(self) -> None:
+        for nom, identites in (
+            ("structures", self._cache_structures),
+            ("lieux", self._cache_lieux),
+            ("erreurs", self._cache_erreurs),
+        ):
+            log.debug(f"🗃️ Cache des {nom} : {identites.stats()}")
+            self._taux_caches[nom] = identites.taux()
+            identites.clear()
+
+        # les objets créés pendant l'import ont maintenant un uid
+        self._index_structures = self._index_lieux = self._index_erreurs = None
+
+    def _find[K, E: Base](
+        self,
+        entite: type[E],
+        index: dict[K, int | None] | None,
+        cle: K,
+        requete: Select[tuple[E]],
+    ) -> E | None:
+        """
+        Matérialise l'objet `cle` à partir de son uid pré-chargé dans `index`.
+
+        L'index contenant tous les objets existants, une clef absente désigne
+        un objet inexistant. Sans index (pas de pré-chargement) ou pour un
+        objet créé pendant l'import, l'objet est recherché via `requete`.
+        """
+        if index is not None:
+            if cle not in index:
+                return None
+            uid = index[cle]
+            if uid is not None:
+                return self._session.get(entite, uid)
+        return self._session.scalars(requete).first()
+
+    def find_structure(self, cle: tuple[str, str]) -> Structure | None:
+        return self._find(
+            Structure,
+            self._index_structures,
+            cle,
+            select(Structure).where(
+                Structure.identifiant == cle[0], Structure.type_identifiant == cle[1]
+            ),
+        )
+
+    def find_lieu(self, cle: tuple[str, int | None]) -> Lieu | None:
+        return self._find(
+            Lieu,
+            self._index_lieux,
+            cle,
+            select(Lieu).where(Lieu.code == cle[0], Lieu.type_code == cle[1]),
+        )
+
+    def find_erreur(self, cle: CleErreur) -> Erreur | None:
+        return self._find(
+            Erreur,
+            self._index_erreurs,
+            cle,
+            select(Erreur).where(
+                Erreur.type == cle[0],
+                Erreur.localisation == cle[1],
+                Erreur.message == cle[2],
+            ),
+        )
 
     def set_acheteur(self, structure: Structure) -> Structure:
         structure.acheteur = True
@@ -140,7 +725,6 @@ class ImportateurDecp:
         structure.vendeur = True
         return structure
 
-    @cache
     def get_or_create_structure(
         self,
         id: str,
@@ -149,252 +733,167 @@ class ImportateurDecp:
         """
         Récupère la structure ou la créé si elle n'existe pas.
 
-        La méthode va, dans l'ordre d'exécution, rechercher dans :
-         - son @cache
-         - self._cache_structures qui a été chargé depuis la BDD à
-           l'initialisation de l'importateur
-        Si aucun des cas ci-dessus n'a trouvé la structure, alors on la créé.
-
-        ATTENTION : le cache ne fonctionne qu'en cas d'appel exactement
-        identique, passer `1` ou `id=1` en paramètre sera considéré
-        comme deux appels différents
+        La structure est recherchée dans `self._cache_structures`, puis
+        matérialisée depuis la BDD si elle figure dans l'index pré-chargé à
+        l'initialisation de l'importateur (voir `_find`).
         """
-        if (id + type_id) in self._cache_structures.keys():
-            return self._cache_structures[id + type_id]
+        structure = self._cache_structures.get((id, type_id))
+        if structure is not None:
+            return structure
 
         structure = Structure(identifiant=id, type_identifiant=type_id)
         self._session.add(
             structure
         )  # le cascade ne s'applique pas automatiquement en ManyToMany
+        self._cache_structures.put((id, type_id), structure)
+        if self._index_structures is not None:
+            self._index_structures[(id, type_id)] = None
 
         return structure
 
-    @cache
     def get_or_create_lieu(self, code: str, type_code: TypeCodeLieu) -> Lieu:
         """
         Récupère le lieu ou le créé si il n'existe pas.
 
-        La méthode va, dans l'ordre d'exécution, rechercher dans :
-         - son @cache
-         - self._cache_lieux qui a été chargé depuis la BDD à
-           l'initialisation de l'importateur
-        Si aucun des cas ci-dessus n'a trouvé le lieu, alors on le créé.
+        Le lieu est recherché dans `self._cache_lieux`, puis matérialisé
+        depuis la BDD s'il figure dans l'index pré-chargé à l'initialisation de
+        l'importateur (voir `_find`).
         """
-        if code + str(type_code.db_value) in self._cache_lieux:
-            return self._cache_lieux[code + str(type_code.db_value)]
+        lieu = self._cache_lieux.get((code, type_code.db_value))
+        if lieu is not None:
+            return lieu
 
-        return Lieu(
+        lieu = Lieu(
             code=code,
             type_code=type_code.db_value,
         )
+        self._cache_lieux.put((code, type_code.db_value), lieu)
+        if self._index_lieux is not None:
+            self._index_lieux[(code, type_code.db_value)] = None
 
-    @cache
-    def get_accord_cadre(self, id: str) -> Marche | None:
-        if id in self._cache_accords_cadre:
-            return self._cache_accords_cadre[id]
-        return None
+        return lieu
+
+    def get_or_create_erreur(self, cle: CleErreur) -> Erreur:
+        """
+        Récupère l'erreur partagée par les DECP qui la présentent, ou la créé.
+
+        Comme pour la contrainte d'unicité de `Erreur`, la casse, les accents
+        et les espaces finaux de la clef sont ignorés (voir `cle_collation`).
+        """
+        index = cle_collation(cle)
+        erreur = self._cache_erreurs.get(index)
+        if erreur is not None:
+            return erreur
+
+        erreur = Erreur(type=cle[0], localisation=cle[1], message=cle[2])
+        self._cache_erreurs.put(index, erreur)
+        if self._index_erreurs is not None:
+            self._index_erreurs[index] = None
+        return erreur
 
     def marche_transformer(
         self,
         objet: dict[str, Any],
     ) -> bool:
-        data: MarcheSchema | MarcheAncienSchema
-        if objet.get("dateNotification") and int(objet["dateNotification"][:4]) >= 2024:
-            data = MarcheSchema.model_validate(objet)
-        else:
-            data = MarcheAncienSchema.model_validate(objet)
+        return self.write_lignes_marche(
+            build_lignes_marche(objet, self._delta is not None)
+        )
 
-        if self._sirets and data.acheteur.id not in self._sirets:
+    def write_lignes_marche(self, lignes: LignesMarche) -> bool:
+        if self._sirets and lignes.acheteur[0] not in self._sirets:
             return False
 
+        if self._writer is not None:
+            cle: CleDoublon = (
+                lignes.acheteur[0],
+                lignes.ligne["id"],
+                lignes.ligne["date_notification"],
+            )
+            publication: date | None = lignes.ligne["date_publication"]
+            uid: int | None = None
+            if self._doublons is not None:
+                a_ecrire, uid = self._doublons.rapprocher(cle, publication)
+                if not a_ecrire:
+                    return False
+                if uid is not None and self._writer.en_attente(get_table(Marche), uid):
+                    # le marché remplacé est encore en attente d'écriture
+                    self._writer.flush()
+            remplace = uid is not None
+
+            a_ecrire = True
+            if self._delta is not None and not remplace:
+                a_ecrire, uid = self._delta.rapprocher(
+                    get_table(Marche),
+                    (lignes.ligne["id"], lignes.acheteur[0]),
+                    lignes.ligne["empreinte"],
+                )
+            if a_ecrire:
+                uid = self._writer.write_marche(lignes, uid=uid)
+            if self._doublons is not None and uid is not None:
+                self._doublons.enregistrer(cle, publication, uid)
+            # un doublon remplaçant un marché déjà importé n'est pas compté
+            return not remplace
+
         marche = Marche(
-            id=data.id,
+            **lignes.ligne,
             acheteur=self.set_acheteur(
-                self.get_or_create_structure(id=data.acheteur.id, type_id="SIRET")
-            ),
-            nature=data.nature.db_value,
-            objet=data.objet,
-            code_cpv=int(data.codeCPV.split("-")[0]),
-            categorie=categorisation.CPV2categorie(data.codeCPV).db_value,
-            modalites_execution=[
-                mod.db_value
-                for mod in data.modalitesExecution["modaliteExecution"]
-                if mod.db_value
-            ],
-            accord_cadre=self.get_accord_cadre(data.idAccordCadre)
-            if data.idAccordCadre
-            else None,
-            marche_innovant=data.marcheInnovant if data.marcheInnovant else False,
-            ccag=data.ccag.db_value if data.ccag else None,
-            offres_recues=data.offresRecues,
-            attribution_avance=(
-                data.attributionAvance if data.attributionAvance else False
-            ),
-            taux_avance=data.tauxAvance,
-            type_groupement_operateurs=(
-                data.typeGroupementOperateurs.db_value
-                if data.typeGroupementOperateurs
-                else None
-            ),
-            sous_traitance_declaree=(
-                data.sousTraitanceDeclaree if data.sousTraitanceDeclaree else False
-            ),
-            procedure=data.procedure.db_value if data.procedure else None,
-            lieu=(
-                self.get_or_create_lieu(
-                    data.lieuExecution.code, data.lieuExecution.typeCode
+                self.get_or_create_structure(
+                    id=lignes.acheteur[0], type_id=lignes.acheteur[1]
                 )
-                if data.lieuExecution
-                else None
             ),
-            duree_mois=data.dureeMois,
-            duree_mois_initiale=data.dureeMois,
-            date_notification=data.dateNotification,
-            date_publication=(data.datePublicationDonnees),
-            montant=data.montant,
-            montant_initial=data.montant,
-            type_prix=[
-                o.db_value
-                for o in (data.typesPrix["typePrix"] if data.typesPrix else [])
-            ],
-            forme_prix=data.formePrix.db_value if data.formePrix else None,
+            lieu=self.get_or_create_lieu(
+                lignes.lieu[0], TypeCodeLieu.from_db_value(lignes.lieu[1])
+            )
+            if lignes.lieu
+            else None,
             titulaires=[
                 self.set_vendeur(
-                    self.get_or_create_structure(
-                        id=t["titulaire"].id,
-                        type_id=t["titulaire"].typeIdentifiant,
-                    )
+                    self.get_or_create_structure(id=cle[0], type_id=cle[1])
                 )
-                for t in data.titulaires
+                for cle in lignes.titulaires
             ],
-            origine_ue=data.origineUE,
-            origine_france=data.origineFrance,
         )
 
-        for tech in data.techniques["technique"]:
-            if tech == TechniqueAchat.AC:
-                self._cache_accords_cadre[marche.id] = marche
-
-            if tech.db_value:
-                marche.techniques_achat.append(
-                    TechniqueAchatMarche(technique=tech.db_value)
-                )
-
-        for consideration_sociale in data.considerationsSociales[
-            "considerationSociale"
-        ]:
-            if consideration_sociale.db_value:
-                marche.considerations_sociales.append(
-                    ConsiderationSocialeMarche(
-                        consideration=consideration_sociale.db_value
-                    )
-                )
-
-        for consideration_env in data.considerationsEnvironnementales[
-            "considerationEnvironnementale"
-        ]:
-            if consideration_env.db_value:
-                marche.considerations_environnementales.append(
-                    ConsiderationEnvMarche(consideration=consideration_env.db_value)
-                )
-
-        index_actes_sous_traitance: dict[int, ActeSousTraitance] = {}
-        for tmp in data.actesSousTraitance:
-            dacte: ActeSousTraitanceSchema = tmp["acteSousTraitance"]
+        marche.techniques_achat = [
+            TechniqueAchatMarche(technique=technique) for technique in lignes.techniques
+        ]
+        marche.considerations_sociales = [
+            ConsiderationSocialeMarche(consideration=consideration)
+            for consideration in lignes.considerations_sociales
+        ]
+        marche.considerations_environnementales = [
+            ConsiderationEnvMarche(consideration=consideration)
+            for consideration in lignes.considerations_environnementales
+        ]
+
+        for lignes_acte in lignes.actes_sous_traitance:
             acte = ActeSousTraitance(
-                id=dacte.id,
+                **lignes_acte.ligne,
                 sous_traitant=self.set_vendeur(
                     self.get_or_create_structure(
-                        id=dacte.sousTraitant.id,
-                        type_id=dacte.sousTraitant.typeIdentifiant,
+                        id=lignes_acte.sous_traitant[0],
+                        type_id=lignes_acte.sous_traitant[1],
                     )
                 ),
-                duree_mois=dacte.dureeMois,
-                duree_mois_initiale=dacte.dureeMois,
-                date_notification=dacte.dateNotification,
-                date_publication=dacte.datePublicationDonnees,
-                montant=dacte.montant,
-                montant_initial=dacte.montant,
-                variation_prix=dacte.variationPrix.db_value,
             )
+            acte.modifications = [
+                ModificationSousTraitance(**ligne)
+                for ligne in lignes_acte.modifications
+            ]
             marche.actes_sous_traitance.append(acte)
-            index_actes_sous_traitance[acte.id] = acte
-
-        for tmp_dma in sorted(
-            data.modificationsActesSousTraitance,
-            key=lambda x: (
-                x[
-                    "modificationActeSousTraitance"
-                ].dateNotificationModificationSousTraitance
-                if "modificationActeSousTraitance" in x
-                else x[
-                    "modificationActesSousTraitance"
-                ].dateNotificationModificationSousTraitance
-            ),
-        ):
-            dmodif: ModificationActeSousTraitanceSchema = (
-                tmp_dma["modificationActeSousTraitance"]
-                if "modificationActeSousTraitance" in tmp_dma
-                else tmp_dma["modificationActesSousTraitance"]
-            )
-            if dmodif.id not in index_actes_sous_traitance:
-                raise CustomValidationError(
-                    errors=[
-                        {
-                            "type": "incoherence",
-                            "loc": ["modificationsActesSousTraitance"],
-                            "msg": "L'acte de sous-traitance n'existe pas",
-                        }
-                    ],
-                )
-            modif_sous_traitance = ModificationSousTraitance(
-                duree_mois=dmodif.dureeMois,
-                date_notif=dmodif.dateNotificationModificationSousTraitance,
-                date_publication=dmodif.datePublicationDonnees,
-                montant=dmodif.montant,
-            )
-            index_actes_sous_traitance[dmodif.id].modifications.append(
-                modif_sous_traitance
-            )
-            if modif_sous_traitance.duree_mois is not None:
-                index_actes_sous_traitance[
-                    dmodif.id
-                ].duree_mois = modif_sous_traitance.duree_mois
-            if modif_sous_traitance.montant is not None:
-                index_actes_sous_traitance[
-                    dmodif.id
-                ].montant = modif_sous_traitance.montant
-
-        for tmp_dm in sorted(data.modifications, key=lambda x: x["modification"].id):
-            modif: ModificationMarcheSchema = tmp_dm["modification"]
-            titulaires: list[Structure] = []
-            if modif.titulaires:
-                titulaires = [
-                    self.set_vendeur(
-                        self.get_or_create_structure(
-                            id=titulaire["titulaire"].id,
-                            type_id=titulaire["titulaire"].typeIdentifiant,
-                        )
-                    )
-                    for titulaire in modif.titulaires
-                ]
 
+        for lignes_modif in lignes.modifications:
             modif_marche = ModificationMarche(
-                id=modif.id,
-                duree_mois=modif.dureeMois,
-                date_notification=modif.dateNotificationModification,
-                date_publication=modif.datePublicationDonneesModification,
-                montant=modif.montant,
-                titulaires=titulaires,
+                **lignes_modif.ligne,
+                titulaires=[
+                    self.set_vendeur(
+                        self.get_or_create_structure(id=cle[0], type_id=cle[1])
+                    )
+                    for cle in lignes_modif.titulaires
+                ],
             )
             marche.modifications.append(modif_marche)
-
-            if modif_marche.montant is not None:
-                marche.montant = modif_marche.montant
-            if modif_marche.duree_mois is not None:
-                marche.duree_mois = modif_marche.duree_mois
-            if modif_marche.titulaires is not None:
-                marche.titulaires = modif_marche.titulaires
+            marche.titulaires = modif_marche.titulaires
 
         self._session.add(marche)
         return True
@@ -403,79 +902,51 @@ class ImportateurDecp:
         self,
         objet: dict[str, Any],
     ) -> bool:
-        data = ConcessionSchema.model_validate(objet)
+        return self.write_lignes_concession(
+            build_lignes_concession(objet, self._delta is not None)
+        )
 
-        if self._sirets and data.autoriteConcedante.id not in self._sirets:
+    def write_lignes_concession(self, lignes: LignesConcession) -> bool:
+        if self._sirets and lignes.autorite_concedante[0] not in self._sirets:
             return False
 
+        if self._delta is not None and self._writer is not None:
+            a_ecrire, uid = self._delta.rapprocher(
+                get_table(ContratConcession),
+                (lignes.ligne["id"], lignes.autorite_concedante[0]),
+                lignes.ligne["empreinte"],
+            )
+            if a_ecrire:
+                self._writer.write_concession(lignes, uid=uid)
+            return True
+
+        if self._writer is not None:
+            self._writer.write_concession(lignes)
+            return True
+
         concession = ContratConcession(
-            id=data.id,
+            **lignes.ligne,
             autorite_concedante=self.set_acheteur(
                 self.get_or_create_structure(
-                    id=data.autoriteConcedante.id, type_id="SIRET"
+                    id=lignes.autorite_concedante[0],
+                    type_id=lignes.autorite_concedante[1],
                 )
             ),
-            nature=data.nature.db_value,
-            objet=data.objet,
-            procedure=data.procedure.db_value,
-            duree_mois=data.dureeMois,
-            duree_mois_initiale=data.dureeMois,
-            date_signature=data.dateSignature,
-            date_publication=data.datePublicationDonnees,
-            date_debut_execution=data.dateDebutExecution,
-            valeur_globale=data.valeurGlobale,
-            valeur_globale_initiale=data.valeurGlobale,
-            montant_subvention_publique=data.montantSubventionPublique,
-            considerations_sociales=[
-                consideration.db_value
-                for consideration in data.considerationsSociales["considerationSociale"]
-                if consideration.db_value
-            ],
-            considerations_environnementales=[
-                consideration.db_value
-                for consideration in data.considerationsEnvironnementales[
-                    "considerationEnvironnementale"
-                ]
-                if consideration.db_value
-            ],
         )
 
-        for tmp in data.donneesExecution:
-            dde: DonneeExecutionSchema = tmp["donneesAnnuelles"]
-            de = DonneeExecution(
-                date_publication=dde.datePublicationDonneesExecution,
-                depenses_investissement=dde.depensesInvestissement,
-            )
-            for tmp_dt in dde.tarifs:
-                dt: TarifSchema = tmp_dt["tarif"]
-                de.tarifs.append(Tarif(intitule=dt.intituleTarif, tarif=dt.tarif))
+        for lignes_de in lignes.donnees_execution:
+            de = DonneeExecution(**lignes_de.ligne)
+            de.tarifs = [Tarif(**ligne) for ligne in lignes_de.tarifs]
             concession.donnees_execution.append(de)
 
-        for tmp_dc in data.concessionnaires:
-            data_concessionnaire: ConcessionnaireSchema = tmp_dc["concessionnaire"]
-            concession.concessionnaires.append(
-                self.set_vendeur(
-                    self.get_or_create_structure(
-                        id=data_concessionnaire.id,
-                        type_id=data_concessionnaire.typeIdentifiant,
-                    )
-                )
-            )
+        concession.concessionnaires = [
+            self.set_vendeur(self.get_or_create_structure(id=cle[0], type_id=cle[1]))
+            for cle in lignes.concessionnaires
+        ]
 
-        for tmp_dm in sorted(data.modifications, key=lambda x: x["modification"].id):
-            data_modification: ModificationConcessionSchema = tmp_dm["modification"]
-            modif_concession = ModificationConcession(
-                id=data_modification.id,
-                date_signature=data_modification.dateSignatureModification,
-                date_publication=data_modification.datePublicationDonneesModification,
-                duree_mois=data_modification.dureeMois,
-                valeur_globale=data_modification.valeurGlobale,
-            )
-            concession.modifications.append(modif_concession)
-            if modif_concession.valeur_globale is not None:
-                concession.valeur_globale = modif_concession.valeur_globale
-            if modif_concession.duree_mois is not None:
-                concession.duree_mois = modif_concession.duree_mois
+        concession.modifications = [
+            ModificationConcession(**ligne) for ligne in lignes.modifications
+        ]
 
         self._session.add(concession)
         return True
@@ -486,93 +957,384 @@ class ImportateurDecp:
         o: dict[str, Any],
         type_contrat: TypeContrat,
     ) -> DecpMalForme:
-        def decimal_serializer(obj):  # type: ignore
-            if isinstance(obj, Decimal):
-                return str(obj)
-            raise TypeError
-
-        structure: Structure | None = None
+        return self._entite_erreur(build_lignes_erreur(e, o, type_contrat))
 
-        if type_contrat == TypeContrat.MARCHE and o.get("acheteur", {}).get("id"):
-            structure = self.get_or_create_structure(
-                id=o["acheteur"]["id"], type_id="SIRET"
-            )
-
-        if type_contrat == TypeContrat.CONCESSION and o.get(
-            "autoriteConcedante", {}
-        ).get("id"):
-            structure = self.get_or_create_structure(
-                id=o["autoriteConcedante"]["id"], type_id="SIRET"
+    def _entite_erreur(self, lignes: LignesErreur) -> DecpMalForme:
+        decp = DecpMalForme(
+            **lignes.ligne,
+            structure=self.get_or_create_structure(
+                id=lignes.structure[0], type_id=lignes.structure[1]
             )
+            if lignes.structure
+            else None,
+        )
+        decp.erreurs = [self.get_or_create_erreur(cle) for cle in lignes.erreurs]
+        return decp
 
-        date_creation: str | None = None
-
-        if type_contrat == TypeContrat.MARCHE:
-            date_creation = o.get("dateNotification")
+    def write_lignes_erreur(self, lignes: LignesErreur) -> None:
+        lignes.ligne["source"] = self._source
+        if self._writer is not None:
+            self._writer.write_erreur(lignes)
+        else:
+            self._session.add(self._entite_erreur(lignes))
 
-        if type_contrat == TypeContrat.CONCESSION:
-            date_creation = o.get("dateSignature")
+    def _filtrer_sirets(
+        self, objets: Iterable[tuple[TypeContrat, dict[str, Any]]]
+    ) -> Iterator[tuple[TypeContrat, dict[str, Any] | None]]:
+        """
+        Remplace par `None` les objets hors du périmètre des SIRET suivis, qui
+        ne sont ainsi ni validés ni envoyés aux workers. Ils restent dans le
+        flux pour que le décompte des objets lus, qui sert de point de
+        reprise, corresponde toujours à leur position dans la source.
+        """
+        if self._sirets is None:
+            yield from objets
+            return
+        for type_contrat, objet in objets:
+            if hors_perimetre(type_contrat, objet, self._sirets):
+                yield type_contrat, None
+            else:
+                yield type_contrat, objet
+
+    def _lignes_en_serie(
+        self, objets: Iterable[tuple[TypeContrat, dict[str, Any] | None]]
+    ) -> Iterator[tuple[TypeContrat, Lignes | None]]:
+        for type_contrat, objet in objets:
+            if objet is None:
+                yield type_contrat, None
+                continue
+            debut = time.perf_counter()
+            lignes = build_lignes(type_contrat, objet, self._delta is not None)
+            self._durees["validation"] += time.perf_counter() - debut
+            yield type_contrat, lignes
+
+    def _lignes_en_parallele(
+        self, objets: Iterable[tuple[TypeContrat, dict[str, Any] | None]]
+    ) -> Iterator[tuple[TypeContrat, Lignes | None]]:
+        """
+        Validation et mise à plat des objets par lots, dans un pool de processus.
 
-        decp = DecpMalForme(
-            decp=json.dumps(o, default=decimal_serializer),
-            structure=structure,
-            date_creation=date.fromisoformat(date_creation) if date_creation else None,
-        )
+        Les lots sont restitués dans leur ordre d'origine et écrits par le seul
+        processus principal : les structures et lieux n'étant référencés que par
+        leur clef dans les lignes produites par les workers, leur résolution
+        (et donc l'attribution des `uid`) reste séquentielle et déterministe.
+        Le nombre de lots en cours est borné pour limiter la mémoire.
 
-        for erreur in e.errors():
-            decp.erreurs.append(
-                Erreur(
-                    type=erreur["type"],
-                    localisation=".".join(
-                        str(v) for v in erreur["loc"] if type(v) is not int
-                    ),
-                    message=erreur["msg"],
+        Le temps de validation mesuré est celui passé à attendre les workers.
+        """
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            en_cours: deque[Future[list[tuple[TypeContrat, Lignes | None]]]] = deque()
+            for lot in batched(objets, self._taille_lot):
+                en_cours.append(
+                    executor.submit(build_lignes_lot, lot, self._delta is not None)
                 )
-            )
-        return decp
+                if len(en_cours) >= 2 * self._workers:
+                    yield from self._resultat(en_cours.popleft())
+            while en_cours:
+                yield from self._resultat(en_cours.popleft())
+
+    def _resultat(
+        self, lot: Future[list[tuple[TypeContrat, Lignes | None]]]
+    ) -> list[tuple[TypeContrat, Lignes | None]]:
+        debut = time.perf_counter()
+        resultat = lot.result()
+        self._durees["validation"] += time.perf_counter() - debut
+        return resultat
+
+    def _chronometrer[T](self, phase: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Cumule dans `phase` le temps passé à produire chaque élément."""
+        iterateur = iter(iterable)
+        while True:
+            debut = time.perf_counter()
+            try:
+                element = next(iterateur)
+            except StopIteration:
+                return
+            finally:
+                self._durees[phase] += time.perf_counter() - debut
+            yield element
 
     def _importer(
         self,
-        file: str,
-        item_path: str,
-        type_contrat: TypeContrat,
-        transformer: Callable[[dict[str, Any]], Any],
+        file: str | IO[bytes],
+        item_paths: dict[str, TypeContrat],
         batch_commit_size: int = 50_000,
+        reprise: PointDeReprise | None = None,
     ) -> None:
+        """
+        Si `reprise` est fourni, l'avancement est enregistré à chaque commit
+        (voir `PointDeReprise`) et les `reprise.objets` premiers objets, déjà
+        écrits en base, sont ignorés sans être validés.
+        """
         # (ré)Initialisation des valeurs de suivi
-        self._valid_objects = 0
-        self._invalid_objects = 0
+        if self._writer is None and self._preload_db and self._index_structures is None:
+            # libérés à la fin de l'import précédent
+            with mesurer("🗂️ Pré-chargement de la BDD"):
+                self.load_index()
+        self._valid_par_type.clear()
+        self._invalid_par_type.clear()
+        self._ignores_par_type.clear()
+        self._durees.clear()
+        self._taux_caches.clear()
+        if self._doublons is not None:
+            self._doublons.stats.clear()
+        lus: int = 0
+        if reprise is not None:
+            for nom, nombre in reprise.valides.items():
+                self._valid_par_type[TypeContrat(nom)] = nombre
+            for nom, nombre in reprise.invalides.items():
+                self._invalid_par_type[TypeContrat(nom)] = nombre
+            for nom, nombre in reprise.ignores.items():
+                self._ignores_par_type[TypeContrat(nom)] = nombre
+            lus = reprise.objets
+        self._source = reprise.source if reprise is not None else None
+        if self._delta is not None and self._writer is not None and self._source:
+            # les DECP mal formés de la version précédente de la source sont
+            # remplacés ; ceux des sources inchangées, non relues, sont conservés
+            self._writer.supprimer(
+                get_table(DecpMalForme),
+                list(
+                    self._session.execute(
+                        select(DecpMalForme.uid).where(
+                            DecpMalForme.source == self._source
+                        )
+                    ).scalars()
+                ),
+            )
         self._started_at = time.time()
 
         # Import
         batch_size: int = 0
-        with rich.progress.open(file, "rb") as f:
-            liste = ijson.items(f, f"{item_path}.item")  # flux objet par objet
-            for objet in liste:
-                try:
-                    self._valid_objects += transformer(
-                        objet
-                    )  # retourne un booléen, le compteur n'est incrémenté qu'avec les True
-                except (ValidationError, CustomValidationError) as e:
-                    self._session.add(self.build_entite_erreur(e, objet, type_contrat))
-                    self._invalid_objects += 1
+        lots = TailleLot(batch_commit_size, self._latence_commit, self._memoire_max)
+        with (
+            rich.progress.open(file, "rb")
+            if isinstance(file, str)
+            else nullcontext(file)
+        ) as f:
+            # flux objet par objet, tous types confondus, en une seule lecture
+            objets: Iterator[tuple[TypeContrat, Any]] = iter_items(
+                f, {f"{item_path}.item": tc for item_path, tc in item_paths.items()}
+            )
+            if lus:
+                log.info(f"⏩ {lus} objets déjà importés ignorés")
+                objets = islice(objets, lus, None)
+            objets_filtres = self._filtrer_sirets(self._chronometrer("analyse", objets))
+            lignes_objets = (
+                self._lignes_en_parallele(objets_filtres)
+                if self._workers > 1
+                else self._lignes_en_serie(objets_filtres)
+            )
+            for type_contrat, lignes in lignes_objets:
+                debut = time.perf_counter()
+                if lignes is None:
+                    self._ignores_par_type[type_contrat] += 1
+                elif isinstance(lignes, LignesErreur):
+                    self.write_lignes_erreur(lignes)
+                    self._invalid_par_type[type_contrat] += 1
+                elif isinstance(lignes, LignesMarche):
+                    # le compteur n'est incrémenté que si le marché est conservé
+                    self._valid_par_type[type_contrat] += self.write_lignes_marche(
+                        lignes
+                    )
+                else:
+                    self._valid_par_type[type_contrat] += self.write_lignes_concession(
+                        lignes
+                    )
 
+                lus += 1
                 batch_size += 1
-                if batch_size >= batch_commit_size:
+                if batch_size >= lots.taille or (
+                    batch_size % 1_000 == 0 and lots.memoire_depassee()
+                ):
                     log.info(f"💾 Commit de {batch_size} objets")
-                    self._session.commit()
+                    self.set_point_de_reprise(reprise, lus)
+                    debut_commit = time.perf_counter()
+                    self.commit()
+                    lots.ajuster(batch_size, time.perf_counter() - debut_commit)
+                    self.detacher_objets_ecrits()
                     batch_size = 0
+                self._durees["ecriture"] += time.perf_counter() - debut
 
-        self._session.commit()
+        debut = time.perf_counter()
+        self.set_point_de_reprise(reprise, lus)
+        self.commit()
+        self._durees["ecriture"] += time.perf_counter() - debut
+        self.liberer_caches()
         self._finished_at = time.time()
+        self._valid_objects = self._valid_par_type.total()
+        self._invalid_objects = self._invalid_par_type.total()
 
         if self._valid_objects + self._invalid_objects:
             log.info(f"⌚ Terminé en {round(self._finished_at - self._started_at, 2)}s")
+            if len(item_paths) > 1:
+                for type_contrat in item_paths.values():
+                    log.info(
+                        f"📄 {type_contrat.name.capitalize()} : {self._valid_par_type[type_contrat]} valides, {self._invalid_par_type[type_contrat]} invalides"
+                    )
             log.info(f"✅ Objets valides : {self._valid_objects}")
+            if self._sirets is not None:
+                log.info(
+                    f"🚫 Objets hors des SIRET suivis : {self._ignores_par_type.total()} ignorés avant validation"
+                )
+            if self._doublons is not None:
+                log.info(
+                    f"👯 Doublons : {self._doublons.stats['ignorés']} ignorés, {self._doublons.stats['remplacés']} remplacés par une publication plus récente"
+                )
             log.info(
                 f"❌ Objets invalides : {self._invalid_objects} ({round(self._invalid_objects * 100 / (self._valid_objects + self._invalid_objects))}%)"
             )
 
+    def nombre_valides(self, type_contrat: TypeContrat) -> int:
+        """Nombre d'objets valides conservés lors du dernier import."""
+        return self._valid_par_type[type_contrat]
+
+    def build_import_run(
+        self,
+        source: str,
+        stats: StatsFlux | None,
+        validateurs: Validateurs | None = None,
+    ) -> ImportRun:
+        """
+        Mesures du dernier import. Le temps d'analyse du JSON inclut la lecture
+        et le nettoyage du flux, qui en sont déduits lorsque `stats` est connu.
+        Les `validateurs` HTTP de la version importée sont conservés pour les
+        requêtes conditionnelles des imports incrémentaux suivants.
+        """
+        duree = self._finished_at - self._started_at
+        duree_analyse = self._durees["analyse"]
+        if stats is not None:
+            duree_analyse -= stats.duree_lecture + stats.duree_nettoyage
+
+        return ImportRun(
+            source=source,
+            date_debut=datetime.fromtimestamp(self._started_at),
+            duree=duree,
+            duree_telechargement=stats.duree_lecture if stats else None,
+            duree_nettoyage=stats.duree_nettoyage if stats else None,
+            duree_analyse=max(duree_analyse, 0.0),
+            duree_validation=self._durees["validation"],
+            duree_ecriture=self._durees["ecriture"],
+            octets=stats.octets if stats else None,
+            objets_valides=self._valid_objects,
+            objets_invalides=self._invalid_objects,
+            objets_par_seconde=(
+                (self._valid_objects + self._invalid_objects) / duree if duree else 0.0
+            ),
+            memoire_max=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+            taux_cache_structures=self._taux_caches.get("structures"),
+            taux_cache_lieux=self._taux_caches.get("lieux"),
+            doublons=self._doublons.stats.total() if self._doublons else 0,
+            objets_ignores=self._ignores_par_type.total(),
+            etag=validateurs.etag if validateurs else None,
+            last_modified=validateurs.last_modified if validateurs else None,
+        )
+
+    def set_point_de_reprise(self, reprise: PointDeReprise | None, lus: int) -> None:
+        """Enregistre l'avancement, validé par le prochain commit."""
+        if reprise is None:
+            return
+        set_point_de_reprise(
+            self._session,
+            PointDeReprise(
+                source=reprise.source,
+                objets=lus,
+                valides={t.value: n for t, n in self._valid_par_type.items()},
+                invalides={t.value: n for t, n in self._invalid_par_type.items()},
+                ignores={t.value: n for t, n in self._ignores_par_type.items()},
+            ),
+        )
+
+    def commit(self) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+        self._session.commit()
+
+    def detacher_objets_ecrits(self) -> None:
+        """
+        Retire de la session les objets commités, hormis ceux des caches qui
+        seront référencés par les prochains DECP, pour que la mémoire occupée
+        par la session ne croisse pas au fil de l'import.
+        """
+        if self._writer is not None:
+            return
+
+        gardes = {
+            id(objet)
+            for cache in (
+                self._cache_structures,
+                self._cache_lieux,
+                self._cache_erreurs,
+            )
+            for objet in cache.values()
+        }
+        for objet in list(self._session.identity_map.values()):
+            if id(objet) not in gardes:
+                self._session.expunge(objet)
+
+    def _cible(self, table: Table) -> Table:
+        """Table réellement écrite pour `table`."""
+        return self._tables_ombre.get(table, table)
+
+    def lier_accords_cadre(self) -> int:
+        """
+        Rattache les marchés non encore rattachés à l'accord-cadre qu'ils
+        référencent, en une seule requête `UPDATE ... JOIN`, et retourne le
+        nombre de marchés rattachés.
+
+        Fait une fois tous les marchés importés, le rattachement ne dépend pas
+        de l'ordre des marchés dans les sources et ne demande pas de garder les
+        accords-cadres en mémoire. Un marché n'est rattaché qu'à un accord-cadre
+        du même acheteur ; si celui-ci en a plusieurs de même identifiant,
+        c'est le dernier importé qui est retenu.
+        """
+        marche = self._cible(get_table(Marche))
+        technique = self._cible(get_table(TechniqueAchatMarche))
+        accords_cadre = (
+            select(
+                marche.c.id,
+                marche.c.uid_acheteur,
+                func.max(marche.c.uid).label("uid"),
+            )
+            .join(technique, technique.c.uid_marche == marche.c.uid)
+            .where(technique.c.technique == TechniqueAchat.AC.db_value)
+            .group_by(marche.c.id, marche.c.uid_acheteur)
+            .subquery("accord_cadre")
+        )
+        resultat = self._session.execute(
+            update(marche)
+            .where(
+                marche.c.uid_accord_cadre.is_(None),
+                marche.c.id_accord_cadre == accords_cadre.c.id,
+                marche.c.uid_acheteur == accords_cadre.c.uid_acheteur,
+                marche.c.uid != accords_cadre.c.uid,
+            )
+            .values(uid_accord_cadre=accords_cadre.c.uid)
+        )
+        return int(resultat.rowcount)  # type: ignore[attr-defined]
+
+    def finaliser(self, supprimer_disparus: bool = True) -> None:
+        """
+        En mode incrémental, supprime les contrats qui n'ont été retrouvés
+        dans aucune des sources importées (sauf si `supprimer_disparus` est
+        faux, certaines sources n'ayant pas été lues), puis rattache les
+        marchés à leurs accords-cadres et affiche le bilan.
+        """
+        self.commit()
+        if self._delta is not None and self._writer is not None:
+            for table in (get_table(Marche), get_table(ContratConcession)):
+                if supprimer_disparus:
+                    self._writer.supprimer(table, self._delta.disparus(table))
+                stats = self._delta.stats[table]
+                log.info(
+                    f"🔁 {table.name} : {stats['nouveaux']} nouveaux, {stats['modifiés']} modifiés, {stats['inchangés']} inchangés, {stats['supprimés']} supprimés"
+                )
+
+        with mesurer("🔗 Rattachement des accords-cadres"):
+            log.info(
+                f"🔗 {self.lier_accords_cadre()} marchés rattachés à un accord-cadre"
+            )
+        self._session.commit()
+
     def importer_marches(
         self,
         file: str,
@@ -580,10 +1342,8 @@ class ImportateurDecp:
     ) -> None:
         self._importer(
             file=file,
-            item_path="marches.marche",
-            transformer=self.marche_transformer,
+            item_paths={"marches.marche": TypeContrat.MARCHE},
             batch_commit_size=batch_commit_size,
-            type_contrat=TypeContrat.MARCHE,
         )
 
     def importer_concessions(
@@ -593,259 +1353,367 @@ class ImportateurDecp:
     ) -> None:
         self._importer(
             file=file,
-            item_path="marches.contrat-concession",
-            transformer=self.concession_transformer,
+            item_paths={"marches.contrat-concession": TypeContrat.CONCESSION},
+            batch_commit_size=batch_commit_size,
+        )
+
+    def importer(
+        self,
+        file: str | IO[bytes],
+        batch_commit_size: int = 100_000,
+        reprise: PointDeReprise | None = None,
+    ) -> None:
+        """
+        Importe marchés et concessions en une seule lecture du fichier (chemin
+        ou flux binaire), dans l'ordre où ils y apparaissent.
+        """
+        self._importer(
+            file=file,
+            item_paths={
+                "marches.marche": TypeContrat.MARCHE,
+                "marches.contrat-concession": TypeContrat.CONCESSION,
+            },
             batch_commit_size=batch_commit_size,
-            type_contrat=TypeContrat.CONCESSION,
+            reprise=reprise,
+        )
+
+
+def get_validateurs(session: Session) -> dict[str, Validateurs]:
+    """Validateurs HTTP de la dernière version importée de chaque source."""
+    return {
+        ligne.source: Validateurs(ligne.etag, ligne.last_modified)
+        for ligne in session.execute(
+            select(ImportRun.source, ImportRun.etag, ImportRun.last_modified).order_by(
+                ImportRun.uid
+            )
+        )
+    }
+
+
+def get_tables_contrats() -> list[Table]:
+    """Tables des contrats, vidées (ou remplacées) à chaque import."""
+    return [
+        get_table(entite)
+        for entite in (
+            Marche,
+            TechniqueAchatMarche,
+            ConsiderationSocialeMarche,
+            ConsiderationEnvMarche,
+            ActeSousTraitance,
+            ModificationSousTraitance,
+            ModificationMarche,
+            ContratConcession,
+            DonneeExecution,
+            Tarif,
+            ModificationConcession,
+            DecpMalForme,
+            Erreur,
         )
+    ] + [
+        marche_titulaire_table,
+        modification_titulaire_table,
+        concession_structure_table,
+        decp_erreur_table,
+    ]
 
 
 @app.command()
-def decps(import_de_0: bool = False) -> None:  # pragma: no cover
-    if import_de_0:
+def decps(
+    import_de_0: bool = False,
+    bulk: bool = False,
+    incremental: bool = False,
+    ombre: bool = False,
+    resume: bool = False,
+    contraintes_differees: bool = False,
+    load_data: bool = False,
+    dedoublonner: bool = False,
+) -> None:  # pragma: no cover
+    if contraintes_differees and (not import_de_0 or incremental or ombre):
+        log.error(
+            "L'option --contraintes-differees n'est utilisable qu'avec --import-de-0."
+        )
+        raise typer.Exit(1)
+    if incremental and ombre:
+        log.error("Les options --incremental et --ombre sont incompatibles.")
+        raise typer.Exit(1)
+    if incremental and resume:
+        # les contrats ignorés à la reprise seraient considérés comme disparus
+        log.error("Les options --incremental et --resume sont incompatibles.")
+        raise typer.Exit(1)
+
+    config = get_config()
+    sources: list[str] = config.SOURCES.split(" ")
+
+    point: PointDeReprise | None = None
+    if resume:
+        with Session(get_engine()) as session:
+            point = get_point_de_reprise(session)
+        if point is None:
+            log.warning("⚠️ Aucun import interrompu à reprendre, import complet")
+        elif point.source not in sources:
+            log.error(f"La source {point.source} à reprendre n'est plus configurée.")
+            raise typer.Exit(1)
+        else:
+            sources = sources[sources.index(point.source) :]
+
+    if point is not None:
+        # la base est conservée en l'état
+        log.info(
+            f"⏯️ Reprise de l'import à {point.source} ({point.objets} objets déjà importés)"
+        )
+    elif import_de_0:
         log.info("🧹 Suppression totale de la base de données")
         engine = get_engine()
-        Base.metadata.drop_all(engine)
-        Base.metadata.create_all(engine)
+        with mesurer("🏗️ Création des tables"):
+            Base.metadata.drop_all(engine)
+            if contraintes_differees:
+                # index et contraintes sont ajoutés une fois les données chargées
+                with engine.connect() as connexion:
+                    creer_tables_sans_contraintes(
+                        connexion, Base.metadata.sorted_tables
+                    )
+                    connexion.commit()
+            else:
+                Base.metadata.create_all(engine)
         with Session(engine) as session:
             session.add_all(import_cpv("cpv_2008_fr.csv"))
             session.commit()
-    else:
+    elif incremental:
+        # les DECP mal formés sont remplacés source par source, à mesure que
+        # les sources modifiées sont relues (voir `ImportateurDecp._importer`)
+        log.info("♻️ Import incrémental (contrats et DECP mal formés conservés)")
+    elif not ombre:
         log.info(
             "🧹 Suppression partielle de la base de données (lieux et structures conservés)"
         )
         with get_engine().connect() as connexion:
-            tables: list[str] = [
-                marche_titulaire_table.name,
-                modification_titulaire_table.name,
-                concession_structure_table.name,
-                str(ConsiderationEnvMarche.__tablename__),
-                str(ConsiderationSocialeMarche.__tablename__),
-                str(TechniqueAchatMarche.__tablename__),
-                str(ModificationSousTraitance.__tablename__),
-                str(ActeSousTraitance.__tablename__),
-                str(ModificationMarche.__tablename__),
-                str(Marche.__tablename__),
-                str(ModificationConcession.__tablename__),
-                str(DonneeExecution.__tablename__),
-                str(Tarif.__tablename__),
-                str(ContratConcession.__tablename__),
-                str(Erreur.__tablename__),
-                str(DecpMalForme.__tablename__),
-            ]
             connexion.execute(text("SET FOREIGN_KEY_CHECKS = 0; "))
-            for table in tables:
-                connexion.execute(text(f"TRUNCATE TABLE {table}"))
+            for table in get_tables_contrats():
+                connexion.execute(text(f"TRUNCATE TABLE {table.name}"))
             connexion.execute(text("SET FOREIGN_KEY_CHECKS = 1; "))
             connexion.commit()
 
-    config = get_config()
+    tables_ombre: dict[Table, Table] | None = None
+    if ombre:
+        log.info("🌗 Import dans des tables fantômes (tables actuelles conservées)")
+        if point is None:
+            with get_engine().connect() as connexion:
+                creer_tables_ombre(connexion, get_tables_contrats())
+                connexion.commit()
+        tables_ombre = get_tables_ombre(get_tables_contrats())
+
     sirets: None | list[str] = config.SIRETS.split(" ") if config.SIRETS else None
-    sources: list[str] = config.SOURCES.split(" ")
-    RAW_FILE = "./raw_data.json"
-    CLEANED_FILE = "./data.json"
     log.info(f"📂 {len(sources)} sources détectées")
 
-    with Session(get_engine()) as session:
-        importateur = ImportateurDecp(session=session, sirets=sirets)
+    with Session(get_engine(local_infile=load_data)) as session:
+        # seules les sources modifiées depuis le dernier import sont lues en
+        # incrémental ; sinon, toutes les sources sont téléchargées sans
+        # requête conditionnelle
+        validateurs: dict[str, Validateurs] = (
+            get_validateurs(session) if incremental else {}
+        )
 
-        for source in track(sources):
-            log.info(f"🌐 Téléchargement de {source}")
-            response = requests.get(source, stream=True)
-            response.raise_for_status()
-            with open(RAW_FILE, "wb") as handle:
-                for block in response.iter_content(1024):
-                    handle.write(block)
+        importateur = ImportateurDecp(
+            session=session,
+            sirets=sirets,
+            bulk=bulk,
+            workers=config.IMPORT_WORKERS,
+            incremental=incremental,
+            tables_ombre=tables_ombre,
+            taille_cache=config.IMPORT_TAILLE_CACHE,
+            reprise=point is not None,
+            latence_commit=config.IMPORT_LATENCE_COMMIT,
+            memoire_max=config.IMPORT_MEMOIRE_MAX,
+            load_data=load_data,
+            dedoublonner=dedoublonner,
+        )
 
-            log.info("✨ Nettoyage du JSON")
-            with open(CLEANED_FILE, "w") as cf:
-                with open(f"{RAW_FILE}", "r", errors="ignore") as myFile:
-                    for line in myFile:
-                        line = line.replace("NaN", "null")
-                        cf.write(line)
-            os.remove(RAW_FILE)
+        marches_valides: int = 0
+        inchangees: int = 0
+        # la ou les sources suivantes sont téléchargées pendant l'import
+        with (
+            mesurer("📥 Import des sources"),
+            closing(
+                precharger_sources(
+                    sources,
+                    validateurs,
+                    avance=config.IMPORT_PRECHARGEMENT,
+                    taille_max=config.IMPORT_PRECHARGEMENT_MAX * 1024 * 1024,
+                )
+            ) as telechargements,
+        ):
+            for index, telechargement in enumerate(
+                track(telechargements, total=len(sources))
+            ):
+                source = telechargement.url
+                if telechargement.est_inchangee():
+                    log.info(f"⏭️ {source} inchangée depuis le dernier import")
+                    inchangees += 1
+                else:
+                    # nettoyage des NaN et import à la volée
+                    log.info(f"🌐 Import de {source}")
+                    importateur.importer(
+                        file=telechargement.ouvrir(),
+                        reprise=point
+                        if point is not None and point.source == source
+                        else PointDeReprise(source),
+                    )
+                    marches_valides += importateur.nombre_valides(TypeContrat.MARCHE)
+                    session.add(
+                        importateur.build_import_run(
+                            source, telechargement.stats, telechargement.validateurs
+                        )
+                    )
+                    session.commit()
+                if index + 1 < len(sources):
+                    # la source terminée n'aura pas à être relue en cas de reprise
+                    set_point_de_reprise(session, PointDeReprise(sources[index + 1]))
+                    session.commit()
+
+            if inchangees:
+                # les contrats des sources non lues seraient considérés disparus
+                log.warning(
+                    f"⚠️ {inchangees} sources inchangées : les contrats disparus ne sont pas supprimés"
+                )
+            importateur.finaliser(supprimer_disparus=not inchangees)
 
-            log.info("🔄 Import des marchés")
-            importateur.importer_marches(file=CLEANED_FILE)
+        if load_data and point is None and not incremental:
+            # chaque marché valide doit avoir été chargé une et une seule fois
+            table = (tables_ombre or {}).get(get_table(Marche), get_table(Marche))
+            marches = session.execute(select(func.count()).select_from(table)).scalar()
+            if marches != marches_valides:
+                log.error(
+                    f"{marches} marchés chargés dans {table.name} pour {marches_valides} marchés valides"
+                )
+                raise typer.Exit(1)
 
-            log.info("🔄 Import des concessions")
-            importateur.importer_concessions(file=CLEANED_FILE)
+        if contraintes_differees:
+            with mesurer("🔗 Ajout des index et contraintes"):
+                ajouter_contraintes(session.connection(), Base.metadata.sorted_tables)
+                session.commit()
 
-            log.info("🧹 Suppression du fichier téléchargé")
-            os.remove(CLEANED_FILE)
+        if ombre:
+            log.info("🔀 Bascule des tables fantômes")
+            basculer_tables_ombre(session.connection(), get_tables_contrats())
+            session.commit()
 
         set_dernier_import(session)
+        delete_point_de_reprise(session)
 
 
 @app.command()
 def structures() -> None:
-    api = get_api_entreprise(get_config())
+    config = get_config()
+    client = ClientLimite(
+        get_api_entreprise(config),
+        SeauJetons(
+            config.API_ENTREPRISE_REQUETES_MINUTE / 60,
+            capacite=config.API_ENTREPRISE_WORKERS,
+        ),
+    )
     with Session(get_engine()) as session:
         structures = list(
             session.execute(
-                select(Structure)
+                select(Structure.uid, Structure.identifiant)
                 .where(Structure.nom.is_(None), Structure.type_identifiant == "SIRET")
                 .order_by(desc(Structure.uid))
-            ).scalars()
+            ).tuples()
         )
         log.info(f"{len(structures)} structures sans nom détectées")
 
-        nb: int = 0
-        for structure in track(structures):
-            try:
-                raw = api.raw_donnees_etablissement(
-                    f"enrichi/{structure.identifiant}?coordinates_format=WSG84"
-                )
-                if raw and raw.get("data") and raw["data"].get("unite_legale"):
-                    details = raw["data"]
-                    structure.nom = (
-                        details["unite_legale"]
-                        .get("personne_morale_attributs", {})
-                        .get("raison_sociale")
-                    )
-                    structure.cat_entreprise = details["unite_legale"].get(
-                        "categorie_entreprise"
-                    )
-                    if details["coordonnees"]:
-                        structure.longitude = details["coordonnees"][0]
-                        structure.latitude = details["coordonnees"][1]
-                    session.add(structure)
-                    log.debug(structure.nom)
-                    nb += 1
-                    if nb > 500:
-                        log.info("💾 Commit de 500 objets")
-                        nb = 0
-                        session.commit()
-            except ApiEntrepriseClientError:
-                log.error(
-                    f"Erreur ApiEntreprise lors de l'import des données de {structure.identifiant}"
-                )
-
-        session.commit()
-
-
-def parse_infogreffe_decimal(value: Any) -> Decimal | None:
-    if value is None or value == "" or value == "Confidentiel":
-        return None
-
-    return Decimal(str(value))
-
-
-def parse_infogreffe_int(value: Any) -> int | None:
-    if value is None or value == "" or value == "Confidentiel":
-        return None
-
-    return int(value)
-
-
-def build_infogreffe_entries(
-    uid_structure: int, record: dict[str, Any]
-) -> list[StructureInfogreffe]:
-    structures_infos: list[StructureInfogreffe] = []
-
-    for index in range(1, 4):
-        ca = parse_infogreffe_decimal(record.get(f"ca_{index}"))
-        resultat = parse_infogreffe_decimal(record.get(f"resultat_{index}"))
-        effectif = parse_infogreffe_int(record.get(f"effectif_{index}"))
-        millesime = parse_infogreffe_int(record.get(f"millesime_{index}"))
-
-        if millesime and (
-            ca is not None or resultat is not None or effectif is not None
-        ):
-            structures_infos.append(
-                StructureInfogreffe(
-                    uid_structure=uid_structure,
-                    annee=millesime,
-                    ca=ca,
-                    resultat=resultat,
-                    effectif=effectif,
-                )
+        with mesurer("🏢 Enrichissement des structures"):
+            bilan = enrichir_structures(
+                session,
+                client,
+                track(structures),
+                workers=config.API_ENTREPRISE_WORKERS,
             )
-
-    return structures_infos
-
-
-def get_infogreffe_record(
-    session: requests.Session, dataset: str, api_key: str, siret: str
-) -> dict[str, Any] | None:
-    siren = siret[:9]
-    nic = siret[9:]
-
-    if not siret:
-        return None
-
-    response = session.get(
-        f"{INFOGREFFE_API_BASE_URL}/catalog/datasets/{dataset}/records",
-        params={
-            "apikey": api_key,
-            "where": f'siren={siren} and nic="{nic}"',
-            "limit": "1",
-        },
-        timeout=30,
-    )
-    response.raise_for_status()
-
-    payload = cast(dict[str, Any], response.json())
-    results = cast(list[dict[str, Any]], payload.get("results", []))
-    if not results:
-        return None
-
-    return results[0]
+        log.info(
+            f"✅ {bilan.enrichies} structures enrichies, {bilan.inconnues} inconnues de l'API Entreprise"
+        )
+        for siret in bilan.erreurs:
+            log.error(f"Erreur ApiEntreprise lors de l'import des données de {siret}")
 
 
 @app.command()
-def infogreffe() -> None:
+def infogreffe(from_export: str | None = None, incremental: bool = False) -> None:
     config = get_config()
-    if not config.INFOGREFFE_API_KEY:
+    if from_export is None and not config.INFOGREFFE_API_KEY:
         log.error("La variable INFOGREFFE_API_KEY doit être renseignée.")
         raise typer.Exit(1)
+    if from_export is not None and not os.path.isfile(from_export):
+        log.error(f"Le fichier {from_export} n'existe pas.")
+        raise typer.Exit(1)
 
-    with get_engine().connect() as connexion:
-        connexion.execute(
-            text(f"TRUNCATE TABLE {str(StructureInfogreffe.__tablename__)}")
+    requete = select(Structure.uid, Structure.identifiant).where(
+        Structure.type_identifiant == "SIRET"
+    )
+    if incremental:
+        # seules les structures nouvelles ou dont les données ont expiré
+        limite = datetime.now() - timedelta(days=config.INFOGREFFE_TTL_JOURS)
+        requete = requete.where(
+            or_(
+                Structure.date_infogreffe.is_(None),
+                Structure.date_infogreffe < limite,
+            )
         )
-        connexion.commit()
-    with Session(get_engine()) as session:
-        structures = {
-            structure[0]: structure[1]
-            for structure in session.execute(
-                select(Structure.identifiant, Structure.uid).where(
-                    Structure.type_identifiant == "SIRET"
-                )
-            ).all()
-        }
-        if len(structures):
-            log.info(f"{len(structures)} structures détectées")
-            nb_structures = 0
-            nb_infos = 0
-            with requests.Session() as request_session:
-                for siret, uid_structure in track(structures.items()):
-                    record = get_infogreffe_record(
-                        request_session,
-                        config.INFOGREFFE_DATASET,
-                        config.INFOGREFFE_API_KEY,
-                        siret,
-                    )
-                    if record is None:
-                        continue
-
-                    structures_infos = build_infogreffe_entries(uid_structure, record)
-                    session.add_all(structures_infos)
-                    nb_infos += len(structures_infos)
-                    nb_structures += 1
-
-                    if not nb_structures % 100:
-                        log.info(
-                            f"💾 Commit de {nb_structures}/{len(structures)} structures"
-                        )
-                        session.commit()
+    else:
+        with get_engine().connect() as connexion:
+            connexion.execute(
+                text(f"TRUNCATE TABLE {str(StructureInfogreffe.__tablename__)}")
+            )
+            connexion.commit()
 
-            session.commit()
-            log.info(
-                f"🧮 Résultat : {nb_infos} entrées Infogreffe pour {nb_structures} structures"
+    with Session(get_engine()) as session:
+        structures = list(session.execute(requete).tuples())
+        if not structures and incremental:
+            log.info("✅ Les données Infogreffe de toutes les structures sont à jour")
+            return
+        if not structures:
+            log.error("Aucune structure détectée. Il faut d'abord importer des DECPs.")
+            return
+
+        log.info(f"{len(structures)} structures détectées")
+        if from_export is not None:
+            bilan = importer_export(
+                session,
+                lire_export(Path(from_export)),
+                {siret: uid for uid, siret in structures},
+                remplacer=incremental,
+            )
+            debit = (
+                f"⏱️ {bilan.traitees} lignes d'export en {bilan.duree:.0f}s "
+                f"({bilan.debit:.0f}/s)"
             )
         else:
-            log.error("Aucune structure détectée. Il faut d'abord importer des DECPs.")
+            with session_http(config.INFOGREFFE_WORKERS) as http:
+                client = ClientInfogreffe(
+                    http,
+                    config.INFOGREFFE_DATASET,
+                    config.INFOGREFFE_API_KEY,
+                    SeauJetons(
+                        config.INFOGREFFE_REQUETES_SECONDE,
+                        capacite=config.INFOGREFFE_WORKERS,
+                    ),
+                )
+                bilan = moissonner_infogreffe(
+                    session,
+                    client,
+                    track(structures),
+                    workers=config.INFOGREFFE_WORKERS,
+                    remplacer=incremental,
+                )
+            debit = (
+                f"⏱️ {bilan.traitees} structures en {bilan.duree:.0f}s "
+                f"({bilan.debit:.1f}/s, {client.requetes} requêtes)"
+            )
+
+        log.info(
+            f"🧮 Résultat : {bilan.entrees} entrées Infogreffe pour {bilan.structures} structures"
+        )
+        log.info(debit)
+        for siret in bilan.erreurs:
+            log.error(f"Erreur Infogreffe lors de l'import des données de {siret}")
 
 
 def import_cpv(file_path: str) -> list[CPV]:
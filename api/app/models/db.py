@@ -1,9 +1,20 @@
 import re
-from datetime import date
+import zlib
+from datetime import date, datetime
 from decimal import Decimal
-
-from sqlalchemy import Column, ForeignKey, String, Table, Text, UniqueConstraint
-from sqlalchemy.dialects.mysql import DECIMAL, MEDIUMTEXT
+from typing import Any
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    ForeignKey,
+    String,
+    Table,
+    Text,
+    TypeDecorator,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.mysql import DECIMAL, MEDIUMBLOB
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.orm import (
@@ -33,6 +44,20 @@ from app.models.enums import (
 )
 
 
+class TexteCompresse(TypeDecorator[str]):
+    """Texte stocké compressé (zlib) dans une colonne binaire."""
+
+    impl = MEDIUMBLOB
+    cache_ok = True
+
+    def process_bind_param(self, value: str | None, dialect: Any) -> bytes | None:
+        # niveau 1 : la compression ne doit pas ralentir l'import
+        return zlib.compress(value.encode("utf-8"), 1) if value is not None else None
+
+    def process_result_value(self, value: bytes | None, dialect: Any) -> str | None:
+        return zlib.decompress(value).decode("utf-8") if value is not None else None
+
+
 class Base(DeclarativeBase):
     @declared_attr  # type: ignore
     def __tablename__(cls: "Base") -> str:
@@ -68,6 +93,8 @@ class Structure(Base):
     infogreffe: Mapped[list["StructureInfogreffe"]] = relationship(
         back_populates="structure"
     )
+    # dernière récupération des données Infogreffe
+    date_infogreffe: Mapped[datetime | None] = mapped_column(default=None)
 
     __table_args__ = (UniqueConstraint("identifiant", "type_identifiant"),)
 
@@ -223,10 +250,12 @@ class Marche(Base):
     modalites_execution: Mapped[list[int]] = mapped_column(
         MutableList.as_mutable(PickleType)
     )
-    accord_cadre: Mapped["Marche | None"] = relationship()  # 1*
+    accord_cadre: Mapped["Marche | None"] = relationship(remote_side="Marche.uid")  # 1*
     uid_accord_cadre: Mapped[None | int] = mapped_column(
         ForeignKey("marche.uid", name="marche_accord_cadre_fk")
     )
+    # identifiant de l'accord-cadre référencé, rattaché après l'import
+    id_accord_cadre: Mapped[str | None] = mapped_column(String(16))
     marche_innovant: Mapped[bool]
     ccag: Mapped[int | None]
     offres_recues: Mapped[int | None]
@@ -263,6 +292,8 @@ class Marche(Base):
     #     relationship()
     # )  # *1
     modifications: Mapped[list[ModificationMarche]] = relationship()  # *1
+    # hash du DECP source, utilisé par l'import incrémental
+    empreinte: Mapped[str | None] = mapped_column(String(64), default=None)
 
     @hybrid_property
     def nature_as_str(self) -> NatureMarche:
@@ -282,23 +313,21 @@ class Marche(Base):
 
     @hybrid_property
     def type_prix_as_str(self) -> list[TypePrix]:
-        return [TypePrix.from_db_value(v) for v in self.type_prix]
+        return TypePrix.from_db_values(self.type_prix)
 
     @hybrid_property
     def considerations_sociales_as_str(self) -> list[ConsiderationsSociales]:
-        return [
-            ConsiderationsSociales.from_db_value(c.consideration)
-            for c in self.considerations_sociales
-        ]
+        return ConsiderationsSociales.from_db_values(
+            c.consideration for c in self.considerations_sociales
+        )
 
     @hybrid_property
     def considerations_environnementales_as_str(
         self,
     ) -> list[ConsiderationsEnvironnementales]:
-        return [
-            ConsiderationsEnvironnementales.from_db_value(c.consideration)
-            for c in self.considerations_environnementales
-        ]
+        return ConsiderationsEnvironnementales.from_db_values(
+            c.consideration for c in self.considerations_environnementales
+        )
 
     @hybrid_property
     def type_groupement_operateurs_as_str(self) -> TypeGroupementOperateur | None:
@@ -310,13 +339,11 @@ class Marche(Base):
 
     @hybrid_property
     def techniques_achat_as_str(self) -> list[TechniqueAchat]:
-        return [
-            TechniqueAchat.from_db_value(t.technique) for t in self.techniques_achat
-        ]
+        return TechniqueAchat.from_db_values(t.technique for t in self.techniques_achat)
 
     @hybrid_property
     def modalites_execution_as_str(self) -> list[ModaliteExecution]:
-        return [ModaliteExecution.from_db_value(v) for v in self.modalites_execution]
+        return ModaliteExecution.from_db_values(self.modalites_execution)
 
 
 class ModificationConcession(Base):
@@ -374,6 +401,8 @@ class ContratConcession(Base):
         MutableList.as_mutable(PickleType)
     )
     modifications: Mapped[list[ModificationConcession]] = relationship()  # *1
+    # hash du DECP source, utilisé par l'import incrémental
+    empreinte: Mapped[str | None] = mapped_column(String(64), default=None)
 
     @hybrid_property
     def nature_as_str(self) -> NatureConcession | None:
@@ -389,41 +418,53 @@ class ContratConcession(Base):
 
     @hybrid_property
     def considerations_sociales_as_str(self) -> list[ConsiderationsSociales]:
-        return [
-            ConsiderationsSociales.from_db_value(v)
-            for v in self.considerations_sociales
-        ]
+        return ConsiderationsSociales.from_db_values(self.considerations_sociales)
 
     @hybrid_property
     def considerations_environnementales_as_str(
         self,
     ) -> list[ConsiderationsEnvironnementales]:
-        return [
-            ConsiderationsEnvironnementales.from_db_value(v)
-            for v in self.considerations_environnementales
-        ]
+        return ConsiderationsEnvironnementales.from_db_values(
+            self.considerations_environnementales
+        )
+
+
+decp_erreur_table = Table(
+    "decp_erreur_table",
+    Base.metadata,
+    Column("uid_decp", ForeignKey("decp_mal_forme.uid", name="decp_erreur_decp_fk")),
+    Column("uid_erreur", ForeignKey("erreur.uid", name="decp_erreur_erreur_fk")),
+)
 
 
 class Erreur(Base):
+    """Erreur de validation, partagée par tous les DECP qui la présentent."""
+
     uid: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    decp: Mapped["DecpMalForme"] = relationship()
-    uid_decp: Mapped[int] = mapped_column(
-        ForeignKey("decp_mal_forme.uid", name="erreur_decp_fk")
+    decps: Mapped[list["DecpMalForme"]] = relationship(
+        back_populates="erreurs", secondary=decp_erreur_table
     )
     type: Mapped[str] = mapped_column(String(100))
     localisation: Mapped[str] = mapped_column(String(255))
     message: Mapped[str] = mapped_column(String(255))
 
+    __table_args__ = (UniqueConstraint("type", "localisation", "message"),)
+
 
 class DecpMalForme(Base):
     uid: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    decp: Mapped[str] = mapped_column(MEDIUMTEXT())
-    erreurs: Mapped[list[Erreur]] = relationship(back_populates="decp")
+    decp: Mapped[str] = mapped_column(TexteCompresse())
+    erreurs: Mapped[list[Erreur]] = relationship(
+        back_populates="decps", secondary=decp_erreur_table
+    )
     uid_structure: Mapped[int | None] = mapped_column(
         ForeignKey(Structure.uid, name="decp_structure_fk"), default=None
     )
     structure: Mapped[Structure | None] = relationship()
     date_creation: Mapped[date | None]
+    # source DECP d'origine, dont les DECP mal formés sont remplacés à chaque
+    # import incrémental qui la relit
+    source: Mapped[str | None] = mapped_column(String(255), default=None, index=True)
 
 
 class CPV(Base):
@@ -435,3 +476,31 @@ class CPV(Base):
 class Conf(Base):
     clef: Mapped[str] = mapped_column(String(255), primary_key=True)
     valeur: Mapped[str] = mapped_column(String(255))
+
+
+class ImportRun(Base):
+    """Mesures de l'import d'une source DECP, conservées d'un import à l'autre."""
+
+    uid: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    source: Mapped[str] = mapped_column(String(255))
+    date_debut: Mapped[datetime]
+    # durées en secondes
+    duree: Mapped[float]
+    duree_telechargement: Mapped[float | None]
+    duree_nettoyage: Mapped[float | None]
+    duree_analyse: Mapped[float]
+    duree_validation: Mapped[float]
+    duree_ecriture: Mapped[float]
+    octets: Mapped[int | None] = mapped_column(BigInteger)  # après décompression
+    objets_valides: Mapped[int]
+    objets_invalides: Mapped[int]
+    objets_par_seconde: Mapped[float]
+    memoire_max: Mapped[int]  # pic de mémoire du processus, en Mo
+    taux_cache_structures: Mapped[float | None]  # entre 0 et 1
+    taux_cache_lieux: Mapped[float | None]
+    doublons: Mapped[int] = mapped_column(default=0)  # marchés écartés
+    # objets écartés avant validation par le filtre des SIRET
+    objets_ignores: Mapped[int] = mapped_column(default=0)
+    # validateurs HTTP de la version importée (requêtes conditionnelles)
+    etag: Mapped[str | None] = mapped_column(String(255))
+    last_modified: Mapped[str | None] = mapped_column(String(255))
@@ -1,8 +1,23 @@
-from enum import StrEnum
-from typing import Self
+from collections.abc import Iterable
+from enum import EnumType, StrEnum
+from typing import Any, Self, cast
 
 
-class CustomStrEnum(StrEnum):
+class CustomStrEnumType(EnumType):
+    """Construit, à la création de chaque enum, l'index `db_value` -> membre."""
+
+    _par_db_value: dict[int | None, Any]
+
+    def __new__(metacls, *args: Any, **kwargs: Any) -> "CustomStrEnumType":
+        enum_class = super().__new__(metacls, *args, **kwargs)
+        enum_class._par_db_value = {}
+        for item in cast("Iterable[CustomStrEnum]", enum_class):
+            # en cas de doublon, le premier membre déclaré l'emporte
+            enum_class._par_db_value.setdefault(item.db_value, item)
+        return enum_class
+
+
+class CustomStrEnum(StrEnum, metaclass=CustomStrEnumType):
     db_value: int | None
 
     # https://docs.python.org/3/howto/enum.html#when-to-use-new-vs-init
@@ -14,10 +29,19 @@ class CustomStrEnum(StrEnum):
 
     @classmethod
     def from_db_value(cls, db_value: int) -> Self:
-        for item in cls:
-            if item.db_value == db_value:
-                return item
-        raise ValueError()
+        try:
+            return cast(Self, cls._par_db_value[db_value])
+        except KeyError:
+            raise ValueError() from None
+
+    @classmethod
+    def from_db_values(cls, db_values: Iterable[int]) -> list[Self]:
+        """Décode toute une colonne de `db_value` en une seule passe."""
+        par_db_value = cls._par_db_value
+        try:
+            return [par_db_value[db_value] for db_value in db_values]
+        except KeyError:
+            raise ValueError() from None
 
 
 class NatureMarche(CustomStrEnum):
@@ -1,10 +1,10 @@
 from fastapi import APIRouter
-from sqlalchemy import select
+from sqlalchemy import desc, select
 
 from app.dependencies import SessionDep
-from app.models.db import Conf
+from app.models.db import Conf, ImportRun
 
-from .models import ConfDto
+from .models import ConfDto, ImportRunDto
 
 router = APIRouter()
 
@@ -17,3 +17,27 @@ def get_conf(session: SessionDep) -> ConfDto:
             for ligne in list(session.execute(select(Conf)).scalars())
         }
     )
+
+
+@router.get("/imports", response_model=list[ImportRunDto])
+def get_imports(
+    session: SessionDep,
+    limit: int | None = 100,
+    offset: int | None = None,
+    source: str | None = None,
+) -> list[ImportRun]:
+    """Mesures des derniers imports, du plus récent au plus ancien."""
+    stmt = select(ImportRun)
+
+    if source:
+        stmt = stmt.where(ImportRun.source == source)
+
+    stmt = stmt.order_by(desc(ImportRun.uid))
+
+    if limit:
+        stmt = stmt.limit(limit)
+
+    if offset:
+        stmt = stmt.offset(offset)
+
+    return list(session.execute(stmt).scalars())
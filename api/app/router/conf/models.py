@@ -1,5 +1,32 @@
-from pydantic import BaseModel
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict
 
 
 class ConfDto(BaseModel):
     dernier_import: str | None = None
+
+
+class ImportRunDto(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    uid: int
+    source: str
+    date_debut: datetime
+    duree: float
+    duree_telechargement: float | None
+    duree_nettoyage: float | None
+    duree_analyse: float
+    duree_validation: float
+    duree_ecriture: float
+    octets: int | None
+    objets_valides: int
+    objets_invalides: int
+    objets_par_seconde: float
+    memoire_max: int
+    taux_cache_structures: float | None
+    taux_cache_lieux: float | None
+    doublons: int
+    objets_ignores: int
+    etag: str | None
+    last_modified: str | None
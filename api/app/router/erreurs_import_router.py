@@ -4,7 +4,7 @@ from fastapi import APIRouter
 from sqlalchemy import Row, desc, func, select
 
 from app.dependencies import SessionDep
-from app.models.db import DecpMalForme, Erreur, Structure
+from app.models.db import DecpMalForme, Erreur, Structure, decp_erreur_table
 from app.models.dto import DecpMalFormeDto, StatsErreursDto
 
 router = APIRouter()
@@ -60,14 +60,16 @@ def get_stats_erreurs(
     date_fin: date | None = None,
     uid_structure: int | None = None,
 ) -> list[Row[tuple[int, str, str, str]]]:
+    # une erreur est partagée par les DECP qui la présentent : on compte les
+    # associations entre erreurs et DECP
     stmt = select(
-        func.count(Erreur.message).label("nombre"),
+        func.count(decp_erreur_table.c.uid_decp).label("nombre"),
         Erreur.message.label("erreur"),
         Erreur.localisation,
         Erreur.type,
-    )
+    ).join_from(Erreur, decp_erreur_table)
     if date_debut or date_fin or uid_structure:
-        stmt = stmt.join(Erreur.decp)
+        stmt = stmt.join(DecpMalForme)
 
     if date_debut:
         stmt = stmt.where(DecpMalForme.date_creation >= date_debut)
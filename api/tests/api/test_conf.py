@@ -1,4 +1,6 @@
-from tests.factories import ConfFactory
+import pytest
+
+from tests.factories import ConfFactory, ImportRunFactory
 
 
 def test_get_conf(client):
@@ -8,3 +10,21 @@ def test_get_conf(client):
 
     assert response.status_code == 200
     assert response.json() == {"dernier_import": "2026-05-01"}
+
+
+def test_get_imports(client):
+    ImportRunFactory(source="source1")
+    dernier = ImportRunFactory(source="source2", memoire_max=1024)
+
+    response = client.get("/conf/imports")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert response.json()[0]["uid"] == dernier.uid
+    assert response.json()[0]["memoire_max"] == 1024
+    assert response.json()[0]["taux_cache_structures"] == pytest.approx(0.9)
+
+    response = client.get("/conf/imports", params={"source": "source1", "limit": 1})
+
+    assert response.status_code == 200
+    assert [run["source"] for run in response.json()] == ["source1"]
@@ -0,0 +1,83 @@
+"""
+Compare le parcours en une passe d'`iter_items` (objets reconstruits en
+Python depuis `ijson.parse`) à deux passes d'`ijson.items` (implémenté en C),
+une par type de contrat, qui demandent de lire deux fois la source.
+
+Les marchés des fichiers de test sont répétés `facteur` fois dans un même
+fichier, suivis de concessions, bien moins nombreuses dans les sources DECP.
+Chaque parcours est répété `essais` fois, le meilleur temps est retenu :
+
+    python -m tests.benchmark_flux [facteur] [essais]
+"""
+
+import io
+import json
+import sys
+import time
+from collections.abc import Callable
+
+import ijson
+
+from app.helpers.flux import iter_items
+
+PREFIXES = {"marches.marche.item": "marche", "marches.contrat-concession.item": "c"}
+
+
+def construire(facteur: int) -> bytes:
+    with open("tests/files/liste_marches_valides.json") as f:
+        marches = json.load(f)["marches"]["marche"]
+    with open("tests/files/liste_concessions_valides.json") as f:
+        concessions = json.load(f)["marches"]["contrat-concession"]
+    return json.dumps(
+        {
+            "marches": {
+                "marche": marches * facteur,
+                "contrat-concession": concessions * (facteur // 10),
+            }
+        }
+    ).encode()
+
+
+def une_passe(contenu: bytes) -> tuple[int, int]:
+    """Nombre d'objets parcourus et d'octets lus."""
+    source = io.BytesIO(contenu)
+    objets = sum(1 for _ in iter_items(source, PREFIXES))
+    return objets, source.tell()
+
+
+def deux_passes(contenu: bytes) -> tuple[int, int]:
+    objets = octets = 0
+    for prefix in PREFIXES:
+        source = io.BytesIO(contenu)
+        objets += sum(1 for _ in ijson.items(source, prefix, buf_size=256 * 1024))
+        octets += source.tell()
+    return objets, octets
+
+
+def mesurer(
+    nom: str, fonction: Callable[[bytes], tuple[int, int]], contenu: bytes, essais: int
+) -> float:
+    durees = []
+    for _ in range(essais):
+        debut = time.perf_counter()
+        objets, octets = fonction(contenu)
+        durees.append(time.perf_counter() - debut)
+    duree = min(durees)
+    print(
+        f"{nom:<12} {duree:6.2f}s  {objets / duree:10.0f} objets/s  "
+        f"{octets / 1e6:6.1f} Mo lus"
+    )
+    return duree
+
+
+def main(facteur: int = 3_000, essais: int = 5) -> None:
+    contenu = construire(facteur)
+    print(f"{len(contenu) / 1e6:.1f} Mo, backend ijson {ijson.backend}")
+
+    une = mesurer("une passe", une_passe, contenu, essais)
+    deux = mesurer("deux passes", deux_passes, contenu, essais)
+    print(f"rapport une passe / deux passes : {une / deux:.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
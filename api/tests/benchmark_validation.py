@@ -0,0 +1,46 @@
+"""
+Mesure du coût par marché de la validation et de la mise à plat des DECP.
+
+Le fichier `tests/files/liste_marches_valides.json` est répété `facteur` fois
+pour obtenir un volume significatif :
+
+    python -m tests.benchmark_validation [facteur]
+"""
+
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+import ijson
+
+from app.importation import TypeContrat, build_lignes, valider_marche
+
+FICHIER = "tests/files/liste_marches_valides.json"
+
+
+def mesurer(nom: str, fonction: Callable[[dict[str, Any]], Any], objets: list) -> None:
+    debut = time.perf_counter()
+    for objet in objets:
+        fonction(objet)
+    duree = time.perf_counter() - debut
+    print(
+        f"{nom:<20} {duree:6.2f}s  {len(objets) / duree:10.0f} marchés/s  "
+        f"{duree * 1e6 / len(objets):6.1f}µs/marché"
+    )
+
+
+def main(facteur: int = 10_000) -> None:
+    with open(FICHIER, "rb") as f:
+        marches = list(ijson.items(f, "marches.marche.item"))
+    objets = marches * facteur
+    print(f"{len(objets)} marchés ({len(marches)} × {facteur})")
+
+    mesurer("validation", valider_marche, objets)
+    mesurer(
+        "build_lignes", lambda objet: build_lignes(TypeContrat.MARCHE, objet), objets
+    )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -18,6 +18,7 @@ from tests.factories import (
     CritereSocialFactory,
     DecpMalFormeFactory,
     ErreurFactory,
+    ImportRunFactory,
     LieuFactory,
     MarcheFactory,
     StructureFactory,
@@ -61,6 +62,7 @@ def db_fixture(db_url):
     engine = create_engine(
         db_url,
         echo=False,
+        connect_args={"local_infile": True},  # voir `BulkWriter.charger`
     )
     Base.metadata.create_all(engine)
     connection = engine.connect()
@@ -94,6 +96,7 @@ def set_factory_db(db):
         StructureInfogreffeFactory,
         CPVFactory,
         ConfFactory,
+        ImportRunFactory,
     ]:
         my_factory._meta.sqlalchemy_session = db
 
@@ -149,6 +149,7 @@ class ConcessionFactory(factory.alchemy.SQLAlchemyModelFactory):
 class ErreurFactory(factory.alchemy.SQLAlchemyModelFactory):
     class Meta:
         model = db.Erreur
+        sqlalchemy_get_or_create = ("type", "localisation", "message")
 
     type = "Erreur générique"
     localisation = "."
@@ -173,3 +174,26 @@ class ConfFactory(factory.alchemy.SQLAlchemyModelFactory):
 
     clef = factory.faker.Faker("string")
     valeur = factory.faker.Faker("string")
+
+
+class ImportRunFactory(factory.alchemy.SQLAlchemyModelFactory):
+    class Meta:
+        model = db.ImportRun
+
+    source = "https://www.data.gouv.fr/fr/datasets/r/decp.json"
+    date_debut = factory.faker.Faker("date_time")
+    duree = 120.0
+    duree_telechargement = 30.0
+    duree_nettoyage = 5.0
+    duree_analyse = 25.0
+    duree_validation = 40.0
+    duree_ecriture = 20.0
+    octets = 500_000_000
+    objets_valides = 95_000
+    objets_invalides = 5_000
+    objets_par_seconde = 833.3
+    memoire_max = 512
+    taux_cache_structures = 0.9
+    taux_cache_lieux = 0.99
+    doublons = 12
+    objets_ignores = 0
@@ -0,0 +1,155 @@
+import json
+import threading
+from collections import Counter
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+import pytest
+from api_entreprise.api import ApiEntreprise
+from api_entreprise.exceptions import ApiEntrepriseClientError
+from api_entreprise.models.config import Config as APIEntrepriseConfig
+from api_entreprise.models.context_info import ContextInfo
+from sqlalchemy import select
+
+from app.helpers.api_entreprise import (
+    ClientLimite,
+    build_ligne_structure,
+    enrichir_structures,
+)
+from app.helpers.limiteur import SeauJetons
+from app.models.db import Structure
+from tests.factories import StructureFactory
+from tests.horloge import Horloge
+
+
+def etablissement(nom: str) -> dict:
+    return {
+        "data": {
+            "unite_legale": {
+                "personne_morale_attributs": {"raison_sociale": nom},
+                "categorie_entreprise": "PME",
+            },
+            "coordonnees": [-1.68, 48.11],
+        }
+    }
+
+
+class ApiEntrepriseFactice(BaseHTTPRequestHandler):
+    """
+    API Entreprise locale : chaque SIRET reçoit, dans l'ordre, les codes de
+    `reponses` (200 par défaut).
+    """
+
+    reponses: ClassVar[dict[str, list[int]]] = {}
+    appels: ClassVar[Counter[str]] = Counter()
+
+    def do_GET(self) -> None:
+        siret = self.path.split("?")[0].rsplit("/", 1)[-1]
+        self.appels[siret] += 1
+        codes = self.reponses.get(siret, [])
+        code = codes.pop(0) if codes else 200
+        self.send_response(code)
+        if code == 429:
+            self.send_header("Retry-After", "30")
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        if code == 200:
+            self.wfile.write(json.dumps(etablissement(f"Structure {siret}")).encode())
+        else:
+            self.wfile.write(b"{}")
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def api() -> Iterator[ApiEntreprise]:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ApiEntrepriseFactice)
+    ApiEntrepriseFactice.appels = Counter()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield ApiEntreprise(
+        APIEntrepriseConfig(
+            base_url=f"http://127.0.0.1:{httpd.server_port}/",
+            token="jeton",
+            default_context_info=ContextInfo(context="", recipient="", object=""),
+        )
+    )
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_client_limite(api):
+    ApiEntrepriseFactice.reponses = {
+        "11111111111111": [429, 503],
+        "22222222222222": [404],
+        "33333333333333": [400],
+        "44444444444444": [500, 500, 500],
+    }
+    horloge = Horloge()
+    client = ClientLimite(
+        api,
+        SeauJetons(100, horloge=horloge, attendre=horloge.attendre),
+        essais=3,
+        attendre=horloge.attendre,
+    )
+
+    # 429 : attente indiquée par le serveur, puis 503 : nouvel essai
+    assert client.donnees_etablissement("11111111111111") is not None
+    assert ApiEntrepriseFactice.appels["11111111111111"] == 3
+    assert 30 in horloge.attentes
+
+    assert client.donnees_etablissement("22222222222222") is None
+    with pytest.raises(ApiEntrepriseClientError):
+        client.donnees_etablissement("33333333333333")
+    assert ApiEntrepriseFactice.appels["33333333333333"] == 1
+    with pytest.raises(ApiEntrepriseClientError):
+        client.donnees_etablissement("44444444444444")
+    assert ApiEntrepriseFactice.appels["44444444444444"] == 3
+
+
+def test_build_ligne_structure():
+    assert build_ligne_structure(1, None) is None
+    assert build_ligne_structure(1, {"data": {"unite_legale": None}}) is None
+    assert build_ligne_structure(1, etablissement("Mairie")) == {
+        "uid": 1,
+        "nom": "Mairie",
+        "cat_entreprise": "PME",
+        "longitude": -1.68,
+        "latitude": 48.11,
+    }
+
+
+def test_enrichir_structures(db, api):
+    ApiEntrepriseFactice.reponses = {"22222222222222": [404], "33333333333333": [400]}
+    structures = [
+        StructureFactory(identifiant=siret, nom=None)
+        for siret in ("11111111111111", "22222222222222", "33333333333333")
+    ] + [StructureFactory(identifiant=str(10**13 + i), nom=None) for i in range(5)]
+
+    horloge = Horloge()
+    client = ClientLimite(
+        api,
+        SeauJetons(100, horloge=horloge, attendre=horloge.attendre),
+        attendre=horloge.attendre,
+    )
+    bilan = enrichir_structures(
+        db,
+        client,
+        [(s.uid, s.identifiant) for s in structures],
+        workers=3,
+        taille_lot=2,
+    )
+    db.expire_all()
+
+    assert bilan.enrichies == 6
+    assert bilan.inconnues == 1
+    assert bilan.erreurs == ["33333333333333"]
+    noms = dict(db.execute(select(Structure.identifiant, Structure.nom)).all())
+    assert noms["11111111111111"] == "Structure 11111111111111"
+    assert noms["22222222222222"] is None
+    assert noms["33333333333333"] is None
+    assert db.execute(
+        select(Structure.latitude).where(Structure.uid == structures[0].uid)
+    ).scalar() == pytest.approx(48.11)
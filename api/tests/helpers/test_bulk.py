@@ -0,0 +1,44 @@
+import io
+import pickle
+from datetime import date
+from decimal import Decimal
+
+from app.helpers.bulk import cle_collation, ecrire_tsv, valeur_tsv
+
+
+def test_valeur_tsv():
+    assert valeur_tsv(None) == "\\N"
+    assert valeur_tsv(True) == "1"
+    assert valeur_tsv(False) == "0"
+    assert valeur_tsv(42) == "42"
+    assert valeur_tsv(Decimal("5.9E7")) == "59000000"
+    assert valeur_tsv(Decimal("3027.97")) == "3027.97"
+    assert valeur_tsv(date(2025, 1, 2)) == "2025-01-02"
+    assert valeur_tsv(b"\x80\x05") == "8005"
+    assert (
+        valeur_tsv("Lot 1\tVoirie\nC:\\chemin\r\0")
+        == "Lot 1\\tVoirie\\nC:\\\\chemin\\r\\0"
+    )
+
+
+def test_ecrire_tsv():
+    fichier = io.StringIO()
+    ecrire_tsv(
+        fichier,
+        ["uid", "objet", "type_prix"],
+        [
+            {"uid": 1, "objet": "Travaux\tlot 2", "type_prix": pickle.dumps([3])},
+            {"uid": 2, "objet": None},
+        ],
+    )
+    assert fichier.getvalue() == (
+        f"1\tTravaux\\tlot 2\t{pickle.dumps([3]).hex()}\n2\t\\N\t\\N\n"
+    )
+
+
+def test_cle_collation():
+    assert cle_collation(("Missing", "acheteur.id", "Élément requis  ")) == (
+        "missing",
+        "acheteur.id",
+        "element requis",
+    )
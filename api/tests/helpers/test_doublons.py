@@ -0,0 +1,31 @@
+from datetime import date
+
+from app.helpers.doublons import Doublons, empreinte_doublon
+
+
+def test_empreinte_doublon():
+    cle = ("13579135791357", "2021T00000", date(2042, 12, 1))
+    assert empreinte_doublon(cle) == empreinte_doublon(cle)
+    assert empreinte_doublon(cle) != empreinte_doublon(
+        ("13579135791357", "2021T00000", date(2042, 12, 2))
+    )
+    assert empreinte_doublon(cle).bit_length() <= 64
+
+
+def test_doublons():
+    doublons = Doublons()
+    cle = ("13579135791357", "2021T00000", date(2042, 12, 1))
+
+    assert doublons.rapprocher(cle, date(2042, 12, 2)) == (True, None)
+    doublons.enregistrer(cle, date(2042, 12, 2), 1)
+
+    # même publication ou publication plus ancienne : ignoré
+    assert doublons.rapprocher(cle, date(2042, 12, 2)) == (False, None)
+    assert doublons.rapprocher(cle, None) == (False, None)
+
+    # publication plus récente : remplace le marché déjà importé
+    assert doublons.rapprocher(cle, date(2043, 1, 1)) == (True, 1)
+    doublons.enregistrer(cle, date(2043, 1, 1), 1)
+
+    assert len(doublons) == 1
+    assert doublons.stats == {"ignorés": 2, "remplacés": 1}
@@ -0,0 +1,177 @@
+import io
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+import ijson
+import pytest
+import requests
+
+from app.helpers.flux import (
+    FiltreNaN,
+    Telechargement,
+    Validateurs,
+    iter_items,
+    ouvrir_source,
+    precharger_sources,
+)
+
+CONTENU = b'{"marches": {"marche": [{"montant": NaN}, {"montant": 1}]}}'
+
+
+class ServeurDecp(BaseHTTPRequestHandler):
+    """Sert `CONTENU` sous `/decp.json`, avec ETag et requêtes conditionnelles."""
+
+    requetes: ClassVar[list[str]] = []
+
+    def do_GET(self) -> None:
+        self.requetes.append(self.path)
+        if self.path.split("?")[0] != "/decp.json":
+            self.send_error(404)
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Last-Modified", "Wed, 01 Jan 2025 00:00:00 GMT")
+        self.send_header("Content-Length", str(len(CONTENU)))
+        self.end_headers()
+        self.wfile.write(CONTENU)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def serveur() -> Iterator[str]:
+    """Serveur HTTP local, en remplacement de data.gouv.fr."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ServeurDecp)
+    ServeurDecp.requetes = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_iter_items():
+    with open("tests/files/liste_pour_erreurs.json", "rb") as f:
+        contenu = f.read()
+
+    objets = list(
+        iter_items(
+            io.BytesIO(contenu),
+            {"marches.marche.item": "m", "marches.contrat-concession.item": "c"},
+        )
+    )
+
+    marches = list(ijson.items(io.BytesIO(contenu), "marches.marche.item"))
+    concessions = list(
+        ijson.items(io.BytesIO(contenu), "marches.contrat-concession.item")
+    )
+    assert [o for t, o in objets if t == "m"] == marches
+    assert [o for t, o in objets if t == "c"] == concessions
+    assert len(objets) == 4
+
+
+def test_iter_items_imbrication():
+    contenu = b'{"a": [{"b": [1, {"c": [[2], {}]}], "d": null}], "e": [{"f": 3}]}'
+    assert list(iter_items(io.BytesIO(contenu), {"a.item": 1, "e.item": 2})) == [
+        (1, {"b": [1, {"c": [[2], {}]}], "d": None}),
+        (2, {"f": 3}),
+    ]
+
+
+def test_filtre_nan():
+    contenu = '{"a": NaN, "b": [NaN,NaN], "c": "Nan", "é": "NaNa"}'.encode()
+    attendu = '{"a": null, "b": [null,null], "c": "Nan", "é": "nulla"}'
+
+    for taille_bloc in (1, 2, 3, 1024):
+        flux = io.BufferedReader(
+            FiltreNaN(io.BytesIO(contenu), taille_bloc=taille_bloc)
+        )
+        assert flux.read().decode() == attendu
+
+
+def test_filtre_nan_utf8_invalide():
+    flux = io.BufferedReader(FiltreNaN(io.BytesIO(b'{"a": "\xe9t\xc3\xa9"}')))
+    assert flux.read().decode() == '{"a": "té"}'
+
+
+def test_ouvrir_source_fichier(tmp_path):
+    fichier = tmp_path / "decp.json"
+    fichier.write_bytes(b'{"marches": {"marche": [{"montant": NaN}]}}')
+
+    with ouvrir_source(fichier.as_uri()) as flux:
+        assert list(ijson.items(flux, "marches.marche.item")) == [{"montant": None}]
+
+
+def test_telechargement(serveur):
+    telechargement = Telechargement(f"{serveur}/decp.json", taille_bloc=8)
+    assert not telechargement.est_inchangee()
+    assert list(ijson.items(telechargement.ouvrir(), "marches.marche.item")) == [
+        {"montant": None},
+        {"montant": 1},
+    ]
+    telechargement.fermer()
+
+    assert telechargement.validateurs == Validateurs(
+        '"v1"', "Wed, 01 Jan 2025 00:00:00 GMT"
+    )
+    assert telechargement.stats.octets == len(CONTENU)
+
+
+def test_telechargement_taille_max(serveur):
+    telechargement = Telechargement(
+        f"{serveur}/decp.json", taille_bloc=8, taille_max=20
+    )
+    assert not telechargement.est_inchangee()
+    for _ in range(100):
+        if sum(map(len, telechargement._blocs)) == 20:
+            break
+        time.sleep(0.01)
+    # préchargement limité à `taille_max`, la suite est lue à l'ouverture
+    assert b"".join(telechargement._blocs) == CONTENU[:20]
+    assert telechargement.ouvrir().read() == CONTENU.replace(b"NaN", b"null")
+    telechargement.fermer()
+
+
+def test_telechargement_conditionnel(serveur):
+    telechargement = Telechargement(f"{serveur}/decp.json", Validateurs('"v1"'))
+    assert telechargement.est_inchangee()
+    telechargement.fermer()
+
+    telechargement = Telechargement(f"{serveur}/decp.json", Validateurs('"v0"'))
+    assert not telechargement.est_inchangee()
+    telechargement.fermer()
+
+
+def test_telechargement_erreur(serveur):
+    telechargement = Telechargement(f"{serveur}/absent.json")
+    with pytest.raises(requests.HTTPError):
+        telechargement.est_inchangee()
+    telechargement.fermer()
+
+
+def test_precharger_sources(serveur, tmp_path):
+    fichier = tmp_path / "decp.json"
+    fichier.write_bytes(CONTENU)
+    urls = [fichier.as_uri(), f"{serveur}/decp.json", f"{serveur}/decp.json?2"]
+
+    telechargements = precharger_sources(urls, {urls[2]: Validateurs('"v1"')})
+    premier = next(telechargements)
+    # la source suivante est téléchargée pendant le traitement de la première,
+    # mais pas celle d'après
+    for _ in range(100):
+        if ServeurDecp.requetes:
+            break
+        time.sleep(0.01)
+    assert ServeurDecp.requetes == ["/decp.json"]
+    assert len(list(ijson.items(premier.ouvrir(), "marches.marche.item"))) == 2
+
+    assert [t.est_inchangee() for t in telechargements] == [False, True]
+    assert ServeurDecp.requetes == ["/decp.json", "/decp.json?2"]
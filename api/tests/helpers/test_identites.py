@@ -0,0 +1,39 @@
+from app.helpers.identites import IdentityMap
+
+
+def test_identity_map_lru():
+    identites: IdentityMap[str, int] = IdentityMap(taille_max=2)
+    identites.put("a", 1)
+    identites.put("b", 2)
+    assert identites.get("a") == 1  # "b" devient le moins récemment utilisé
+    identites.put("c", 3)
+
+    assert "b" not in identites
+    assert identites.get("a") == 1
+    assert identites.get("c") == 3
+    assert identites.get("b") is None
+    assert (identites.hits, identites.misses, identites.evictions) == (3, 1, 1)
+
+
+def test_identity_map_chargeur():
+    appels: list[str] = []
+
+    def chargeur(cle: str) -> int | None:
+        appels.append(cle)
+        return 42 if cle == "existe" else None
+
+    identites: IdentityMap[str, int] = IdentityMap(taille_max=1, chargeur=chargeur)
+    assert identites.get("existe") == 42
+    assert identites.get("existe") == 42  # gardé en cache
+    assert identites.get("absent") is None
+    assert appels == ["existe", "absent"]
+
+
+def test_identity_map_clear():
+    identites: IdentityMap[str, int] = IdentityMap()
+    identites.put("a", 1)
+    identites.get("a")
+    identites.clear()
+
+    assert len(identites) == 0
+    assert identites.stats() == "0 objets, 0 hits (0%), 0 misses, 0 évictions"
@@ -0,0 +1,313 @@
+import csv
+import json
+import re
+import threading
+from collections import Counter
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import ClassVar
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+from sqlalchemy import select
+
+from app.helpers.infogreffe import (
+    ClientInfogreffe,
+    build_infogreffe_entries,
+    importer_export,
+    lire_export,
+    moissonner_infogreffe,
+    session_http,
+)
+from app.helpers.limiteur import SeauJetons
+from app.models.db import StructureInfogreffe
+from tests.factories import StructureFactory, StructureInfogreffeFactory
+from tests.horloge import Horloge
+
+with open("tests/files/infogreffe.csv", encoding="utf-8") as fichier:
+    RECORDS = {
+        record["siren"] + record["nic"]: record
+        for record in csv.DictReader(fichier, delimiter=";")
+    }
+
+
+class InfogreffeFactice(BaseHTTPRequestHandler):
+    """
+    API Datainfogreffe locale, servant les établissements de
+    `tests/files/infogreffe.csv` : chaque requête portant sur un SIREN reçoit,
+    dans l'ordre, les codes de `reponses` (200 par défaut). Les `incomplets`
+    sont ajoutés aux résultats de toute requête portant sur plusieurs SIREN.
+    """
+
+    reponses: ClassVar[dict[str, list[int]]] = {}
+    incomplets: ClassVar[list[dict[str, str]]] = []
+    appels: ClassVar[Counter[str]] = Counter()
+
+    def do_GET(self) -> None:
+        params = parse_qs(urlsplit(self.path).query)
+        where = params["where"][0]
+        if m := re.fullmatch(r'siren=(\d+) and nic="(\d+)"', where):
+            sirets = {m[1] + m[2]}
+            sirens = {m[1]}
+        else:
+            sirens = set(re.findall(r"siren=(\d+)", where))
+            sirets = {siret for siret in RECORDS if siret[:9] in sirens}
+        incomplets = self.incomplets if len(sirens) > 1 else []
+
+        code = 200
+        for siren in sorted(sirens):
+            self.appels[siren] += 1
+            if codes := self.reponses.get(siren):
+                code = codes.pop(0)
+        self.send_response(code)
+        if code == 429:
+            self.send_header("Retry-After", "30")
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        results = [
+            RECORDS[siret] for siret in sorted(sirets) if siret in RECORDS
+        ] + incomplets
+        payload = {
+            "total_count": len(results),
+            "results": results[: int(params["limit"][0])] if code == 200 else [],
+        }
+        self.wfile.write(json.dumps(payload).encode())
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def serveur() -> Iterator[str]:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), InfogreffeFactice)
+    InfogreffeFactice.appels = Counter()
+    InfogreffeFactice.incomplets = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_build_infogreffe_entries_succes():
+    record = {
+        "millesime_1": "2024",
+        "ca_1": "10000",
+        "resultat_1": "2000",
+        "effectif_1": "3",
+        "millesime_2": "2023",
+        "ca_2": "Confidentiel",
+        "resultat_2": "1500",
+        "effectif_2": "",
+        "millesime_3": "",
+        "ca_3": "",
+        "resultat_3": "",
+        "effectif_3": "",
+    }
+
+    entries = build_infogreffe_entries(1111, record)
+
+    assert len(entries) == 2
+    assert entries[0].annee == 2024
+    assert entries[0].ca == 10000
+    assert entries[0].resultat == 2000
+    assert entries[0].uid_structure == 1111
+    assert entries[0].effectif == 3
+    assert entries[1].annee == 2023
+    assert entries[1].ca is None
+    assert entries[1].resultat == 1500
+    assert entries[1].effectif is None
+    assert entries[1].uid_structure == 1111
+
+
+def test_client_infogreffe(serveur):
+    InfogreffeFactice.reponses = {"123456789": [429, 503], "987654321": [400]}
+    horloge = Horloge()
+    limiteur = SeauJetons(100, horloge=horloge, attendre=horloge.attendre)
+    with session_http(2) as http:
+        client = ClientInfogreffe(
+            http,
+            "chiffres-cles",
+            "cle",
+            limiteur,
+            attendre=horloge.attendre,
+            base_url=serveur,
+        )
+
+        # 429 : attente indiquée par le serveur et débit réduit, puis 503
+        record = client.record("12345678911111")
+        assert record is not None
+        assert record["denomination"] == "SCT1"
+        assert InfogreffeFactice.appels["123456789"] == 3
+        assert 30 in horloge.attentes
+        assert limiteur.debit < 100
+
+        assert client.record("99999999999999") is None
+        with pytest.raises(requests.HTTPError):
+            client.record("98765432100011")
+        assert client.requetes == 5
+
+
+def test_client_infogreffe_lots(serveur):
+    horloge = Horloge()
+    with session_http(1) as http:
+        client = ClientInfogreffe(
+            http,
+            "chiffres-cles",
+            "cle",
+            SeauJetons(100, horloge=horloge, attendre=horloge.attendre),
+            base_url=serveur,
+        )
+        records = client.records(["12345678911111", "12345678922222", "99999999999999"])
+        assert records["12345678911111"]["denomination"] == "SCT1"
+        assert records["12345678922222"]["denomination"] == "SCT2"
+        assert records["99999999999999"] is None
+        assert client.requetes == 1
+
+        # réponse tronquée : les établissements manquants sont recherchés un à un
+        client = ClientInfogreffe(
+            http,
+            "chiffres-cles",
+            "cle",
+            SeauJetons(100, horloge=horloge, attendre=horloge.attendre),
+            base_url=serveur,
+            taille_page=1,
+        )
+        records = client.records(["12345678922222", "12345678944444"])
+        assert records["12345678922222"]["denomination"] == "SCT2"
+        assert records["12345678944444"]["denomination"] == "SCT4"
+        assert client.requetes == 3
+
+
+def test_client_infogreffe_records_incomplets(serveur):
+    # établissements sans NIC ou sans SIREN, ignorés sans interrompre le lot
+    InfogreffeFactice.incomplets = [
+        {"siren": "123456789", "denomination": "SANS NIC"},
+        {"nic": "11111", "denomination": "SANS SIREN"},
+    ]
+    horloge = Horloge()
+    with session_http(1) as http:
+        client = ClientInfogreffe(
+            http,
+            "chiffres-cles",
+            "cle",
+            SeauJetons(100, horloge=horloge, attendre=horloge.attendre),
+            base_url=serveur,
+        )
+        records = client.records(["12345678911111", "98765432100011"])
+        assert records["12345678911111"]["denomination"] == "SCT1"
+        assert records["98765432100011"] is None
+        assert client.requetes == 1
+
+
+def test_moissonner_infogreffe(db, serveur):
+    InfogreffeFactice.reponses = {"987654321": [400]}
+    structures = [
+        StructureFactory(identifiant=siret)
+        for siret in (
+            "12345678911111",
+            "12345678922222",
+            "99999999999999",
+            "98765432100011",
+            "12345678933333",
+        )
+    ]
+
+    horloge = Horloge()
+    with session_http(3) as http:
+        client = ClientInfogreffe(
+            http,
+            "chiffres-cles",
+            "cle",
+            SeauJetons(100, horloge=horloge, attendre=horloge.attendre),
+            attendre=horloge.attendre,
+            base_url=serveur,
+        )
+        bilan = moissonner_infogreffe(
+            db,
+            client,
+            [(s.uid, s.identifiant) for s in structures],
+            workers=3,
+            taille_lot=1,
+            taille_requete=3,
+        )
+
+    assert bilan.traitees == 5
+    assert bilan.structures == 2
+    assert bilan.entrees == 2
+    # le lot en erreur est entièrement signalé
+    assert bilan.erreurs == ["98765432100011", "12345678933333"]
+    assert client.requetes == 2
+    db.expire_all()
+    # les structures absentes du jeu de données sont datées, pas celles en erreur
+    assert [s.date_infogreffe is not None for s in structures] == [
+        True,
+        True,
+        True,
+        False,
+        False,
+    ]
+    entrees = db.execute(select(StructureInfogreffe)).scalars().all()
+    assert {(e.uid_structure, e.annee, e.ca) for e in entrees} == {
+        (structures[0].uid, 2020, 10000),
+        (structures[1].uid, 2020, 20000),
+    }
+
+
+def test_lire_export(tmp_path):
+    records = list(lire_export(Path("tests/files/infogreffe.csv")))
+    assert [r["siren"] + r["nic"] for r in records] == list(RECORDS)
+
+    export = tmp_path / "infogreffe.json"
+    export.write_text(json.dumps(records))
+    assert list(lire_export(export)) == records
+
+
+def test_importer_export(db):
+    structures = [
+        StructureFactory(identifiant=siret)
+        for siret in ("12345678911111", "12345678922222", "99999999999999")
+    ]
+
+    bilan = importer_export(
+        db,
+        lire_export(Path("tests/files/infogreffe.csv")),
+        {s.identifiant: s.uid for s in structures},
+        taille_lot=1,
+    )
+
+    assert bilan.traitees == 4
+    assert bilan.structures == 2
+    assert bilan.entrees == 2
+    entrees = db.execute(select(StructureInfogreffe)).scalars().all()
+    assert {(e.uid_structure, e.annee, e.ca, e.effectif) for e in entrees} == {
+        (structures[0].uid, 2020, 10000, 3),
+        (structures[1].uid, 2020, 20000, None),
+    }
+
+
+def test_importer_export_incremental(db):
+    structure = StructureFactory(identifiant="12345678911111")
+    StructureInfogreffeFactory(structure=structure, annee=2020, ca=1, effectif=1)
+    StructureInfogreffeFactory(structure=structure, annee=2019, ca=2, effectif=2)
+
+    bilan = importer_export(
+        db,
+        lire_export(Path("tests/files/infogreffe.csv")),
+        {structure.identifiant: structure.uid},
+        remplacer=True,
+    )
+    db.expire_all()
+
+    assert bilan.entrees == 1
+    # le millésime 2020 est remplacé, 2019 est conservé
+    entrees = db.execute(
+        select(StructureInfogreffe).order_by(StructureInfogreffe.annee)
+    ).scalars()
+    assert [(e.annee, e.ca, e.effectif) for e in entrees] == [
+        (2019, 2, 2),
+        (2020, 10000, 3),
+    ]
+    assert structure.date_infogreffe is not None
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from app.helpers.limiteur import SeauJetons, en_parallele
+from tests.horloge import Horloge
+
+
+def test_seau_jetons():
+    horloge = Horloge()
+    seau = SeauJetons(2, capacite=2, horloge=horloge, attendre=horloge.attendre)
+
+    for _ in range(4):
+        seau.prendre()
+    # deux jetons disponibles d'emblée, puis un toutes les demi-secondes
+    assert horloge.instant == 1.0
+
+    seau.suspendre(10)
+    seau.prendre()
+    assert horloge.instant == 11.0
+
+
+def test_seau_jetons_adaptatif():
+    horloge = Horloge()
+    seau = SeauJetons(4, debit_min=1, horloge=horloge, attendre=horloge.attendre)
+
+    seau.ralentir(5)
+    assert seau.debit == 2
+    seau.prendre()
+    assert horloge.instant == 5.0
+    seau.prendre()
+    assert horloge.instant == 5.5
+
+    seau.ralentir(0)
+    seau.ralentir(0)
+    assert seau.debit == 1
+
+    for _ in range(100):
+        seau.accelerer()
+    assert seau.debit == 4
+
+
+def test_en_parallele():
+    bloque = threading.Event()
+
+    def carre(n: int) -> int:
+        if n == 0:
+            # le premier appel se termine en dernier
+            bloque.wait(5)
+        elif n == 9:
+            bloque.set()
+        return n * n
+
+    debut = time.perf_counter()
+    resultats = [(n, appel.result()) for n, appel in en_parallele(carre, range(10), 5)]
+    assert resultats == [(n, n * n) for n in range(10)]
+    assert time.perf_counter() - debut < 5
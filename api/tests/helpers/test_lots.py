@@ -0,0 +1,39 @@
+from app.helpers import lots
+from app.helpers.lots import TailleLot
+
+
+def test_taille_lot_fixe():
+    taille = TailleLot(2)
+    taille.ajuster(2, 10.0)
+    assert taille.taille == 2
+
+
+def test_taille_lot_latence():
+    taille = TailleLot(1_000, latence_cible=1.0)
+
+    taille.ajuster(1_000, 0.8)  # commit rapide : lot agrandi
+    assert taille.taille == 1_250
+    taille.ajuster(1_250, 0.1)  # agrandissement borné à ×2
+    assert taille.taille == 2_500
+    taille.ajuster(2_500, 5.0)  # réduction bornée à ½
+    assert taille.taille == 1_250
+    taille.ajuster(1_250, 100.0)
+    assert taille.taille == 625
+    taille = TailleLot(100, latence_cible=1.0)
+    taille.ajuster(100, 100.0)  # bornée par le minimum
+    assert taille.taille == 100
+
+
+def test_taille_lot_memoire(monkeypatch):
+    monkeypatch.setattr(lots, "memoire_residente", lambda: 2_048)
+
+    assert not TailleLot(1_000, memoire_max=4_096).memoire_depassee()
+
+    taille = TailleLot(10_000, latence_cible=1.0, memoire_max=1_024)
+    assert taille.memoire_depassee()
+    taille.ajuster(4_000, 0.5)  # commit rapide, mais mémoire dépassée
+    assert taille.taille == 2_000
+
+
+def test_memoire_residente():
+    assert lots.memoire_residente() > 0
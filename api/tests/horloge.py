@@ -0,0 +1,13 @@
+class Horloge:
+    """Horloge factice, avancée par les attentes plutôt que de les subir."""
+
+    def __init__(self) -> None:
+        self.instant = 0.0
+        self.attentes: list[float] = []
+
+    def __call__(self) -> float:
+        return self.instant
+
+    def attendre(self, duree: float) -> None:
+        self.attentes.append(duree)
+        self.instant += duree
@@ -0,0 +1,25 @@
+import pytest
+
+from app.models.enums import CCAG, TechniqueAchat, TypePrix
+
+
+def test_from_db_value():
+    assert CCAG.from_db_value(1) == CCAG.TRAVAUX
+    assert CCAG.from_db_value(None) == CCAG.AUCUN
+    for item in TypePrix:
+        assert TypePrix.from_db_value(item.db_value) == item
+
+    with pytest.raises(ValueError):
+        CCAG.from_db_value(42)
+
+
+def test_from_db_values():
+    assert TechniqueAchat.from_db_values([2, 1, 2]) == [
+        TechniqueAchat.CONCOURS,
+        TechniqueAchat.AC,
+        TechniqueAchat.CONCOURS,
+    ]
+    assert TypePrix.from_db_values(v for v in ()) == []
+
+    with pytest.raises(ValueError):
+        TypePrix.from_db_values([1, 42])
@@ -1,12 +1,55 @@
+import json
 from datetime import date
 from decimal import Decimal
+from pathlib import Path
 
-from sqlalchemy import select
+import ijson
+from sqlalchemy import Row, delete, inspect, select, update
 
-from app.importation import ImportateurDecp, build_infogreffe_entries
-from app.models.db import ContratConcession, DecpMalForme, Marche
+from app.helpers.bulk import BulkWriter, LignesErreur
+from app.helpers.conf import (
+    PointDeReprise,
+    delete_point_de_reprise,
+    get_point_de_reprise,
+)
+from app.helpers.contraintes import (
+    ajouter_contraintes,
+    creer_tables_sans_contraintes,
+)
+from app.helpers.flux import StatsFlux, Validateurs, ouvrir_source
+from app.helpers.ombre import (
+    basculer_tables_ombre,
+    creer_tables_ombre,
+    get_tables_ombre,
+)
+from app.importation import (
+    ImportateurDecp,
+    TypeContrat,
+    build_lignes,
+    get_tables_contrats,
+    get_validateurs,
+    hors_perimetre,
+    id_accord_cadre,
+    valider_marche,
+)
+from app.models.db import (
+    CPV,
+    Base,
+    ContratConcession,
+    DecpMalForme,
+    Erreur,
+    Lieu,
+    Marche,
+    Structure,
+)
 from app.models.enums import TypeCodeLieu
-from tests.factories import CPVFactory, LieuFactory
+from tests.factories import (
+    CPVFactory,
+    ErreurFactory,
+    LieuFactory,
+    MarcheFactory,
+    StructureFactory,
+)
 
 
 def test_get_or_create_lieu(db):
@@ -15,7 +58,7 @@ def test_get_or_create_lieu(db):
     i = ImportateurDecp(db)
 
     lieu1 = i.get_or_create_lieu("35", TypeCodeLieu.DEP)  # nouveau lieu créé
-    lieu2 = i.get_or_create_lieu("35", TypeCodeLieu.DEP)  # @cache utilisé
+    lieu2 = i.get_or_create_lieu("35", TypeCodeLieu.DEP)  # cache utilisé
     assert lieu1 == lieu2
 
     lieu3 = i.get_or_create_lieu(
@@ -24,6 +67,24 @@ def test_get_or_create_lieu(db):
     assert lieu3 == existing_lieu
 
 
+def test_get_or_create_structure(db):
+    existing_structure = StructureFactory.create()
+
+    i = ImportateurDecp(db)
+    # seuls les uid sont pré-chargés, l'objet ORM est matérialisé à la demande
+    assert i._index_structures == {
+        (existing_structure.identifiant, "SIRET"): existing_structure.uid
+    }
+    assert len(i._cache_structures) == 0
+
+    structure1 = i.get_or_create_structure(id=existing_structure.identifiant)
+    assert structure1 == existing_structure
+
+    structure2 = i.get_or_create_structure(id="12345678900011")  # nouvelle
+    assert i.get_or_create_structure(id="12345678900011") == structure2
+    assert i._index_structures[("12345678900011", "SIRET")] is None
+
+
 def test_importation_marche_succes(db):
     CPVFactory(code="12341234")
 
@@ -160,32 +221,564 @@ def test_importation_erreur(db):
     assert len(decp_mal_formes[0].erreurs) > 0
 
 
-def test_build_infogreffe_entries_succes():
-    record = {
-        "millesime_1": "2024",
-        "ca_1": "10000",
-        "resultat_1": "2000",
-        "effectif_1": "3",
-        "millesime_2": "2023",
-        "ca_2": "Confidentiel",
-        "resultat_2": "1500",
-        "effectif_2": "",
-        "millesime_3": "",
-        "ca_3": "",
-        "resultat_3": "",
-        "effectif_3": "",
+def test_importation_erreurs_partagees(db):
+    i = ImportateurDecp(session=db)
+    i.importer_marches(file="tests/files/liste_pour_erreurs.json")
+    erreurs = list(db.execute(select(Erreur)).scalars())
+    i.importer_marches(file="tests/files/liste_pour_erreurs.json")
+
+    # les erreurs déjà rencontrées sont réutilisées
+    assert list(db.execute(select(Erreur)).scalars()) == erreurs
+    decp_mal_formes = list(db.execute(select(DecpMalForme)).scalars())
+    assert len(decp_mal_formes) == 4
+    assert decp_mal_formes[0].erreurs == decp_mal_formes[2].erreurs
+
+    # le DECP d'origine est restitué à l'identique
+    with open("tests/files/liste_pour_erreurs.json", "rb") as f:
+        marche = next(ijson.items(f, "marches.marche.item"))
+    assert json.loads(decp_mal_formes[0].decp, parse_float=Decimal) == marche
+
+
+def test_erreurs_collation(db):
+    # la contrainte d'unicité de `Erreur` ignore casse, accents et espaces finaux
+    erreur = ErreurFactory(
+        type="missing", localisation="acheteur.id", message="Élément requis "
+    )
+    cle = ("missing", "acheteur.id", "element requis")
+
+    assert ImportateurDecp(session=db).get_or_create_erreur(cle) is erreur
+    assert BulkWriter(db).erreur(cle) == erreur.uid
+
+
+def test_build_lignes_erreurs():
+    # types et localisations tels qu'enregistrés dans `Erreur`
+    with open("tests/files/liste_pour_erreurs.json", "rb") as f:
+        marches = list(ijson.items(f, "marches.marche.item"))
+
+    lignes = build_lignes(TypeContrat.MARCHE, marches[1])
+    assert isinstance(lignes, LignesErreur)
+    assert {
+        (type, localisation)
+        for type, localisation, _ in lignes.erreurs
+        if type != "missing"
+    } == {("string_pattern_mismatch", "acheteur.id")}
+    assert len(lignes.erreurs) == len(set(lignes.erreurs))
+
+
+def test_valider_marche_listes_par_defaut():
+    with open("tests/files/liste_marches_valides.json", "rb") as f:
+        marche = next(ijson.items(f, "marches.marche.item"))
+    marche.pop("modifications", None)
+
+    data1 = valider_marche(marche)
+    data2 = valider_marche(marche)
+    assert data1.modifications == []
+    assert data1.modifications is not data2.modifications
+
+
+def test_importation_bulk(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db, bulk=True)
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+    i.importer_concessions(file="tests/files/liste_concessions_valides.json")
+    i.importer_marches(file="tests/files/liste_pour_erreurs.json")
+
+    marches_crees = list(db.execute(select(Marche)).scalars())
+    assert len(marches_crees) == 3
+
+    marche1 = marches_crees[0]
+    assert marche1.id == "2021T00000"
+    assert marche1.acheteur.identifiant == "13579135791357"
+    assert marche1.acheteur.acheteur is True
+    assert marche1.lieu.code == "35"
+    assert marche1.modalites_execution == []
+    assert marche1.type_prix == [3]
+    assert marche1.montant == Decimal(11111.0)
+    assert [t.technique for t in marche1.techniques_achat] == [1]
+    assert len(marche1.titulaires) == 1
+    assert marche1.titulaires[0].vendeur is True
+    assert len(marche1.modifications) == 2
+    assert len(marche1.modifications[0].titulaires) == 1
+    assert len(marche1.actes_sous_traitance) == 1
+    assert marche1.actes_sous_traitance[0].montant == Decimal("5.9E7")
+    assert len(marche1.actes_sous_traitance[0].modifications) == 2
+
+    concessions_crees = list(db.execute(select(ContratConcession)).scalars())
+    assert len(concessions_crees) == 2
+    assert len(concessions_crees[0].donnees_execution[0].tarifs) == 2
+    assert concessions_crees[0].concessionnaires[0].identifiant == "12398755624565"
+
+    decp_mal_formes = list(db.execute(select(DecpMalForme)).scalars())
+    assert len(decp_mal_formes) == 2
+    assert len(decp_mal_formes[0].erreurs) > 0
+
+
+def lignes_par_table(db) -> dict[str, list[Row]]:
+    return {
+        table.name: list(
+            db.execute(
+                select(table).order_by(*(table.primary_key.columns or table.columns))
+            )
+        )
+        for table in Base.metadata.sorted_tables
+        if table.name != CPV.__tablename__
     }
 
-    entries = build_infogreffe_entries(1111, record)
-
-    assert len(entries) == 2
-    assert entries[0].annee == 2024
-    assert entries[0].ca == 10000
-    assert entries[0].resultat == 2000
-    assert entries[0].uid_structure == 1111
-    assert entries[0].effectif == 3
-    assert entries[1].annee == 2023
-    assert entries[1].ca is None
-    assert entries[1].resultat == 1500
-    assert entries[1].effectif is None
-    assert entries[1].uid_structure == 1111
+
+def vider_tables(db) -> None:
+    db.execute(update(Marche).values(uid_accord_cadre=None))
+    for table in reversed(Base.metadata.sorted_tables):
+        if table.name != CPV.__tablename__:
+            db.execute(delete(table))
+
+
+def test_importation_bulk_identique_orm(db, tmp_path):
+    CPVFactory(code="12341234")
+
+    with open("tests/files/liste_marches_valides.json") as f:
+        decp = json.load(f)
+    marches = decp["marches"]["marche"]
+    # un marché rattaché à l'accord-cadre 2021T00000 avant son import, un autre
+    # après
+    subsequent = marches[2] | {
+        "idAccordCadre": "2021T00000",
+        "acheteur": marches[0]["acheteur"],
+    }
+    marches.insert(0, subsequent | {"id": "2024T00004"})
+    marches.append(subsequent | {"id": "2024T00005"})
+    fichier = tmp_path / "decp.json"
+    fichier.write_text(json.dumps(decp))
+
+    fichiers = (
+        str(fichier),
+        "tests/files/liste_concessions_valides.json",
+        "tests/files/liste_pour_erreurs.json",
+    )
+
+    def importer(bulk: bool) -> dict[str, list[Row]]:
+        i = ImportateurDecp(session=db, bulk=bulk)
+        i.importer_marches(file=fichiers[0])
+        i.importer_concessions(file=fichiers[1])
+        i.importer_marches(file=fichiers[2])
+        i.finaliser()
+        db.expire_all()
+        return lignes_par_table(db)
+
+    orm = importer(bulk=False)
+    vider_tables(db)
+    bulk = importer(bulk=True)
+
+    marches_orm = orm[Marche.__tablename__]
+    assert sum(m.uid_accord_cadre is not None for m in marches_orm) == 2
+    for table, lignes in orm.items():
+        assert bulk[table] == lignes, table
+
+
+def test_importation_load_data(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db, load_data=True)
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+
+    marches_crees = list(db.execute(select(Marche)).scalars())
+    assert len(marches_crees) == i.nombre_valides(TypeContrat.MARCHE) == 3
+
+    marche1 = marches_crees[0]
+    assert marche1.objet == "Lorem ipsum dolor"
+    assert marche1.type_prix == [3]
+    assert marche1.montant == Decimal(11111.0)
+    assert len(marche1.titulaires) == 1
+    assert len(marche1.modifications) == 2
+    assert marche1.actes_sous_traitance[0].montant == Decimal("5.9E7")
+
+
+def test_importation_dedoublonnage(db, tmp_path):
+    CPVFactory(code="12341234")
+
+    with open("tests/files/liste_marches_valides.json") as f:
+        contenu = json.load(f)
+    # le premier marché est republié plus tard, le second avec la même date
+    premier, second = contenu["marches"]["marche"][:2]
+    premier |= {"datePublicationDonnees": "2043-01-01", "objet": "Republié"}
+    contenu["marches"]["marche"] = [premier, second]
+    autre_source = tmp_path / "autre_source.json"
+    autre_source.write_text(json.dumps(contenu))
+
+    i = ImportateurDecp(session=db, dedoublonner=True)
+    i.importer(file="tests/files/liste_marches_valides.json")
+    i.importer(file=str(autre_source))
+    db.expire_all()
+
+    assert i.nombre_valides(TypeContrat.MARCHE) == 0
+    assert i.build_import_run("autre_source", None).doublons == 2
+
+    marches = list(db.execute(select(Marche).order_by(Marche.uid)).scalars())
+    assert len(marches) == 3
+    assert marches[0].objet == "Republié"
+    assert marches[0].date_publication == date(2043, 1, 1)
+    assert len(marches[0].modifications) == 2
+    assert len(marches[0].actes_sous_traitance) == 1
+
+
+def test_importation_dedoublonnage_meme_source(db, tmp_path):
+    CPVFactory(code="12341234")
+
+    with open("tests/files/liste_marches_valides.json") as f:
+        contenu = json.load(f)
+    # republié dans la même source : le marché remplacé n'est pas encore écrit
+    premier = contenu["marches"]["marche"][0]
+    contenu["marches"]["marche"].append(
+        premier | {"datePublicationDonnees": "2043-01-01", "objet": "Republié"}
+    )
+    source = tmp_path / "source.json"
+    source.write_text(json.dumps(contenu))
+
+    i = ImportateurDecp(session=db, dedoublonner=True)
+    i.importer(file=str(source))
+    db.expire_all()
+
+    assert i.build_import_run("source", None).doublons == 1
+    marches = list(db.execute(select(Marche).order_by(Marche.uid)).scalars())
+    assert len(marches) == 3
+    assert marches[0].objet == "Republié"
+    assert len(marches[0].modifications) == 2
+    assert len(marches[0].actes_sous_traitance) == 1
+
+
+def test_importation_filtre_sirets(db):
+    CPVFactory(code="12341234")
+
+    # les objets écartés traversent le pool de processus sans être validés
+    i = ImportateurDecp(session=db, sirets=["12345678978945"], workers=2, taille_lot=1)
+    i.importer(
+        file="tests/files/liste_marches_valides.json",
+        reprise=PointDeReprise("source"),
+    )
+    assert [m.id for m in db.execute(select(Marche)).scalars()] == [
+        "2024T00001",
+        "2024T00003",
+    ]
+    assert i.build_import_run("source", None).objets_ignores == 1
+    # les objets ignorés comptent dans la position de reprise
+    assert get_point_de_reprise(db) == PointDeReprise(
+        "source", objets=3, valides={"marche": 2}, ignores={"marche": 1}
+    )
+
+    # un objet invalide d'un autre acheteur est ignoré, un objet sans acheteur
+    # reste décrit comme DECP mal formé
+    i.importer_marches(file="tests/files/liste_pour_erreurs.json")
+    assert i._ignores_par_type[TypeContrat.MARCHE] == 1
+    assert i._invalid_objects == 1
+    assert len(list(db.execute(select(DecpMalForme)).scalars())) == 1
+
+
+def test_hors_perimetre():
+    sirets = frozenset({"12345678978945"})
+    marche = {"acheteur": {"id": "12345678978945"}}
+    assert not hors_perimetre(TypeContrat.MARCHE, marche, sirets)
+    assert hors_perimetre(TypeContrat.MARCHE, {"acheteur": {"id": "1"}}, sirets)
+    assert hors_perimetre(
+        TypeContrat.CONCESSION, {"autoriteConcedante": {"id": "1"}}, sirets
+    )
+    assert not hors_perimetre(TypeContrat.CONCESSION, marche, sirets)
+    assert not hors_perimetre(TypeContrat.MARCHE, {"acheteur": None}, sirets)
+
+
+def test_id_accord_cadre():
+    assert id_accord_cadre("2024T00001", "2021T00000") == "2021T00000"
+    assert id_accord_cadre("2024T00001", "") is None
+    # plus long qu'un identifiant de marché (String(16))
+    assert id_accord_cadre("2024T00001", "2021T00000-LOT-01") is None
+
+
+def test_importation_accords_cadre(db, tmp_path):
+    CPVFactory(code="12341234")
+
+    with open("tests/files/liste_marches_valides.json") as f:
+        contenu = json.load(f)
+    # les marchés subséquents précèdent leur accord-cadre
+    accord_cadre, subsequent, autre = contenu["marches"]["marche"]
+    subsequent["idAccordCadre"] = accord_cadre["id"]
+    subsequent["acheteur"] = accord_cadre["acheteur"]
+    # même identifiant, mais l'accord-cadre d'un autre acheteur
+    autre["idAccordCadre"] = accord_cadre["id"]
+    contenu["marches"]["marche"] = [subsequent, autre, accord_cadre]
+    source = tmp_path / "source.json"
+    source.write_text(json.dumps(contenu))
+
+    for bulk in (False, True):
+        i = ImportateurDecp(session=db, bulk=bulk)
+        i.importer(file=str(source))
+        assert i.lier_accords_cadre() == 1
+        i.finaliser()
+        db.expire_all()
+
+        marches = {m.id: m for m in db.execute(select(Marche)).scalars()}
+        assert marches[subsequent["id"]].accord_cadre == marches[accord_cadre["id"]]
+        assert marches[autre["id"]].id_accord_cadre == accord_cadre["id"]
+        assert marches[autre["id"]].accord_cadre is None
+
+        for table in reversed(get_tables_contrats()):
+            db.execute(table.delete())
+        db.commit()
+
+
+def test_importation_parallele(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db, workers=2, taille_lot=1)
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+    i.importer_marches(file="tests/files/liste_pour_erreurs.json")
+
+    marches_crees = list(db.execute(select(Marche)).scalars())
+    assert [m.id for m in marches_crees] == ["2021T00000", "2024T00001", "2024T00003"]
+    assert marches_crees[1].acheteur == marches_crees[2].acheteur
+    assert len(list(db.execute(select(DecpMalForme)).scalars())) == 2
+
+
+def test_importation_une_passe(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db)
+    i.importer(file="tests/files/liste_pour_erreurs.json")
+
+    assert i._valid_objects == 0
+    assert i._invalid_objects == 4
+    assert i._invalid_par_type[TypeContrat.MARCHE] == 2
+    assert i._invalid_par_type[TypeContrat.CONCESSION] == 2
+    assert len(list(db.execute(select(DecpMalForme)).scalars())) == 4
+
+    i.importer(file="tests/files/liste_concessions_valides.json")
+    assert i._valid_par_type[TypeContrat.CONCESSION] == 2
+    assert len(list(db.execute(select(ContratConcession)).scalars())) == 2
+
+
+def test_importation_flux(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db)
+    with ouvrir_source(
+        Path("tests/files/liste_marches_valides.json").resolve().as_uri()
+    ) as flux:
+        i.importer(file=flux)
+
+    assert i._valid_objects == 3
+    assert len(list(db.execute(select(Marche)).scalars())) == 3
+
+
+def test_build_import_run(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db)
+    stats = StatsFlux()
+    with ouvrir_source(
+        Path("tests/files/liste_marches_valides.json").resolve().as_uri(), stats
+    ) as flux:
+        i.importer(file=flux)
+
+    run = i.build_import_run("source", stats)
+    db.add(run)
+    db.commit()
+
+    assert run.source == "source"
+    assert run.octets == Path("tests/files/liste_marches_valides.json").stat().st_size
+    assert run.objets_valides == 3
+    assert run.objets_invalides == 0
+    assert run.objets_par_seconde > 0
+    assert run.duree_validation > 0
+    assert run.memoire_max > 0
+    assert run.taux_cache_structures is not None
+    assert 0 <= run.taux_cache_structures <= 1
+    assert get_validateurs(db) == {"source": Validateurs()}
+
+    # les validateurs retenus sont ceux du dernier import de la source
+    db.add(i.build_import_run("source", stats, Validateurs('"v2"', None)))
+    db.commit()
+    assert get_validateurs(db) == {"source": Validateurs('"v2"', None)}
+
+
+def test_importation_cache_borne(db):
+    CPVFactory(code="12341234")
+
+    # cache d'un seul objet : les structures et lieux évincés sont retrouvés
+    # en BDD plutôt que recréés
+    i = ImportateurDecp(session=db, taille_cache=1)
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+
+    structures = list(db.execute(select(Structure)).scalars())
+    assert len(structures) == len(
+        {(s.identifiant, s.type_identifiant) for s in structures}
+    )
+    lieux = list(db.execute(select(Lieu)).scalars())
+    assert len(lieux) == len({(lieu.code, lieu.type_code) for lieu in lieux})
+    assert len(i._cache_structures) == 0  # libéré en fin d'import
+
+
+def test_importation_detacher_objets_ecrits(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db)
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+    i.detacher_objets_ecrits()
+    assert len(db.identity_map) == 0  # caches libérés en fin d'import
+
+    # les objets des caches restent attachés pour les DECP suivants
+    i.load_index()
+    structure = i.get_or_create_structure(id="13579135791357", type_id="SIRET")
+    marche = db.execute(select(Marche)).scalars().first()
+    i.detacher_objets_ecrits()
+    assert structure in db
+    assert marche not in db
+
+    # lots d'un seul objet : chaque marché est détaché après son commit
+    i = ImportateurDecp(session=db)
+    i.importer_marches(
+        file="tests/files/liste_marches_valides.json", batch_commit_size=1
+    )
+    assert i._valid_objects == 3
+    assert len(list(db.execute(select(Marche)).scalars())) == 6
+
+
+def test_importation_reprise(db):
+    CPVFactory(code="12341234")
+
+    i = ImportateurDecp(session=db)
+    i.importer(
+        file="tests/files/liste_marches_valides.json",
+        batch_commit_size=2,
+        reprise=PointDeReprise("source"),
+    )
+    assert get_point_de_reprise(db) == PointDeReprise(
+        "source", objets=3, valides={"marche": 3}
+    )
+    marches = list(db.execute(select(Marche).order_by(Marche.uid)).scalars())
+
+    # reprise après les deux premiers objets : seul le troisième est importé
+    i = ImportateurDecp(session=db, reprise=True)
+    i.importer(
+        file="tests/files/liste_marches_valides.json",
+        reprise=PointDeReprise("source", objets=2, valides={"marche": 2}),
+    )
+    assert i._valid_objects == 3
+    reprises = list(db.execute(select(Marche).order_by(Marche.uid)).scalars())
+    assert len(reprises) == 4
+    assert reprises[-1].id == marches[-1].id
+
+    delete_point_de_reprise(db)
+    assert get_point_de_reprise(db) is None
+
+
+def test_importation_incrementale(db, tmp_path):
+    CPVFactory(code="12341234")
+
+    with open("tests/files/liste_marches_valides.json") as f:
+        decp = json.load(f)
+    i = ImportateurDecp(session=db, incremental=True)
+    i.importer(file="tests/files/liste_marches_valides.json")
+    i.finaliser()
+    uids = {m.id: m.uid for m in db.execute(select(Marche)).scalars()}
+
+    marches = decp["marches"]["marche"]
+    marches[0]["objet"] = "Objet modifié"
+    del marches[1]
+    marches.append(marches[1] | {"id": "2099T99999"})
+    fichier = tmp_path / "decp.json"
+    fichier.write_text(json.dumps(decp))
+
+    i = ImportateurDecp(session=db, incremental=True)
+    i.importer(file=str(fichier))
+    i.finaliser()
+
+    db.expire_all()
+    marches_crees = {m.id: m for m in db.execute(select(Marche)).scalars()}
+    assert sorted(marches_crees) == ["2021T00000", "2024T00003", "2099T99999"]
+    assert marches_crees["2021T00000"].uid == uids["2021T00000"]
+    assert marches_crees["2021T00000"].objet == "Objet modifié"
+    assert len(marches_crees["2021T00000"].modifications) == 2
+    assert marches_crees["2024T00003"].uid == uids["2024T00003"]
+    assert marches_crees["2099T99999"].uid not in uids.values()
+
+    stats = i._delta.stats[Marche.__table__]
+    assert stats == {"nouveaux": 1, "modifiés": 1, "inchangés": 1, "supprimés": 1}
+
+
+def test_importation_sans_empreinte(db):
+    # hors import incrémental, les DECP ne sont pas sérialisés pour leur empreinte
+    CPVFactory(code="12341234")
+    i = ImportateurDecp(session=db, bulk=True)
+    i.importer(file="tests/files/liste_marches_valides.json")
+    i.importer(file="tests/files/liste_concessions_valides.json")
+
+    assert set(db.execute(select(Marche.empreinte)).scalars()) == {None}
+    assert set(db.execute(select(ContratConcession.empreinte)).scalars()) == {None}
+
+
+def test_importation_incrementale_erreurs(db):
+    for source in ("a", "b"):
+        i = ImportateurDecp(session=db, incremental=True)
+        i.importer(
+            file="tests/files/liste_pour_erreurs.json", reprise=PointDeReprise(source)
+        )
+    uids_a = set(
+        db.execute(select(DecpMalForme.uid).where(DecpMalForme.source == "a")).scalars()
+    )
+    assert len(uids_a) == 4
+
+    # seule la source "b" est relue, "a" ayant répondu 304
+    i = ImportateurDecp(session=db, incremental=True)
+    i.importer(file="tests/files/liste_pour_erreurs.json", reprise=PointDeReprise("b"))
+    i.finaliser(supprimer_disparus=False)
+    delete_point_de_reprise(db)
+
+    db.expire_all()
+    decps = list(db.execute(select(DecpMalForme)).scalars())
+    assert {d.uid for d in decps if d.source == "a"} == uids_a
+    assert len([d for d in decps if d.source == "b"]) == 4
+    assert all(d.erreurs for d in decps)
+
+
+def test_importation_tables_ombre(db):
+    MarcheFactory()
+    CPVFactory(code="12341234")
+    db.flush()
+
+    tables = get_tables_contrats()
+    creer_tables_ombre(db.connection(), tables)
+
+    i = ImportateurDecp(session=db, tables_ombre=get_tables_ombre(tables))
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+    # les tables en production ne sont pas modifiées pendant l'import
+    assert len(list(db.execute(select(Marche)).scalars())) == 1
+
+    basculer_tables_ombre(db.connection(), tables)
+    db.expire_all()
+
+    marches_crees = list(db.execute(select(Marche)).scalars())
+    assert [m.id for m in marches_crees] == ["2021T00000", "2024T00001", "2024T00003"]
+    assert len(marches_crees[0].titulaires) == 1
+    assert len(marches_crees[0].actes_sous_traitance[0].modifications) == 2
+
+
+def test_importation_contraintes_differees(db):
+    connexion = db.connection()
+    tables = Base.metadata.sorted_tables
+    Base.metadata.drop_all(connexion)
+    creer_tables_sans_contraintes(connexion, tables)
+    assert inspect(connexion).get_foreign_keys("marche") == []
+    assert inspect(connexion).get_unique_constraints("structure") == []
+
+    CPVFactory(code="12341234")
+    i = ImportateurDecp(session=db, bulk=True)
+    i.importer_marches(file="tests/files/liste_marches_valides.json")
+    ajouter_contraintes(connexion, tables)
+
+    assert {fk["name"] for fk in inspect(connexion).get_foreign_keys("marche")} == {
+        "marche_acheteur_fk",
+        "marche_cpv_fk",
+        "marche_accord_cadre_fk",
+        "marche_lieu_fk",
+    }
+    assert len(inspect(connexion).get_unique_constraints("structure")) == 1
+    assert len(list(db.execute(select(Marche)).scalars())) == 3